@@ -0,0 +1,42 @@
+"""
+Build the name index snapshot that API workers memory-map at startup.
+
+Usage:
+    python -m app.build_index_snapshot
+    python -m app.build_index_snapshot -o /data/name_index.snapshot
+
+Builds the phonetic, edit-distance and trigram indexes from the archive in
+the database and writes them as one snapshot file (INDEX_SNAPSHOT_PATH by
+default). Run it after `python -m app.load_archive`; workers fall back to
+building the index themselves while the snapshot is missing or its version
+does not match the archive.
+"""
+import argparse
+import sys
+import time
+
+from app.db_config import SessionLocal
+from app.services.name_index import INDEX_SNAPSHOT_PATH, name_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the name index snapshot")
+    parser.add_argument("-o", "--output", default=INDEX_SNAPSHOT_PATH, help=f"snapshot file (default: {INDEX_SNAPSHOT_PATH})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        name_index.load(db, snapshot_path=None)
+        name_index.save_snapshot(args.output)
+    except Exception as e:
+        print(f"Error building index snapshot: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"Snapshot of {name_index.size} names written to {args.output} (version {name_index.version}) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
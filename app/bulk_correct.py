@@ -0,0 +1,58 @@
+"""
+Bulk spell correction of large CSV / NDJSON files.
+
+Usage:
+    python -m app.bulk_correct names.csv -o corrected.ndjson
+    python -m app.bulk_correct names.ndjson --chunk-size 1000 --concurrency 8
+
+CSV input needs a `name` column and may have a `country` column, NDJSON
+input holds one {"name": ..., "country": ...} object per line. Results are
+written as NDJSON (stdout by default) while the file is still being read.
+"""
+import argparse
+import asyncio
+import sys
+
+from app.controller.bulk_controller import BULK_CHUNK_SIZE, BULK_CONCURRENCY, detect_format, parse_rows, stream_bulk_correction
+from app.db_config import SessionLocal
+from app.services.lifecycle import load_indexes, start_services, stop_services
+
+
+async def run(input_path: str, output, input_format: str, chunk_size: int, concurrency: int):
+    # the archive is not watched, a run uses the index as loaded at startup
+    await start_services(watch_archive=False)
+    try:
+        with open(input_path, "r", encoding="utf-8", newline="") as f:
+            rows = parse_rows(f, input_format)
+            async for line in stream_bulk_correction(rows, chunk_size, concurrency):
+                output.write(line)
+    finally:
+        await stop_services()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk name spell correction")
+    parser.add_argument("input", help="CSV or NDJSON file of names and countries")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        load_indexes(db)
+    finally:
+        db.close()
+
+    input_format = args.format or detect_format(args.input)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(run(args.input, output, input_format, args.chunk_size, args.concurrency))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import BackgroundTasks
+
+from app.controller.controller import spell_check_batch
+from app.db_config import AsyncSessionLocal, SessionLocal
+from app.models.scheme import CorrectionRequest
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))
+
+# (line number, parsed request or None, parse error or None)
+ParsedRow = Tuple[int, Optional[CorrectionRequest], Optional[str]]
+
+
+def detect_format(filename: Optional[str], default: str = "csv") -> str:
+    """Guess the input format from the file extension"""
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+
+def _to_request(record: dict) -> CorrectionRequest:
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError("missing name")
+
+    country = (record.get("country") or "").strip()
+    # optional per-row top_k / min_score, CSV cells arrive as strings and are coerced
+    options = {field: record[field] for field in ("top_k", "min_score") if record.get(field) not in (None, "")}
+    return CorrectionRequest(name=name, country=country, **options) if country else CorrectionRequest(name=name, **options)
+
+
+def parse_rows(lines: Iterable[str], input_format: str) -> Iterator[ParsedRow]:
+    """
+    Lazily parse CSV (with a `name` and optional `country`, `top_k`, `min_score` header) or NDJSON
+    lines into correction requests. Bad rows are yielded with an error
+    instead of stopping the stream.
+    """
+    if input_format == "ndjson":
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, _to_request(json.loads(line)), None
+            except Exception as e:
+                yield line_no, None, str(e)
+        return
+
+    reader = csv.DictReader(lines)
+    for record in reader:
+        line_no = reader.line_num
+        try:
+            yield line_no, _to_request(record), None
+        except Exception as e:
+            yield line_no, None, str(e)
+
+
+def _result_line(line_no: int, name: Optional[str], country: Optional[str], suggestions=None, error: Optional[str] = None, degraded: bool = False) -> str:
+    return json.dumps({
+        "line": line_no,
+        "name": name,
+        "country": country,
+        "suggestions": [s.model_dump() for s in suggestions] if suggestions is not None else None,
+        "degraded": degraded,
+        "error": error
+    }, ensure_ascii=False) + "\n"
+
+
+async def _process_chunk(chunk: List[ParsedRow]) -> List[str]:
+    """Run one chunk through the batch pipeline with its own session and save its results"""
+    valid = [(line_no, request) for line_no, request, error in chunk if request is not None]
+    results = {}
+    chunk_error = None
+
+    if valid:
+        db = SessionLocal()
+        try:
+            background_tasks = BackgroundTasks()
+            async with AsyncSessionLocal() as async_db:
+                # offline jobs always wait for the LLM, whatever STALE_WHILE_REVALIDATE says
+                batch = await spell_check_batch([request for _, request in valid], db, background_tasks, async_db, stale_while_revalidate=False)
+            results = {line_no: item for (line_no, _), item in zip(valid, batch.results)}
+
+            # hand this chunk's results to the write-behind queue
+            await background_tasks()
+        except Exception as e:
+            chunk_error = getattr(e, "detail", str(e))
+        finally:
+            db.close()
+
+    lines = []
+    for line_no, request, error in chunk:
+        if request is None:
+            lines.append(_result_line(line_no, None, None, error=error))
+        elif line_no in results:
+            item = results[line_no]
+            lines.append(_result_line(line_no, item.name, item.country, item.suggestions, item.error, item.degraded))
+        else:
+            lines.append(_result_line(line_no, request.name, request.country, error=chunk_error))
+
+    return lines
+
+
+async def stream_bulk_correction(
+    rows: Iterable[ParsedRow],
+    chunk_size: int = BULK_CHUNK_SIZE,
+    concurrency: int = BULK_CONCURRENCY
+) -> AsyncIterator[str]:
+    """
+    Correct a stream of rows and yield NDJSON result lines in input order.
+
+    At most `concurrency` chunks of `chunk_size` rows are in flight at once,
+    so memory stays flat however large the input is.
+    """
+    rows = iter(rows)
+    pending = deque()
+    processed = 0
+
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if chunk:
+                pending.append(asyncio.create_task(_process_chunk(chunk)))
+
+            if pending and (len(pending) >= concurrency or not chunk):
+                lines = await pending.popleft()
+                processed += len(lines)
+                for line in lines:
+                    yield line
+                logger.info(f"Bulk correction progress [rows: {processed}]")
+
+            if not chunk and not pending:
+                break
+    finally:
+        # the consumer went away (e.g. client disconnect), drop the work still in flight
+        for task in pending:
+            task.cancel()
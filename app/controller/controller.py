@@ -1,52 +1,163 @@
-from app.models.scheme import SpellCheckResponse, Suggestion
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from app.models.scheme import AutocompleteResponse, BatchCorrectionResponse, BatchItemResult, Completion, CorrectionRequest, SpellCheckResponse, Suggestion
 from app.services.db_interaction import DB_service
-from app.services.llm_service import LLM_call, LLM_process
+from app.services.enrichment import STALE_WHILE_REVALIDATE, enrichment_queue
+from app.services.llm_service import LLM_available, LLM_call, LLM_process
+from app.services.metrics import LLM_FALLBACKS, REQUEST_SECONDS, RESULTS, stage
+from app.services.name_index import name_index
+from app.services.name_learner import name_learner
+from app.services.result_cache import result_cache
 from app.services.spell_checker_service import SpellCheck
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, BackgroundTasks
 from app.models import models
-from app.utils.utils import save_name_metadata_background
+from app.services.write_behind import write_behind
+from app.utils.utils import restyle_name
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def spell_check(name: str, country: str, db: Session, background_tasks: BackgroundTasks) -> SpellCheckResponse:
+# Time a request may take before its LLM fallback is abandoned for the local suggestions
+LLM_LATENCY_BUDGET_MS = float(os.getenv("LLM_LATENCY_BUDGET_MS", "3000"))
+
+
+class LLMUnavailable(Exception):
+    """The LLM fallback gave no usable result within the request's latency budget"""
+
+
+def _select(suggestions: List[Suggestion], top_k: Optional[int] = None, min_score: Optional[float] = None) -> List[Suggestion]:
+    """The part of a ranked result a request asked for: scores of at least `min_score`, at most `top_k` of them"""
+    if min_score is not None:
+        suggestions = [s for s in suggestions if s.similarity_score >= min_score]
+    return suggestions[:top_k] if top_k is not None else suggestions
+
+
+def _restyle(name: str, suggestions: List[Suggestion]) -> List[Suggestion]:
+    """
+    Suggestions written like the typed name. Results are cached and stored
+    under the normalized name, so the typed casing and separators are
+    applied per request, whichever spelling computed the result.
+    """
+    restyled: Dict[str, Suggestion] = {}
+    for suggestion in suggestions:
+        restyled.setdefault(restyle_name(name, suggestion.name), suggestion)
+    return [Suggestion(name=n, similarity_score=s.similarity_score) for n, s in restyled.items()]
+
+
+async def spell_check(
+    name: str,
+    country: str,
+    db: Session,
+    background_tasks: BackgroundTasks,
+    async_db: Optional[AsyncSession] = None,
+    top_k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    stale_while_revalidate: Optional[bool] = None
+) -> SpellCheckResponse:
+    """
+    Spell check one name. The full ranked result is cached and stored, the
+    response is cut down to the request's `top_k` / `min_score`. When the LLM
+    fallback is unavailable or misses the latency budget the best local
+    suggestions are returned, flagged as degraded, and neither cached nor stored.
+
+    With `stale_while_revalidate` (default STALE_WHILE_REVALIDATE) a weak
+    local match is returned at once, flagged as revalidating, and the LLM
+    result is computed in the background for the next request.
+    """
+    revalidate = STALE_WHILE_REVALIDATE if stale_while_revalidate is None else stale_while_revalidate
+    with REQUEST_SECONDS.time("single"):
+        response = await _spell_check(name, country, db, background_tasks, async_db, revalidate)
+
+    response.suggestions = _select(_restyle(name, response.suggestions), top_k, min_score)
+    return response
+
+
+async def _spell_check(
+    name: str,
+    country: str,
+    db: Session,
+    background_tasks: BackgroundTasks,
+    async_db: Optional[AsyncSession] = None,
+    revalidate: bool = False
+) -> SpellCheckResponse:
     try:
+        deadline = asyncio.get_running_loop().time() + LLM_LATENCY_BUDGET_MS / 1000
         logger.info(f"Starting spell check [name: {name}, country: {country}]")
 
-        spell_correct_obj = SpellCheck(db_session=db)
+        # Cache Check: repeated names never reach Postgres
+        with stage("cache"):
+            cached_suggestions = await result_cache.get(name, country)
+        if cached_suggestions is not None:
+            RESULTS.inc("cache")
+            return SpellCheckResponse(suggestions=cached_suggestions)
+
+        spell_correct_obj = SpellCheck(db_session=db, async_session=async_db)
   
 
         # Existency Check: Check if the name is already searched before
-        is_exist, response_suggestions = spell_correct_obj.name_exist_check(name, country)
+        with stage("exist_check"):
+            if async_db is not None:
+                is_exist, response_suggestions = await spell_correct_obj.name_exist_check_async(name, country)
+            else:
+                is_exist, response_suggestions = spell_correct_obj.name_exist_check(name, country)
         if is_exist:
+            RESULTS.inc("stored")
+            await result_cache.set(name, country, response_suggestions)
             return SpellCheckResponse(suggestions=response_suggestions)
         
         logger.info(f"name_exist_check completed [is_exist: {is_exist}]")
 
         # Step 1: get suggestions based on the metaphones
-        suggestions = spell_correct_obj.get_suggestions(name, country)
+        with stage("phonetic_candidates"):
+            phonetic_candidates = await spell_correct_obj.get_phonetic_candidates_async(name, country)
+        suggestions = await spell_correct_obj.get_suggestions_async(name, country, phonetic_candidates)
 
         # Step 2: check if this a good suggestion or not
-        match_check = spell_correct_obj.evaluate_suggestions(suggestions)
+        with stage("evaluate"):
+            match_check = spell_correct_obj.evaluate_suggestions(suggestions)
 
         logger.info(f"evaluate_suggestions completed [match_check: {match_check.is_good_match}]")
 
         # Step 3: if not a good match then use the LLM call
+        if not match_check.is_good_match and revalidate:
+            # answered locally, like a degraded result not cached or stored
+            if enrichment_queue.submit(name, country):
+                RESULTS.inc("revalidating")
+                return SpellCheckResponse(suggestions=suggestions, revalidating=True)
+            RESULTS.inc("degraded")
+            return SpellCheckResponse(suggestions=suggestions, degraded=True)
+
         if not match_check.is_good_match:
-            llm_suggestions_raw = await LLM_process(name, country)
-            suggestions = [Suggestion(**s) for s in llm_suggestions_raw]
+            try:
+                suggestions = await _llm_correct(name, country, deadline)
+            except LLMUnavailable as e:
+                logger.warning(f"LLM fallback unavailable, answering with local suggestions [name: {name}, reason: {e}]")
+                RESULTS.inc("degraded")
+                # not cached or stored, so the next request tries the LLM again
+                return SpellCheckResponse(suggestions=suggestions, degraded=True)
+            RESULTS.inc("llm")
+            # confident corrections repeated often enough become local candidates
+            name_learner.record(country, suggestions)
 
-            logger.info(f"LLM_process completed [llm_suggestions_raw: {llm_suggestions_raw}]")
+            logger.info(f"LLM_process completed [suggestions: {suggestions}]")
+        else:
+            RESULTS.inc("local")
 
+        await result_cache.set(name, country, suggestions)
 
-        background_tasks.add_task(
-            save_name_metadata_background,
-            name=name,
-            country=country,
-            db_sesion=db,
-            suggestions=[s.model_dump() for s in suggestions]
-        )
+        # Persisted by the write-behind queue once the response is sent; an LLM
+        # answer without corrections is only cached, with the negative TTL
+        if suggestions:
+            background_tasks.add_task(
+                write_behind.enqueue,
+                name=name,
+                country=country,
+                suggestions=[s.model_dump() for s in suggestions]
+            )
 
         logger.info(f"Spell process completed!!")
 
@@ -57,5 +168,201 @@ async def spell_check(name: str, country: str, db: Session, background_tasks: Ba
             status_code=500,
             detail=f"Error processing: {str(e)}"
         )
-    
 
+
+async def _llm_correct(name: str, country: Optional[str], deadline: float) -> List[Suggestion]:
+    """
+    Run the LLM fallback for one name, giving up at `deadline` (event loop time).
+
+    Returns:
+        The LLM's suggestions, empty when it found no correction for the name
+
+    Raises:
+        LLMUnavailable: when the circuit breaker is open, the deadline passes
+        or the LLM gives no usable result
+    """
+    if not LLM_available():
+        LLM_FALLBACKS.inc("rejected")
+        raise LLMUnavailable("LLM circuit breaker is open")
+
+    remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+    try:
+        with stage("llm"):
+            # only this wait is cancelled, the shared upstream call (see LLMBatcher) still completes
+            llm_suggestions_raw = await asyncio.wait_for(LLM_process(name, country), remaining)
+    except asyncio.TimeoutError:
+        LLM_FALLBACKS.inc("timeout")
+        raise LLMUnavailable(f"latency budget of {LLM_LATENCY_BUDGET_MS:g}ms exhausted")
+
+    if not isinstance(llm_suggestions_raw, list):
+        LLM_FALLBACKS.inc("error")
+        raise LLMUnavailable(llm_suggestions_raw)
+    LLM_FALLBACKS.inc("ok")
+
+    return [Suggestion(**s) for s in llm_suggestions_raw]
+
+
+async def spell_check_batch(
+    items: List[CorrectionRequest],
+    db: Session,
+    background_tasks: BackgroundTasks,
+    async_db: Optional[AsyncSession] = None,
+    stale_while_revalidate: Optional[bool] = None
+) -> BatchCorrectionResponse:
+    with REQUEST_SECONDS.time("batch"):
+        return await _spell_check_batch(items, db, background_tasks, async_db, stale_while_revalidate)
+
+
+async def _spell_check_batch(
+    items: List[CorrectionRequest],
+    db: Session,
+    background_tasks: BackgroundTasks,
+    async_db: Optional[AsyncSession] = None,
+    stale_while_revalidate: Optional[bool] = None
+) -> BatchCorrectionResponse:
+    """
+    Spell check many names at once.
+
+    Identical (name, country) pairs are processed once, the existence check runs
+    as a single query, local lookups are grouped per country, only the remaining
+    weak matches go to the LLM (concurrently, within one latency budget) and
+    every new result is saved in one bulk write. Items the LLM could not
+    correct get their local suggestions, flagged as degraded, and a failing
+    item is reported in its own result.
+
+    Items with `stale_while_revalidate` (falling back to the argument, then
+    STALE_WHILE_REVALIDATE) get their weak local matches at once and are
+    enriched in the background; a name waits for the LLM as soon as one of
+    its items does not opt in.
+    """
+    try:
+        deadline = asyncio.get_running_loop().time() + LLM_LATENCY_BUDGET_MS / 1000
+        keys = list(dict.fromkeys((item.name, item.country if item.country else None) for item in items))
+        default_revalidate = STALE_WHILE_REVALIDATE if stale_while_revalidate is None else stale_while_revalidate
+        waiting_keys = {
+            (item.name, item.country if item.country else None) for item in items
+            if not (default_revalidate if item.stale_while_revalidate is None else item.stale_while_revalidate)
+        }
+        logger.info(f"Starting batch spell check [items: {len(items)}, distinct: {len(keys)}]")
+
+        spell_correct_obj = SpellCheck(db_session=db, async_session=async_db)
+
+        # Cache Check, then Existency Check for the whole batch
+        with stage("cache"):
+            results: Dict[Tuple[str, Optional[str]], List[Suggestion]] = await result_cache.get_many(keys)
+        uncached = [key for key in keys if key not in results]
+        RESULTS.inc("cache", amount=len(results))
+
+        with stage("exist_check"):
+            if async_db is not None:
+                existing = await spell_correct_obj.name_exist_check_batch_async(uncached)
+            else:
+                existing = spell_correct_obj.name_exist_check_batch(uncached)
+        results.update(existing)
+        RESULTS.inc("stored", amount=len(existing))
+        errors: Dict[Tuple[str, Optional[str]], str] = {}
+
+        logger.info(f"name_exist_check_batch completed [cached: {len(keys) - len(uncached)}, found: {len(existing)}]")
+
+        # Step 1 & 2: local suggestions grouped by country, then evaluation
+        misses_by_country: Dict[Optional[str], List[str]] = {}
+        for name, country in keys:
+            if (name, country) not in results:
+                misses_by_country.setdefault(country, []).append(name)
+
+        new_keys = []
+        llm_keys = []
+        local_results: Dict[Tuple[str, Optional[str]], List[Suggestion]] = {}
+        degraded = set()
+        revalidating = set()
+        for country, names in misses_by_country.items():
+            try:
+                local = await spell_correct_obj.get_suggestions_batch_async(names, country)
+            except Exception as e:
+                for name in names:
+                    errors[(name, country)] = str(e)
+                continue
+
+            for name in names:
+                suggestions = local[name]
+                if spell_correct_obj.evaluate_suggestions(suggestions).is_good_match:
+                    results[(name, country)] = suggestions
+                    new_keys.append((name, country))
+                    RESULTS.inc("local")
+                elif (name, country) not in waiting_keys:
+                    results[(name, country)] = suggestions
+                    if enrichment_queue.submit(name, country):
+                        revalidating.add((name, country))
+                        RESULTS.inc("revalidating")
+                    else:
+                        degraded.add((name, country))
+                        RESULTS.inc("degraded")
+                else:
+                    local_results[(name, country)] = suggestions
+                    llm_keys.append((name, country))
+
+        # Step 3: LLM only for the remaining misses
+        llm_results = await asyncio.gather(
+            *(_llm_correct(name, country, deadline) for name, country in llm_keys),
+            return_exceptions=True
+        )
+        for key, outcome in zip(llm_keys, llm_results):
+            if isinstance(outcome, LLMUnavailable):
+                results[key] = local_results[key]
+                degraded.add(key)
+                RESULTS.inc("degraded")
+            elif isinstance(outcome, Exception):
+                errors[key] = str(outcome)
+            else:
+                results[key] = outcome
+                new_keys.append(key)
+                RESULTS.inc("llm")
+                name_learner.record(key[1], outcome)
+
+        logger.info(f"Batch LLM_process completed [calls: {len(llm_keys)}, degraded: {len(degraded)}, errors: {len(errors)}]")
+
+        await result_cache.set_many({key: results[key] for key in list(existing) + new_keys})
+
+        stored_keys = [key for key in new_keys if results[key]]
+        if stored_keys:
+            background_tasks.add_task(
+                write_behind.enqueue_many,
+                entries=[(name, country, [s.model_dump() for s in results[(name, country)]]) for name, country in stored_keys]
+            )
+
+        response = []
+        for item in items:
+            key = (item.name, item.country if item.country else None)
+            suggestions = results.get(key)
+            response.append(BatchItemResult(
+                name=item.name,
+                country=key[1],
+                suggestions=_select(_restyle(item.name, suggestions), item.top_k, item.min_score) if suggestions is not None else None,
+                degraded=key in degraded,
+                revalidating=key in revalidating,
+                error=errors.get(key)
+            ))
+
+        logger.info(f"Batch spell process completed [items: {len(items)}, llm: {len(llm_keys)}, degraded: {len(degraded)}, revalidating: {len(revalidating)}]")
+
+        return BatchCorrectionResponse(results=response)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing: {str(e)}"
+        )
+
+
+def name_autocomplete(prefix: str, country: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> AutocompleteResponse:
+    """
+    Complete a partially typed name from the in-memory prefix index. Never
+    touches Postgres, the result cache or the LLM, so it can run on every keystroke.
+    """
+    with REQUEST_SECONDS.time("autocomplete"):
+        completions = name_index.complete(prefix, country, limit, fuzzy)
+
+    return AutocompleteResponse(
+        prefix=prefix,
+        completions=[Completion(name=name, edits=edits) for name, edits in completions]
+    )
@@ -0,0 +1,58 @@
+"""
+Load the static name archive into the database.
+
+Usage:
+    python -m app.load_archive
+    python -m app.load_archive --archive-dir /data/names --force
+
+Reads {archive-dir}/{country}.txt (one name per line, UTF-8) for every
+supported country. Files that have not changed since their last load are
+skipped, changed ones are merged in, adding only the names not yet
+archived. Run it before starting the API; the API also runs it at startup
+unless ARCHIVE_LOAD_ON_STARTUP is false. Running API workers pick up the
+added names without a restart (see app.services.archive_watcher).
+
+After an upgrade that changes the phonetic encodings, run it once with
+--refresh-phonetic-keys to rewrite the keys stored for archived names.
+"""
+import argparse
+import sys
+import time
+
+from app.db_config import SessionLocal, engine
+from app.models import models
+from app.services.db_interaction import ARCHIVE_DIR, DB_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the static name archive")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"directory of <country>.txt files (default: {ARCHIVE_DIR})")
+    parser.add_argument("--force", action="store_true", help="merge every file even when its content hash is unchanged")
+    parser.add_argument("--refresh-phonetic-keys", action="store_true", help="recompute the phonetic keys of every archived name")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        db_service = DB_service(db)
+        db_service.upgrade_schema()
+
+        start = time.perf_counter()
+        added = db_service.load_archive(args.archive_dir, force=args.force)
+        refreshed = db_service.refresh_phonetic_keys() if args.refresh_phonetic_keys else None
+    except Exception as e:
+        print(f"Error loading archive: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+
+    for country, count in added.items():
+        print(f"{country}: {count} names added")
+    if refreshed is not None:
+        print(f"Phonetic keys rewritten for {refreshed} names")
+    print(f"Archive loaded in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,41 @@
+import os
+from contextlib import asynccontextmanager
 from typing import Union
 
 from fastapi import FastAPI
 from app.routes.routes import router
 from app.models import models
-from app.db_config import engine
+from app.db_config import engine, SessionLocal
+from app.services.db_interaction import DB_service
+from app.services.lifecycle import load_indexes, start_services, stop_services
 from fastapi.middleware.cors import CORSMiddleware
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+ARCHIVE_LOAD_ON_STARTUP = os.getenv("ARCHIVE_LOAD_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the in-memory name index once per process, before serving traffic
+    db = SessionLocal()
+    try:
+        DB_service(db).upgrade_schema()
+        if ARCHIVE_LOAD_ON_STARTUP:
+            # cheap when the files are unchanged: only their hashes are compared
+            DB_service(db).load_archive()
+        load_indexes(db)
+    finally:
+        db.close()
+
+    await start_services()
+
+    yield
+
+    await stop_services()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -20,4 +47,4 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(router, prefix="/api", tags=["api"])
\ No newline at end of file
+app.include_router(router, prefix="/api", tags=["api"])
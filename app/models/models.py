@@ -2,7 +2,7 @@ from sqlalchemy import  Column, Integer, String, Index
 from sqlalchemy.orm import DeclarativeBase, relationship
 import json
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, DateTime, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -18,6 +18,36 @@ class NameArchieve(Base):
     
     metaphones = relationship("Metaphone", back_populates="name")
 
+    # Serves the loader's set-based merge of new names per country
+    __table_args__ = (
+        Index('idx_archive_country_name', 'country', 'name'),
+    )
+
+class ArchiveFile(Base):
+    __tablename__ = 'archive_files'
+
+    # Content hash of the last loaded static/{country}.txt, unchanged files are skipped
+    country = Column(String, primary_key=True)
+    content_hash = Column(String, nullable=False)
+    name_count = Column(Integer, nullable=False)
+    loaded_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ArchiveChange(Base):
+    __tablename__ = 'archive_changes'
+
+    # Every insert into / delete from names_archieve, written by a trigger (see
+    # DB_service.upgrade_schema) and replayed into the in-memory name index
+    id = Column(BigInteger, primary_key=True)
+    # "insert" or "delete"
+    op = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    country = Column(String, nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_archive_changes_changed_at', 'changed_at'),
+    )
+
 class Metaphone(Base):
     __tablename__ = 'metaphones'
     
@@ -32,18 +62,57 @@ class Metaphone(Base):
         Index('idx_metaphone', 'metaphone'),
     )
 
+class PhoneticKey(Base):
+    __tablename__ = 'phonetic_keys'
+
+    # One key per (name, encoding), see app.services.phonetics.PHONETIC_ENCODINGS
+    name_id = Column(Integer, ForeignKey('names_archieve.id'), primary_key=True)
+    encoding = Column(String, primary_key=True)
+    key = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index('idx_phonetic_encoding_key', 'encoding', 'key'),
+    )
+
+class LearnedName(Base):
+    __tablename__ = 'learned_names'
+
+    # Names suggested by the LLM, indexed next to the archive once promoted
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    # normalize_name(name)
+    lookup_key = Column(String, nullable=False)
+    country = Column(String, nullable=False)
+    # confident LLM suggestions of the name so far, and the best confidence
+    hits = Column(Integer, nullable=False)
+    max_score = Column(Float, nullable=False)
+    first_seen = Column(DateTime(timezone=True), server_default=func.now())
+    promoted_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('uq_learned_names_lookup_country', 'lookup_key', 'country', unique=True),
+        Index('idx_learned_names_promoted_at', 'promoted_at'),
+    )
+
 class InputNames(Base):
     __tablename__ = 'input_names'
     
     id = Column(Integer, primary_key=True)
     
     name = Column(String, nullable=False)
+    # normalize_name(name), the key existence checks look results up by
+    lookup_key = Column(String, nullable=False)
     country = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # One-to-many relationship with CorrectedNames
     corrected_names = relationship("CorrectedNames", back_populates="input_name")
 
+    # One canonical stored result per (lookup key, country)
+    __table_args__ = (
+        Index('uq_input_names_lookup_country', 'lookup_key', 'country', unique=True),
+    )
+
 class CorrectedNames(Base):
     __tablename__ = 'corrected_names'
     
@@ -58,7 +127,13 @@ class CorrectedNames(Base):
     input_name = relationship("InputNames", back_populates="corrected_names")
     
     __table_args__ = (
-        Index('idx_input_name_id', 'input_name_id'),
+        # covers the existence check: suggestions of an input row, best first
+        Index(
+            'idx_corrected_input_score',
+            input_name_id,
+            similarity_score.desc(),
+            postgresql_include=['suggested_name']
+        ),
         Index('idx_similarity_score', 'similarity_score'),
     )
 
@@ -7,6 +7,9 @@ T = TypeVar('T')
 class CorrectionRequest(BaseModel):
     name: str
     country: str = None
+    top_k: Optional[int] = Field(None, ge=1, description="Maximum number of suggestions returned, at most SUGGESTIONS_TOP_K.")
+    min_score: Optional[float] = Field(None, ge=0.0, le=1.0, description="Minimum similarity score of the suggestions returned.")
+    stale_while_revalidate: Optional[bool] = Field(None, description="Return weak local suggestions at once and enrich them with the LLM in the background, defaults to STALE_WHILE_REVALIDATE.")
 
 class Response(GenericModel, Generic[T]):
     code: str
@@ -25,9 +28,31 @@ class Suggestion(BaseModel):
 
 class SpellCheckResponse(BaseModel):
     suggestions: List[Suggestion] = Field(..., description="List of spelling suggestions with similarity scores.")
+    degraded: bool = Field(False, description="The LLM was unavailable or too slow, the suggestions are the best local ones.")
+    revalidating: bool = Field(False, description="Weak local suggestions returned at once, the LLM result is being computed for the next request.")
 
 class EvaluationResponse(BaseModel):
     is_good_match: bool
     filtered_suggestions: List[Suggestion] = Field(..., description="Suggestions that meet the evaluation criteria.")
 
+class BatchCorrectionRequest(BaseModel):
+    items: List[CorrectionRequest] = Field(..., description="Names to correct, duplicates are processed once.")
 
+class BatchItemResult(BaseModel):
+    name: str
+    country: Optional[str] = None
+    suggestions: Optional[List[Suggestion]] = None
+    degraded: bool = False
+    revalidating: bool = False
+    error: Optional[str] = None
+
+class BatchCorrectionResponse(BaseModel):
+    results: List[BatchItemResult] = Field(..., description="One result per requested item, in request order.")
+
+class Completion(BaseModel):
+    name: str
+    edits: int = Field(..., description="0 when the name starts with the prefix, 1 when it starts with a one-edit variant of it.")
+
+class AutocompleteResponse(BaseModel):
+    prefix: str
+    completions: List[Completion] = Field(..., description="Archive names completing the prefix, best first.")
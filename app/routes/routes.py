@@ -1,14 +1,27 @@
+import io
+import shutil
+import tempfile
 from fastapi import APIRouter, HTTPException, Path, Request
-from fastapi import Depends, BackgroundTasks
-from app.db_config import SessionLocal
-from app.controller.controller import spell_check
-from app.models.scheme import CorrectionRequest, Response
-from app.services.db_interaction import DB_service
+from fastapi import Depends, BackgroundTasks, File, Query, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from app.db_config import AsyncSessionLocal, SessionLocal
+from app.controller.controller import name_autocomplete, spell_check, spell_check_batch
+from app.controller.bulk_controller import detect_format, parse_rows, stream_bulk_correction
+from app.models.scheme import BatchCorrectionRequest, CorrectionRequest, Response
+from app.services.metrics import CONTENT_TYPE, metrics
+from app.services.prefix_index import AUTOCOMPLETE_MAX_RESULTS
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from typing import Optional
+import os
 
 
 router = APIRouter()
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+
 
 def get_db():
     db = SessionLocal()
@@ -17,27 +30,37 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 @router.get("/")
 def read_root():
+    # the archive is loaded at startup or with `python -m app.load_archive`, not per request
+    return {"Hello": "World"}
 
-    data = DB_service()
-
-    data.initialize_database()
 
-    return {"Hello": "World"}
+@router.get("/metrics")
+def read_metrics():
+    """Process metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
 
 
 @router.post("/name-correction")
 async def spell_suggest(
     request: CorrectionRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
 ):
     try:
         name = request.name
         country = request.country if request.country else None
         
-        suggested_names = await spell_check(name, country, db, background_tasks)
+        suggested_names = await spell_check(
+            name, country, db, background_tasks, async_db,
+            request.top_k, request.min_score, request.stale_while_revalidate
+        )
         
         return Response(
             status="Ok",
@@ -50,4 +73,73 @@ async def spell_suggest(
         raise HTTPException(
             status_code=400,
             detail=f"Error processing: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/name-correction/batch")
+async def spell_suggest_batch(
+    request: BatchCorrectionRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
+):
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(request.items)} items (max {MAX_BATCH_SIZE})"
+        )
+
+    try:
+        batch_result = await spell_check_batch(request.items, db, background_tasks, async_db)
+
+        return Response(
+            status="Ok",
+            code="200",
+            message="Successfully processed",
+            result=batch_result
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing: {str(e)}"
+        )
+
+
+@router.post("/name-correction/bulk")
+async def spell_suggest_bulk(
+    file: UploadFile = File(...),
+    input_format: str = Query(None, alias="format", pattern="^(csv|ndjson)$")
+):
+    """Stream NDJSON corrections for an uploaded CSV / NDJSON file while it is processed"""
+    input_format = input_format or detect_format(file.filename)
+
+    # The upload is closed as soon as this handler returns, before the response
+    # is streamed, so it is copied (in blocks, to disk) to a file we own, in a
+    # worker thread so a large upload does not block the event loop
+    spool = tempfile.TemporaryFile()
+    await run_in_threadpool(shutil.copyfileobj, file.file, spool)
+    spool.seek(0)
+    lines = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+
+    return StreamingResponse(
+        stream_bulk_correction(parse_rows(lines, input_format)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(lines.close)
+    )
+
+
+@router.get("/name-autocomplete")
+async def autocomplete_name(
+    prefix: str = Query(..., min_length=1, max_length=64),
+    country: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=AUTOCOMPLETE_MAX_RESULTS),
+    fuzzy: bool = True
+):
+    """Archive names completing a partially typed name, from memory only, for search-as-you-type forms"""
+    return Response(
+        status="Ok",
+        code="200",
+        message="Successfully processed",
+        result=name_autocomplete(prefix, country, limit, fuzzy)
+    )
@@ -0,0 +1,229 @@
+import asyncio
+import fcntl
+import logging
+import os
+import sys
+from typing import Optional
+
+from app.db_config import AsyncSessionLocal, SessionLocal, async_engine
+from app.services.db_interaction import ARCHIVE_CHANGES_CHANNEL, DB_service
+from app.services.index_snapshot import read_snapshot_meta
+from app.services.metrics import metrics
+from app.services.name_index import INDEX_SNAPSHOT_PATH, name_index
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_WATCH_ENABLED = os.getenv("ARCHIVE_WATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# How often the change log is polled when no notification arrives (lost LISTEN connection)
+ARCHIVE_WATCH_INTERVAL = float(os.getenv("ARCHIVE_WATCH_INTERVAL", "30"))
+# Inserted and deleted rows kept in the delta before the base index is rebuilt instead;
+# lookups in the delta's dictionaries are slower than in the base arrays, so this bounds their cost
+ARCHIVE_DELTA_MAX_ROWS = int(os.getenv("ARCHIVE_DELTA_MAX_ROWS", "10000"))
+
+
+class ArchiveWatcher():
+    """
+    Keeps the in-memory name index in sync with the archive in Postgres.
+
+    Every archive write is logged to archive_changes by a trigger, which
+    also sends a NOTIFY on commit (see DB_service._install_archive_change_log).
+    The watcher LISTENs for it, polling every `interval` seconds as well in
+    case the listening connection is lost, and replays the changes logged
+    after the index's change id with NameIndex.apply_changes: only the
+    inserted and deleted rows are indexed, in a thread, row by row, so
+    lookups never wait for more than one row.
+
+    A backlog that would grow the delta beyond `max_delta_rows` (a large
+    country file loaded) rebuilds the base index instead: a separate process
+    runs app.build_index_snapshot, so serving does not compete with the
+    build for the GIL, and the new snapshot is memory-mapped. Workers on one
+    host take turns on a file lock and reuse a snapshot another one just
+    built. Without a snapshot path the index is rebuilt in a thread.
+    """
+
+    def __init__(
+        self,
+        interval: float = ARCHIVE_WATCH_INTERVAL,
+        max_delta_rows: int = ARCHIVE_DELTA_MAX_ROWS,
+        snapshot_path: Optional[str] = INDEX_SNAPSHOT_PATH,
+        enabled: bool = ARCHIVE_WATCH_ENABLED
+    ):
+        self.interval = interval
+        self.max_delta_rows = max_delta_rows
+        self.snapshot_path = snapshot_path
+        self.enabled = enabled
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # pooled connection held for LISTEN, and its asyncpg connection
+        self._listen_connection = None
+        self._listener = None
+
+        self.applied = 0
+        self.skipped = 0
+        self.rebuilds = 0
+        self.rebuild_failures = 0
+        self.failed = 0
+
+    def start(self):
+        """Start watching on the running event loop"""
+        if not self.enabled or self._task is not None:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._unlisten()
+
+    def _notified(self, connection, pid, channel, payload):
+        self._wakeup.set()
+
+    async def _listen(self):
+        """(Re)subscribe to the change notifications, polling goes on when it fails"""
+        if self._listener is not None and not self._listener.is_closed():
+            return
+
+        await self._unlisten()
+        try:
+            self._listen_connection = await async_engine.connect()
+            self._listener = (await self._listen_connection.get_raw_connection()).driver_connection
+            await self._listener.add_listener(ARCHIVE_CHANGES_CHANNEL, self._notified)
+        except Exception as e:
+            logger.warning(f"Listening for archive changes failed, polling every {self.interval}s [error: {e!r}]")
+            await self._unlisten()
+
+    async def _unlisten(self):
+        connection, listener = self._listen_connection, self._listener
+        self._listen_connection, self._listener = None, None
+        if connection is None:
+            return
+
+        try:
+            # the subscription would outlive the checkout on the pooled connection
+            if listener is not None and not listener.is_closed():
+                await listener.remove_listener(ARCHIVE_CHANGES_CHANNEL, self._notified)
+            await connection.close()
+        except Exception as e:
+            logger.warning(f"Closing the archive changes listener failed [error: {e!r}]")
+
+    async def _run(self):
+        while True:
+            await self._listen()
+            # changes committed while not listening (startup, reconnect) are picked up right away
+            await self.sync()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def sync(self):
+        """Apply every archive change logged after the index's change id"""
+        rebuild = True
+        while True:
+            # one row more than the delta has room for tells whether the backlog fits;
+            # after a failed rebuild the delta takes the backlog in pages
+            room = max(self.max_delta_rows - name_index.delta_size, 0)
+            limit = room + 1 if rebuild else self.max_delta_rows
+            try:
+                async with AsyncSessionLocal() as db:
+                    changes = await DB_service(None, db).fetch_archive_changes_async(name_index.change_id, limit)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Reading archive changes failed [error: {e!r}]")
+                return
+
+            if not changes:
+                return
+
+            if rebuild and len(changes) > room:
+                if await self._rebuild(changes[-1][0]):
+                    continue
+                # the next sync tries again
+                rebuild = False
+
+            applied = await asyncio.to_thread(name_index.apply_changes, changes)
+            self.applied += applied
+            self.skipped += len(changes) - applied
+            if len(changes) < limit:
+                return
+
+    async def _rebuild(self, change_id: int) -> bool:
+        """
+        Swap in a base index built from the archive as of at least `change_id`.
+
+        Returns:
+            False when the build failed, the changes are then applied to the delta
+        """
+        logger.info(f"Archive backlog exceeds the delta, rebuilding the name index [from change: {name_index.change_id}, to change: {change_id}]")
+        try:
+            if self.snapshot_path:
+                await self._build_snapshot(change_id)
+                await asyncio.to_thread(name_index.open_snapshot, self.snapshot_path)
+            else:
+                await asyncio.to_thread(self._build_index)
+        except Exception as e:
+            self.rebuild_failures += 1
+            logger.error(f"Rebuilding the name index failed [error: {e!r}]")
+            return False
+
+        self.rebuilds += 1
+        return True
+
+    async def _build_snapshot(self, change_id: int):
+        """Build the snapshot in a separate process, unless another worker already built a recent enough one"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        lock_fd = os.open(f"{self.snapshot_path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+
+            meta = read_snapshot_meta(self.snapshot_path)
+            if name_index.snapshot_matches(meta) and meta.get("change_id", 0) >= change_id:
+                return
+
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "app.build_index_snapshot", "-o", self.snapshot_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            output, _ = await process.communicate()
+            if process.returncode:
+                raise RuntimeError(f"app.build_index_snapshot exited with {process.returncode}: {output.decode(errors='replace')[-500:]}")
+        finally:
+            # closing the descriptor releases the lock
+            os.close(lock_fd)
+
+    def _build_index(self):
+        db = SessionLocal()
+        try:
+            name_index.load(db, snapshot_path=None)
+        finally:
+            db.close()
+
+
+archive_watcher = ArchiveWatcher()
+
+metrics.counter_callback(
+    "archive_changes_total",
+    "Archive changes replayed into the name index: applied, or skipped (already reflected)",
+    lambda: {("applied",): archive_watcher.applied, ("skipped",): archive_watcher.skipped},
+    ["outcome"]
+)
+metrics.counter_callback(
+    "archive_index_rebuilds_total",
+    "Base name index rebuilds for archive backlogs larger than the delta, ok or failed",
+    lambda: {("ok",): archive_watcher.rebuilds, ("failed",): archive_watcher.rebuild_failures},
+    ["outcome"]
+)
+metrics.counter_callback("archive_watch_errors_total", "Failed reads of the archive change log", lambda: archive_watcher.failed)
+metrics.gauge_callback("name_index_change_id", "Id of the last archive change reflected in the name index", lambda: name_index.change_id)
@@ -0,0 +1,127 @@
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker():
+    """
+    Circuit breaker over a rolling time window of call outcomes.
+
+    Closed: calls go through and their outcome (failed, slow) is recorded.
+    Once the window holds at least `min_calls` calls and the share of failed
+    or of slow calls reaches its threshold, the breaker opens. Open: calls
+    are rejected for `open_seconds`. Half-open: one probe call goes through,
+    its success closes the breaker with an empty window, its failure (or
+    slowness) opens it again.
+
+    Only used from the event loop, so the state is not locked.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self.transitions = {state: 0 for state in STATES}
+        self.rejected = 0
+        # (monotonic time, failed, slow) of the calls in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+    def _expire(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _transition(self, state: str, now: float):
+        if state == self.state:
+            return
+
+        logger.warning(f"Circuit breaker {self.name} {self.state} -> {state} [calls: {len(self._calls)}, failures: {self._failures}, slow: {self._slow}]")
+        self.state = state
+        self.transitions[state] += 1
+        self._probe_started = None
+        if state == OPEN:
+            self._opened_at = now
+        else:
+            self._calls.clear()
+            self._failures = self._slow = 0
+
+    def is_open(self) -> bool:
+        """Whether a call made now would be rejected, without taking the half-open probe slot"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            return now - self._opened_at < self.open_seconds
+        if self.state == HALF_OPEN:
+            # a probe that never reported back (cancelled) frees the slot after open_seconds
+            return self._probe_started is not None and now - self._probe_started < self.open_seconds
+        return False
+
+    def acquire(self):
+        """
+        Call before every provider call.
+
+        Raises:
+            CircuitOpenError: when the breaker is open, or half-open with the probe already running
+        """
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, now)
+
+        if self.is_open():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit breaker is {self.state}")
+
+        if self.state == HALF_OPEN:
+            self._probe_started = now
+
+    def record(self, seconds: float, failed: bool):
+        """Record the outcome of a call let through by acquire()"""
+        now = time.monotonic()
+        slow = seconds >= self.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            self._transition(OPEN if failed or slow else CLOSED, now)
+            return
+        if self.state == OPEN:
+            # a call started before the breaker opened
+            return
+
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._expire(now)
+
+        calls = len(self._calls)
+        if calls >= self.min_calls and (self._failures >= self.failure_rate * calls or self._slow >= self.slow_call_rate * calls):
+            self._transition(OPEN, now)
@@ -1,80 +1,531 @@
 
 from app.models import models
-from app.models.models import CorrectedNames, InputNames, NameArchieve, Metaphone 
-import jellyfish
+from app.models.models import ArchiveChange, ArchiveFile, CorrectedNames, InputNames, LearnedName, NameArchieve, Metaphone, PhoneticKey
+import csv
+import hashlib
+import logging
+import os
+import tempfile
 from pathlib import Path
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.services.phonetics import PHONETIC_ENCODINGS, phonetic_keys
+from app.utils.utils import normalize_name
+
+logger = logging.getLogger(__name__)
 
 COUNTRIES = ["Denmark", "Finland", "Iceland", "Norway", "Sweden"]
 
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "static")
+# pg_advisory_xact_lock key held while the archive is being loaded, and by every archive write (see _install_archive_change_log)
+ARCHIVE_LOAD_LOCK_ID = 7320451
+# NOTIFY channel of the archive change log, signalled on commit of every archive write
+ARCHIVE_CHANGES_CHANNEL = "name_archive_changes"
+ARCHIVE_CHANGES_RETENTION_DAYS = int(os.getenv("ARCHIVE_CHANGES_RETENTION_DAYS", "7"))
+# legacy input rows given a lookup key per statement by upgrade_schema
+LOOKUP_KEY_BACKFILL_BATCH = int(os.getenv("LOOKUP_KEY_BACKFILL_BATCH", "10000"))
+
 
 class DB_service():
 
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, async_session: Optional[AsyncSession] = None):
         self.db = db_session
+        self.async_db = async_session
         
     def initialize_database(self):
-        """Using bulk insert operations for maximum performance"""
-        
+        """Load the static name archive, see load_archive"""
+        try:
+            return self.load_archive()
+        except Exception as e:
+            print(f"Error in bulk operation: {e}")
+            return {}
+
+    def load_archive(self, archive_dir: str = ARCHIVE_DIR, force: bool = False) -> Dict[str, int]:
+        """
+        Merge the {archive_dir}/{country}.txt name files into the archive tables.
+
+        A file whose content hash matches its last load is skipped unless
+        `force` is set. Changed files are streamed through COPY into a staging
+        table and merged set-based, see _merge_archive_file. Names are only
+        added, never removed, so names saved by other means survive a reload.
+        Every added name is logged to archive_changes for the running API
+        workers, entries older than ARCHIVE_CHANGES_RETENTION_DAYS are pruned.
+        Concurrent loaders (several workers starting at once) are serialized
+        by an advisory lock and everything is committed once at the end.
+
+        Returns:
+            Dictionary of country -> number of names added (0 when skipped)
+
+        Raises:
+            Exception: any database or file error, after rolling back
+        """
+        added = {}
+
         try:
+            self.db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": ARCHIVE_LOAD_LOCK_ID})
+            # keeps the staging sorts of a large file in memory
+            self.db.execute(text("SET LOCAL work_mem = '256MB'"))
+            self.db.execute(
+                delete(ArchiveChange).where(ArchiveChange.changed_at < func.now() - text(f"interval '{ARCHIVE_CHANGES_RETENTION_DAYS} days'"))
+            )
+            loaded_hashes = dict(self.db.query(ArchiveFile.country, ArchiveFile.content_hash).all())
+
             for country in COUNTRIES:
-                file_path = Path(f"static/{country}.txt")
+                file_path = Path(archive_dir) / f"{country}.txt"
                 if not file_path.exists():
                     continue
-                    
-                with open(file_path, 'r') as f:
-                    names = [line.strip() for line in f if line.strip()]
-                    
-                    # Get existing names in one query
-                    existing_names = {n.name for n in self.db.query(NameArchieve.name)
-                                    .filter(NameArchieve.country == country)
-                                    .all()}
-                    
-                    # Filter new names
-                    new_names = [name for name in names if name not in existing_names]
-                    
-                    if not new_names:
-                        continue
-                    
-                    # Bulk insert names
-                    name_records = [{"name": name, "country": country} for name in new_names]
-                    self.db.bulk_insert_mappings(NameArchieve, name_records)
-                    self.db.flush()
-                    
-                    # Get IDs for the new names
-                    inserted = self.db.query(NameArchieve).filter(
-                        NameArchieve.country == country,
-                        NameArchieve.name.in_(new_names)
-                    ).all()
-                    
-                    # Bulk insert metaphones
-                    metaphones = [
-                        {"name_id": n.id, "metaphone": jellyfish.metaphone(n.name)}
-                        for n in inserted
-                    ]
-                    self.db.bulk_insert_mappings(Metaphone, metaphones)
-                    
+
+                content_hash = self._file_digest(file_path)
+                if not force and loaded_hashes.get(country) == content_hash:
+                    added[country] = 0
+                    continue
+
+                added[country], name_count = self._merge_archive_file(country, file_path)
+
+                statement = pg_insert(ArchiveFile).values(
+                    country=country, content_hash=content_hash, name_count=name_count
+                )
+                self.db.execute(statement.on_conflict_do_update(
+                    index_elements=[ArchiveFile.country],
+                    set_={"content_hash": content_hash, "name_count": name_count, "loaded_at": func.now()}
+                ))
+
             self.db.commit()
-        except Exception as e:
+        except Exception:
             self.db.rollback()
-            print(f"Error in bulk operation: {e}")
-        
+            raise
+
+        return added
+
+    def _file_digest(self, file_path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _spool_archive_file(self, file_path: Path):
+        """
+        Stream a names file into a CSV spool of (name, *phonetic keys) rows for
+        COPY, computing the keys of every encoding on the way.
+
+        Returns:
+            tuple: (spool file positioned at the start, number of names)
+        """
+        spool = tempfile.TemporaryFile('w+', encoding='utf-8', newline='')
+        writer = csv.writer(spool)
+        name_count = 0
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                name = line.strip()
+                if name:
+                    writer.writerow((name,) + phonetic_keys(name))
+                    name_count += 1
+
+        spool.seek(0)
+        return spool, name_count
+
+    def _merge_archive_file(self, country: str, file_path: Path) -> Tuple[int, int]:
+        """
+        COPY one names file into the staging table, then insert the names the
+        country does not have yet together with their metaphones and phonetic
+        keys in a single statement.
+
+        Returns:
+            tuple: (names added, names in the file)
+        """
+        spool, name_count = self._spool_archive_file(file_path)
+        # one staging column per encoding, named after it
+        columns = ", ".join(("name",) + PHONETIC_ENCODINGS)
+
+        with spool:
+            self.db.execute(text(
+                f"CREATE TEMP TABLE IF NOT EXISTS archive_staging "
+                f"(name TEXT, {', '.join(f'{encoding} TEXT' for encoding in PHONETIC_ENCODINGS)}) ON COMMIT DROP"
+            ))
+            self.db.execute(text("TRUNCATE archive_staging"))
+
+            cursor = self.db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY archive_staging ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({columns}))",
+                    spool
+                )
+            finally:
+                cursor.close()
+
+        # temp tables are not auto-analyzed, the merge plan needs the row count
+        self.db.execute(text("ANALYZE archive_staging"))
+
+        encoding_keys = ", ".join(f"('{encoding}', staged.{encoding})" for encoding in PHONETIC_ENCODINGS)
+
+        # ids are drawn up front so every table is filled from the staged rows, without a join back
+        added = self.db.execute(text(f"""
+            WITH staged AS (
+                SELECT nextval(pg_get_serial_sequence('names_archieve', 'id')) AS id, {columns}
+                FROM (
+                    SELECT DISTINCT ON (name) {columns}
+                    FROM archive_staging s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM names_archieve a WHERE a.country = :country AND a.name = s.name
+                    )
+                ) new_names
+            ),
+            inserted AS (
+                INSERT INTO names_archieve (id, name, country)
+                SELECT id, name, :country FROM staged
+            ),
+            keys AS (
+                INSERT INTO phonetic_keys (name_id, encoding, key)
+                SELECT staged.id, k.encoding, k.key
+                FROM staged CROSS JOIN LATERAL (VALUES {encoding_keys}) AS k (encoding, key)
+                WHERE k.key <> ''
+            )
+            INSERT INTO metaphones (name_id, metaphone)
+            SELECT id, metaphone FROM staged
+        """), {"country": country}).rowcount
+
+        return added, name_count
+
+    def _backfill_phonetic_keys(self):
+        """Phonetic keys for archive names loaded before the phonetic_keys table existed"""
+        missing = self.db.execute(text(
+            "SELECT id, name FROM names_archieve a "
+            "WHERE NOT EXISTS (SELECT 1 FROM phonetic_keys p WHERE p.name_id = a.id)"
+        )).all()
+
+        rows = [
+            {"name_id": row.id, "encoding": encoding, "key": key}
+            for row in missing
+            for encoding, key in zip(PHONETIC_ENCODINGS, phonetic_keys(row.name))
+            if key
+        ]
+        if rows:
+            self.db.execute(insert(PhoneticKey), rows)
+
+    def refresh_phonetic_keys(self) -> int:
+        """
+        Recompute the stored phonetic keys of every archive name, after the
+        encodings changed (see app.services.phonetics). Only the names whose
+        keys differ are rewritten.
+
+        Returns:
+            Number of names whose keys were rewritten
+        """
+        stored: Dict[int, Dict[str, str]] = {}
+        for name_id, encoding, key in self.db.execute(select(PhoneticKey.name_id, PhoneticKey.encoding, PhoneticKey.key)):
+            stored.setdefault(name_id, {})[encoding] = key
+
+        changed: Dict[int, Dict[str, str]] = {}
+        for name_id, name in self.db.execute(select(NameArchieve.id, NameArchieve.name)):
+            keys = {encoding: key for encoding, key in zip(PHONETIC_ENCODINGS, phonetic_keys(name)) if key}
+            if stored.get(name_id, {}) != keys:
+                changed[name_id] = keys
+
+        try:
+            if changed:
+                self.db.execute(delete(PhoneticKey).where(PhoneticKey.name_id.in_(list(changed))))
+                rows = [
+                    {"name_id": name_id, "encoding": encoding, "key": key}
+                    for name_id, keys in changed.items()
+                    for encoding, key in keys.items()
+                ]
+                if rows:
+                    self.db.execute(insert(PhoneticKey), rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return len(changed)
+
+    def _install_archive_change_log(self):
+        """
+        Statement-level triggers logging every names_archieve insert and delete
+        (an update as both) to archive_changes and notifying ARCHIVE_CHANGES_CHANNEL.
+
+        The triggers take the archive lock, so writers are serialized up to
+        their commit and change ids become visible in increasing order: a
+        reader that has seen id N will never see a smaller one appear later.
+        """
+        # workers starting at once would race on replacing the function
+        self.db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": ARCHIVE_LOAD_LOCK_ID})
+        self.db.execute(text(f"""
+            CREATE OR REPLACE FUNCTION log_archive_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_advisory_xact_lock({ARCHIVE_LOAD_LOCK_ID});
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    INSERT INTO archive_changes (op, name, country) SELECT 'delete', name, country FROM old_rows ORDER BY id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO archive_changes (op, name, country) SELECT 'insert', name, country FROM new_rows ORDER BY id;
+                END IF;
+                -- identical notifications of one transaction are delivered once, on commit
+                PERFORM pg_notify('{ARCHIVE_CHANGES_CHANNEL}', '');
+                RETURN NULL;
+            END $$
+        """))
+        for event, tables in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ):
+            # dropped and created in this transaction, CREATE OR REPLACE TRIGGER needs Postgres 14
+            self.db.execute(text(f"DROP TRIGGER IF EXISTS names_archieve_log_{event.lower()} ON names_archieve"))
+            self.db.execute(text(
+                f"CREATE TRIGGER names_archieve_log_{event.lower()} AFTER {event} ON names_archieve "
+                f"REFERENCING {tables} FOR EACH STATEMENT EXECUTE FUNCTION log_archive_changes()"
+            ))
+
+    def archive_version(self) -> str:
+        """
+        Version of the archive contents, computed in the database: the sum of a
+        64-bit digest of every (country, name) row fetch_archive returns, so it
+        does not depend on row order. Matches NameIndex.version for an index
+        built from the same rows (see name_index.archive_digest).
+        """
+        total = self.db.execute(text(
+            "SELECT coalesce(sum(('x' || substr(md5(country || E'\\t' || name), 1, 16))::bit(64)::bigint), 0) "
+            "FROM names_archieve JOIN metaphones ON metaphones.name_id = names_archieve.id"
+        )).scalar()
+        return f"{int(total) % 2 ** 64:016x}"
+
+    def fetch_archive(self):
+        """Return every archive name as (name, country, metaphone) rows"""
+        return self.db.query(
+            NameArchieve.name, NameArchieve.country, Metaphone.metaphone
+        ).join(Metaphone).all()
+
+    def archive_change_id(self) -> int:
+        """Id of the latest archive change logged, 0 when there is none"""
+        return self.db.execute(select(func.coalesce(func.max(ArchiveChange.id), 0))).scalar()
+
+    async def fetch_archive_changes_async(self, after_id: int, limit: int) -> List[Tuple[int, str, str, str]]:
+        """
+        Archive changes logged after `after_id`, oldest first.
+
+        Returns:
+            Up to `limit` (id, op, name, country) rows, op is "insert" or "delete"
+        """
+        result = await self.async_db.execute(
+            select(ArchiveChange.id, ArchiveChange.op, ArchiveChange.name, ArchiveChange.country)
+            .where(ArchiveChange.id > after_id)
+            .order_by(ArchiveChange.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+    def upgrade_schema(self):
+        """
+        Bring a database created by an older version up to date: migrate
+        input_names to one row per (lookup key, country), backfill the
+        phonetic keys of archive names, create the indexes added since
+        (unique lookup, covering score and archive merge indexes) and install
+        the archive change log triggers.
+
+        Runs at every worker start, so an up to date database only costs
+        catalog lookups. The input_names migration scans and locks the whole
+        table; run `python -m app.load_archive` once before deploying a
+        version that needs it, rather than leaving it to the workers.
+
+        Raises:
+            Exception: when the upgrade failed, after rolling it back; the
+            workers must not serve without the change log triggers
+        """
+        try:
+            # workers starting at once would race on the migration and on replacing the triggers
+            self.db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": ARCHIVE_LOAD_LOCK_ID})
+
+            if not self._input_names_migrated():
+                self._migrate_input_names()
+
+            self._backfill_phonetic_keys()
+
+            self.db.execute(text("DROP INDEX IF EXISTS idx_input_name_id"))
+            for table in (NameArchieve.__table__, InputNames.__table__, CorrectedNames.__table__):
+                for index in table.indexes:
+                    index.create(bind=self.db.connection(), checkfirst=True)
+
+            self._install_archive_change_log()
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            logger.exception("Upgrading the database schema failed")
+            raise
+
+    def _input_names_migrated(self) -> bool:
+        """Whether input_names has its lookup_key column and the unique (lookup key, country) index"""
+        return self.db.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'input_names' AND column_name = 'lookup_key'
+            ) AND EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = current_schema() AND tablename = 'input_names' AND indexname = 'uq_input_names_lookup_country'
+            )
+        """)).scalar()
+
+    def _migrate_input_names(self):
+        """
+        Add and backfill input_names.lookup_key and keep only the latest input
+        row per (lookup key, country), so the unique index can be created
+        """
+        logger.info("Migrating input_names to one row per (lookup key, country)")
+        self.db.execute(text("ALTER TABLE input_names ADD COLUMN IF NOT EXISTS lookup_key VARCHAR"))
+        self.db.execute(text("UPDATE input_names SET country = '' WHERE country IS NULL"))
+
+        # normalize_name runs in Python, legacy rows are keyed a batch at a time
+        last_id = 0
+        while True:
+            missing = self.db.execute(
+                text("SELECT id, name FROM input_names WHERE lookup_key IS NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": LOOKUP_KEY_BACKFILL_BATCH}
+            ).all()
+            if not missing:
+                break
+            self.db.execute(
+                text("UPDATE input_names SET lookup_key = :lookup_key WHERE id = :id"),
+                [{"id": row.id, "lookup_key": normalize_name(row.name)} for row in missing]
+            )
+            last_id = missing[-1].id
+
+        # older rows of a duplicated key go, with their suggestions
+        self.db.execute(text("""
+            CREATE TEMPORARY TABLE duplicate_input_names ON COMMIT DROP AS
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY lookup_key, country ORDER BY id DESC) AS rank
+                FROM input_names
+            ) ranked WHERE rank > 1
+        """))
+        self.db.execute(text("DELETE FROM corrected_names WHERE input_name_id IN (SELECT id FROM duplicate_input_names)"))
+        self.db.execute(text("DELETE FROM input_names WHERE id IN (SELECT id FROM duplicate_input_names)"))
+
+        self.db.execute(text("ALTER TABLE input_names ALTER COLUMN lookup_key SET NOT NULL"))
+
+    def _canonical_entries(self, entries):
+        """
+        Collapse (name, country, suggestions) results to one per (lookup key, country),
+        the last result for a key wins. A missing country is stored as "" since
+        input_names.country is NOT NULL.
+        """
+        canonical = {}
+        for name, country, suggestions in entries:
+            canonical[(normalize_name(name), country or "")] = (name, suggestions)
+        return canonical
+
+    def _upsert_input_names_statement(self):
+        """Insert input rows, or refresh the canonical row already stored for the key"""
+        statement = pg_insert(InputNames)
+        return statement.on_conflict_do_update(
+            index_elements=[InputNames.lookup_key, InputNames.country],
+            set_={"name": statement.excluded.name, "created_at": func.now()}
+        ).returning(InputNames.id, InputNames.lookup_key, InputNames.country)
+
+    def _save_statements(self, canonical, upserted_rows):
+        """Statements replacing the stored suggestions of the upserted input rows"""
+        input_ids = {(lookup_key, country): input_id for input_id, lookup_key, country in upserted_rows}
+
+        corrected_rows = [
+            {
+                "input_name_id": input_ids[key],
+                "suggested_name": suggestion.get("name"),
+                "similarity_score": suggestion.get("similarity_score")
+            }
+            for key, (_, suggestions) in canonical.items()
+            for suggestion in suggestions
+        ]
+
+        statements = [(delete(CorrectedNames).where(CorrectedNames.input_name_id.in_(list(input_ids.values()))), None)]
+        if corrected_rows:
+            statements.append((insert(CorrectedNames), corrected_rows))
+        return statements
+
     def save_name_metadata(self, name, country, suggestions):
+        """Store the canonical result for one (name, country)"""
         try: 
-            new_name = InputNames(name=name, country=country)
-            self.db.add(new_name)
-            self.db.flush()
-    
-            for suggestion in suggestions:
-                corrected_name = CorrectedNames(
-                    input_name_id = new_name.id,
-                    suggested_name = suggestion.get("name"),
-                    similarity_score = suggestion.get("similarity_score")
-                )
-                self.db.add(corrected_name)
+            canonical = self._canonical_entries([(name, country, suggestions)])
+            upserted_rows = self.db.execute(
+                self._upsert_input_names_statement(),
+                [{"name": n, "lookup_key": key, "country": c} for (key, c), (n, _) in canonical.items()]
+            ).all()
+
+            for statement, params in self._save_statements(canonical, upserted_rows):
+                self.db.execute(statement, params)
 
             self.db.commit()
             
         except Exception as e:
+            self.db.rollback()
             print(f"Error saving data: {e}")
             return None
+
+    async def save_name_metadata_bulk_async(self, entries):
+        """
+        Store the canonical results of several (name, country, suggestions)
+        entries on the async session: one multi-row upsert of the input rows,
+        then their suggestions are replaced, with a single commit. Errors are
+        raised to the caller (the write-behind queue counts and logs them).
+        """
+        canonical = self._canonical_entries(entries)
+        upserted_rows = (await self.async_db.execute(
+            self._upsert_input_names_statement(),
+            [{"name": n, "lookup_key": key, "country": c} for (key, c), (n, _) in canonical.items()]
+        )).all()
+
+        for statement, params in self._save_statements(canonical, upserted_rows):
+            await self.async_db.execute(statement, params)
+
+        await self.async_db.commit()
+
+    async def record_learned_names_async(self, entries: List[Tuple[str, str, int, float]], min_count: int) -> int:
+        """
+        Add confident LLM suggestions to learned_names and promote the names
+        suggested at least `min_count` times, in one transaction.
+
+        Args:
+            entries: (name, country, hits, max score) rows, one per name and country
+            min_count: hits a name needs to be promoted
+
+        Returns:
+            Number of names promoted
+        """
+        statement = pg_insert(LearnedName)
+        statement = statement.on_conflict_do_update(
+            index_elements=[LearnedName.lookup_key, LearnedName.country],
+            set_={
+                "hits": LearnedName.hits + statement.excluded.hits,
+                "max_score": func.greatest(LearnedName.max_score, statement.excluded.max_score)
+            }
+        )
+        await self.async_db.execute(statement, [
+            {"name": name, "lookup_key": normalize_name(name), "country": country, "hits": hits, "max_score": max_score}
+            for name, country, hits, max_score in entries
+        ])
+
+        promoted = await self.async_db.execute(
+            update(LearnedName)
+            .where(LearnedName.promoted_at.is_(None), LearnedName.hits >= min_count)
+            .values(promoted_at=func.now())
+        )
+        await self.async_db.commit()
+        return promoted.rowcount
+
+    def _promoted_names_statement(self, since: Optional[datetime] = None):
+        statement = select(LearnedName.name, LearnedName.country, LearnedName.promoted_at).where(LearnedName.promoted_at.is_not(None))
+        if since is not None:
+            statement = statement.where(LearnedName.promoted_at >= since)
+        return statement.order_by(LearnedName.promoted_at)
+
+    def fetch_promoted_names(self, since: Optional[datetime] = None) -> List[Tuple[str, str, datetime]]:
+        """(name, country, promoted_at) of the learned names promoted at or after `since` (all by default)"""
+        return [tuple(row) for row in self.db.execute(self._promoted_names_statement(since))]
+
+    async def fetch_promoted_names_async(self, since: Optional[datetime] = None) -> List[Tuple[str, str, datetime]]:
+        """fetch_promoted_names on the async session"""
+        return [tuple(row) for row in await self.async_db.execute(self._promoted_names_statement(since))]
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from app.models.scheme import Suggestion
+from app.services.llm_service import LLM_available, LLM_process
+from app.services.metrics import metrics, stage
+from app.services.name_learner import name_learner
+from app.services.result_cache import result_cache
+from app.services.write_behind import write_behind
+
+logger = logging.getLogger(__name__)
+
+# Server-wide default of the stale_while_revalidate request option
+STALE_WHILE_REVALIDATE = os.getenv("STALE_WHILE_REVALIDATE", "false").lower() in ("1", "true", "yes")
+ENRICHMENT_MAX_PENDING = int(os.getenv("ENRICHMENT_MAX_PENDING", "5000"))
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "4"))
+# How long the workers pause while the LLM circuit breaker is open
+ENRICHMENT_RETRY_INTERVAL = float(os.getenv("ENRICHMENT_RETRY_INTERVAL", "1"))
+
+Key = Tuple[str, Optional[str]]
+
+
+class EnrichmentQueue():
+    """
+    Background LLM enrichment for stale-while-revalidate requests.
+
+    A request whose local match is weak is answered with the local
+    suggestions at once and its (name, country) is submitted here. Up to
+    `concurrency` workers take the most requested name first (ties in
+    submission order), run it through LLM_process and store the result in
+    the result cache and, through the write-behind queue, in Postgres, so
+    the next request for it is answered by the cache or name_exist_check.
+
+    At most `max_pending` names wait; a name submitted again while waiting
+    only gains priority. When the queue is full new names are rejected. While
+    the LLM circuit breaker is open the workers pause instead of draining
+    the queue into failures.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = ENRICHMENT_MAX_PENDING,
+        concurrency: int = ENRICHMENT_CONCURRENCY,
+        retry_interval: float = ENRICHMENT_RETRY_INTERVAL
+    ):
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self.retry_interval = retry_interval
+
+        # waiting names -> [requests, submission order]; the heap holds
+        # (-requests, submission order, key) and entries whose count is out
+        # of date are skipped when popped
+        self._pending: Dict[Key, list] = {}
+        self._heap: List[Tuple[int, int, Key]] = []
+        self._in_progress = set()
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.enriched = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self._workers:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Cancel the workers; names still waiting are dropped, they are enriched again on their next weak match"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._pending:
+            logger.info(f"Enrichment queue stopped [dropped: {len(self._pending)}]")
+        self._pending.clear()
+        self._heap.clear()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, name: str, country: Optional[str]) -> bool:
+        """
+        Queue a name for enrichment, or raise its priority when it already waits.
+
+        Returns:
+            False when the queue is full and the name was not queued
+        """
+        # started lazily for callers outside the app lifespan, like write_behind
+        self.start()
+
+        key = (name, country)
+        if key in self._in_progress:
+            self.coalesced += 1
+            return True
+
+        entry = self._pending.get(key)
+        if entry is not None:
+            entry[0] += 1
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return False
+        else:
+            entry = self._pending[key] = [1, next(self._order)]
+            self.submitted += 1
+
+        heapq.heappush(self._heap, (-entry[0], entry[1], key))
+        # re-submissions of waiting names leave out-of-date entries behind, drop them once they dominate
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [(-count, order, k) for k, (count, order) in self._pending.items()]
+            heapq.heapify(self._heap)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _pop(self) -> Optional[Key]:
+        while self._heap:
+            count, order, key = heapq.heappop(self._heap)
+            entry = self._pending.get(key)
+            if entry is not None and entry[0] == -count:
+                del self._pending[key]
+                return key
+        return None
+
+    async def _run(self):
+        while True:
+            if not LLM_available():
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            key = self._pop()
+            if key is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._in_progress.add(key)
+            try:
+                await self._enrich(*key)
+            finally:
+                self._in_progress.discard(key)
+
+    async def _enrich(self, name: str, country: Optional[str]):
+        try:
+            with stage("enrichment"):
+                llm_suggestions_raw = await LLM_process(name, country)
+            if not isinstance(llm_suggestions_raw, list):
+                raise ValueError(llm_suggestions_raw)
+
+            suggestions = [Suggestion(**s) for s in llm_suggestions_raw]
+            await result_cache.set(name, country, suggestions)
+            # an answer without corrections is only cached, as a negative entry
+            if suggestions:
+                await write_behind.enqueue(name, country, [s.model_dump() for s in suggestions])
+                name_learner.record(country, suggestions)
+            self.enriched += 1
+
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Enrichment failed [name: {name}, country: {country}, error: {e}]")
+
+
+enrichment_queue = EnrichmentQueue()
+
+metrics.counter_callback(
+    "enrichment_names_total",
+    "Names handed to the stale-while-revalidate enrichment queue: submitted, coalesced with a waiting one, rejected (queue full), enriched or failed",
+    lambda: {
+        ("submitted",): enrichment_queue.submitted,
+        ("coalesced",): enrichment_queue.coalesced,
+        ("rejected",): enrichment_queue.rejected,
+        ("enriched",): enrichment_queue.enriched,
+        ("failed",): enrichment_queue.failed,
+    },
+    ["outcome"]
+)
+metrics.gauge_callback("enrichment_pending", "Names waiting in the enrichment queue", enrichment_queue.pending)
@@ -0,0 +1,267 @@
+import json
+import mmap
+import os
+import tempfile
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b"SPELLIDX"
+# bumped whenever the stored arrays or the phonetic keys they hold change
+SNAPSHOT_FORMAT = 2
+# array payloads start on cache-line boundaries
+_ALIGNMENT = 64
+
+
+class StringTable():
+    """
+    Strings packed into one UTF-8 blob with an offsets array, addressed by
+    position. Both arrays can live in a memory-mapped snapshot.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self._view = memoryview(blob)
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        return str(self._view[self.offsets[position]:self.offsets[position + 1]], "utf-8")
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        """Strings at several positions, with the offsets gathered in one pass"""
+        positions = np.fromiter(positions, dtype=np.int64) if not isinstance(positions, np.ndarray) else positions
+        view = self._view
+        return [
+            str(view[start:end], "utf-8")
+            for start, end in zip(self.offsets[positions].tolist(), self.offsets[positions + 1].tolist())
+        ]
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {f"{prefix}.blob": self.blob, f"{prefix}.offsets": self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str) -> "StringTable":
+        return cls(arrays[f"{prefix}.blob"], arrays[f"{prefix}.offsets"])
+
+
+class KeyTable():
+    """
+    Sorted fixed-width UTF-8 keys, each with a row of int32 values stored CSR
+    style (`indptr` into `values`). A batch of keys is resolved with a single
+    np.searchsorted, no per-key Python dictionary is kept.
+    """
+
+    def __init__(self, keys: np.ndarray, indptr: np.ndarray, values: np.ndarray):
+        self.keys = keys
+        self.indptr = indptr
+        self.values = values
+        self._width = keys.dtype.itemsize
+
+    @classmethod
+    def from_dict(cls, rows: Mapping[str, Sequence[int]]) -> "KeyTable":
+        items = sorted((key.encode("utf-8"), values) for key, values in rows.items())
+        width = max((len(key) for key, _ in items), default=1) or 1
+
+        keys = np.array([key for key, _ in items], dtype=f"S{width}")
+        indptr = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(values) for _, values in items], out=indptr[1:])
+        values = np.fromiter((v for _, row in items for v in row), dtype=np.int32, count=int(indptr[-1]))
+        return cls(keys, indptr, values)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, keys: Sequence[str]) -> np.ndarray:
+        """Row of every key, -1 for keys that are not in the table"""
+        encoded = [key.encode("utf-8") for key in keys]
+        # a key wider than the table cannot be in it, and would be truncated by the dtype
+        fits = np.fromiter((0 < len(e) <= self._width for e in encoded), dtype=bool, count=len(encoded))
+        queries = np.array([e if ok else b"" for e, ok in zip(encoded, fits)], dtype=self.keys.dtype)
+
+        rows = np.searchsorted(self.keys, queries)
+        found = fits & (rows < len(self.keys))
+        found[found] = self.keys[rows[found]] == queries[found]
+        return np.where(found, rows, -1)
+
+    def get(self, key: str) -> np.ndarray:
+        """Values of one key, empty when it is missing"""
+        return self.get_many([key])
+
+    def get_many(self, keys: Sequence[str]) -> np.ndarray:
+        """Values of all the given keys concatenated, in key order"""
+        rows = self.find(keys)
+        rows = rows[rows >= 0]
+        if not len(rows):
+            return self.values[:0]
+        if len(rows) == 1:
+            return self.values[self.indptr[rows[0]]:self.indptr[rows[0] + 1]]
+        return np.concatenate([self.values[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {f"{prefix}.keys": self.keys, f"{prefix}.indptr": self.indptr, f"{prefix}.values": self.values}
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str) -> "KeyTable":
+        return cls(arrays[f"{prefix}.keys"], arrays[f"{prefix}.indptr"], arrays[f"{prefix}.values"])
+
+
+class Postings():
+    """
+    Original archive names of every normalized term, grouped by country in
+    insertion order. Stored as CSR rows of (country id, name) entries.
+    """
+
+    def __init__(self, countries: List[str], indptr: np.ndarray, entry_countries: np.ndarray, names: StringTable):
+        self.countries = countries
+        self.indptr = indptr
+        self.entry_countries = entry_countries
+        self.names = names
+        self._country_ids = {country: i for i, country in enumerate(countries)}
+
+    @classmethod
+    def from_lists(cls, countries: List[str], postings: List[Dict[str, List[str]]]) -> "Postings":
+        country_ids = {country: i for i, country in enumerate(countries)}
+        entries = [(country_ids[country], name) for row in postings for country, names in row.items() for name in names]
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([sum(len(names) for names in row.values()) for row in postings], out=indptr[1:])
+        entry_countries = np.fromiter((c for c, _ in entries), dtype=np.int16, count=len(entries))
+        return cls(countries, indptr, entry_countries, StringTable.from_strings(name for _, name in entries))
+
+    def names_of(self, term_ids: Sequence[int], country: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Names of several terms, in term order, only the given country's when it is set.
+
+        Returns:
+            tuple: (names, position in `term_ids` of the term each name belongs to)
+        """
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+
+        # entry ids of all the terms' rows, concatenated
+        owners = np.repeat(np.arange(len(term_ids)), lengths)
+        entry_ids = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+        if country is not None:
+            keep = self.entry_countries[entry_ids] == self._country_ids.get(country, -1)
+            entry_ids, owners = entry_ids[keep], owners[keep]
+
+        return self.names.take(entry_ids), owners
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}.indptr": self.indptr,
+            f"{prefix}.entry_countries": self.entry_countries,
+            **self.names.arrays(f"{prefix}.names")
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, countries: List[str]) -> "Postings":
+        return cls(
+            countries,
+            arrays[f"{prefix}.indptr"],
+            arrays[f"{prefix}.entry_countries"],
+            StringTable.from_arrays(arrays, f"{prefix}.names")
+        )
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_snapshot(path: str, arrays: Mapping[str, np.ndarray], meta: dict):
+    """
+    Write arrays and metadata as one snapshot file.
+
+    Layout: magic, little-endian uint64 header length, JSON header (format,
+    meta, and the dtype/shape/offset of every array), then the raw array
+    payloads, each aligned. The file is written next to `path` and renamed
+    over it, so readers never see a partial snapshot.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({"format": SNAPSHOT_FORMAT, "meta": meta, "arrays": layout}).encode("utf-8")
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        # readable by workers running as other users, mkstemp creates it 0600
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot_meta(path: str) -> Optional[dict]:
+    """Metadata of a snapshot without mapping its arrays, None if the file is missing or invalid"""
+    try:
+        with open(path, "rb") as f:
+            return _read_header(f)["meta"]
+    except (OSError, ValueError):
+        return None
+
+
+def _read_header(f) -> dict:
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise ValueError("not an index snapshot")
+
+    header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"unsupported snapshot format {header.get('format')}")
+    return header
+
+
+def open_snapshot(path: str) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Memory-map a snapshot read-only.
+
+    Returns:
+        tuple: (arrays as views into the mapping, metadata). The pages are
+        shared through the OS page cache by every process mapping the file.
+
+    Raises:
+        OSError, ValueError: when the file is missing or not a valid snapshot
+    """
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        data_start = _aligned(f.tell())
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        if count == 0:
+            arrays[name] = np.zeros(spec["shape"], dtype=dtype)
+            continue
+        array = np.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        arrays[name] = array.reshape(spec["shape"])
+
+    return arrays, header["meta"]
@@ -0,0 +1,55 @@
+from sqlalchemy.orm import Session
+
+from app.db_config import async_engine
+from app.services.archive_watcher import archive_watcher
+from app.services.enrichment import enrichment_queue
+from app.services.llm_client import gemini_client
+from app.services.llm_service import llm_batcher
+from app.services.name_index import name_index
+from app.services.name_learner import name_learner
+from app.services.result_cache import result_cache
+from app.services.scoring_pool import scoring_pool
+from app.services.write_behind import write_behind
+
+
+def load_indexes(db_session: Session):
+    """Build the in-memory name index and the learned names overlay"""
+    name_index.load(db_session)
+    name_learner.load(db_session)
+
+
+async def start_services(watch_archive: bool = True):
+    """
+    Start the per-process services on the running event loop, shared by the
+    API lifespan and the bulk correction CLI.
+
+    Args:
+        watch_archive: apply archive changes to the index while running
+    """
+    # One pooled LLM client per process, shared by every request
+    gemini_client.start()
+    result_cache.start()
+    write_behind.start()
+    name_learner.start()
+    enrichment_queue.start()
+    if watch_archive:
+        # archive changes made from now on are applied to the index incrementally
+        archive_watcher.start()
+    # scoring workers are spawned and warmed up before the first request
+    scoring_pool.start()
+    await scoring_pool.wait_ready()
+
+
+async def stop_services():
+    """Stop the services started by start_services, draining their queues first"""
+    await archive_watcher.stop()
+    await enrichment_queue.stop()
+    # callers still waiting on a coalesced LLM call get their answer before the client closes
+    await llm_batcher.stop()
+    # drain queued correction metadata and learned name counts before the engines go away
+    await write_behind.stop()
+    await name_learner.stop()
+    await gemini_client.close()
+    await result_cache.close()
+    scoring_pool.close()
+    await async_engine.dispose()
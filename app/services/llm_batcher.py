@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "20"))
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "10"))
+
+Key = Tuple[str, Optional[str]]
+
+
+class LLMBatcher():
+    """
+    Single-flight coalescing and micro-batching in front of the LLM.
+
+    Concurrent requests for the same (name, country) share one in-flight
+    future. Distinct misses are collected for up to `window_ms` (or until
+    `max_size` names are waiting) and sent as one multi-name prompt; names the
+    model leaves out of the keyed response are retried with the single-name
+    prompt. When the batch call itself fails every name of the batch fails
+    with it, so a struggling upstream is not sent the batch again name by name.
+    """
+
+    def __init__(
+        self,
+        single_call: Callable[[str, Optional[str]], Awaitable[Optional[list]]],
+        batch_call: Callable[[List[Key]], Awaitable[Optional[Dict[int, list]]]],
+        window_ms: float = LLM_BATCH_WINDOW_MS,
+        max_size: int = LLM_BATCH_MAX_SIZE
+    ):
+        self.single_call = single_call
+        self.batch_call = batch_call
+        self.window = window_ms / 1000
+        self.max_size = max_size
+
+        self._in_flight: Dict[Key, asyncio.Future] = {}
+        self._pending: List[Key] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # upstream calls in flight; the event loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def correct(self, name: str, country: Optional[str]) -> Optional[list]:
+        """
+        Return the LLM corrections for one name, sharing the upstream call
+        with any identical concurrent request.
+        """
+        key = (name, country)
+        future = self._in_flight.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._in_flight[key] = future
+            self._pending.append(key)
+
+            if len(self._pending) >= self.max_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+
+        # shield so one cancelled caller does not cancel the call the others wait on
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        """Send the names still waiting for their window and wait for every upstream call in flight"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, batch: List[Key]):
+        try:
+            if len(batch) == 1:
+                results = {0: await self.single_call(*batch[0])}
+            else:
+                results = await self.batch_call(batch)
+                if results is None:
+                    # resolved like a failed single call, callers fall back to local suggestions
+                    logger.warning(f"LLM micro-batch failed [size: {len(batch)}]")
+                    results = {}
+                else:
+                    logger.info(f"LLM micro-batch completed [size: {len(batch)}, answered: {len(results)}]")
+                    missing = [i for i in range(len(batch)) if results.get(i) is None]
+                    retries = await asyncio.gather(*(self.single_call(*batch[i]) for i in missing))
+                    results.update(zip(missing, retries))
+
+            for i, key in enumerate(batch):
+                self._resolve(key, result=results.get(i))
+
+        except Exception as e:
+            for key in batch:
+                self._resolve(key, error=e)
+
+    def _resolve(self, key: Key, result=None, error: Optional[Exception] = None):
+        future = self._in_flight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from app.services.circuit_breaker import STATES, CircuitBreaker
+from app.services.metrics import LLM_UPSTREAM_SECONDS, metrics
+
+logger = logging.getLogger(__name__)
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "2.0"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "10.0"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.25"))
+
+# Circuit breaker over the Gemini HTTP attempts of the last LLM_BREAKER_WINDOW_SECONDS
+LLM_BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_CALL_MS = float(os.getenv("LLM_BREAKER_SLOW_CALL_MS", "5000"))
+LLM_BREAKER_SLOW_CALL_RATE = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.8"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+
+# Status codes worth retrying, everything else 4xx is a caller error
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeminiClient():
+    """
+    Shared async HTTP client for the Gemini API.
+
+    One keep-alive connection pool per process, created at app startup. A
+    semaphore caps concurrent upstream calls and failed calls are retried with
+    exponential backoff and full jitter. Every attempt goes through a circuit
+    breaker, so during an outage calls fail fast instead of waiting for
+    timeouts.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.breaker = CircuitBreaker(
+            "gemini",
+            window_seconds=LLM_BREAKER_WINDOW_SECONDS,
+            min_calls=LLM_BREAKER_MIN_CALLS,
+            failure_rate=LLM_BREAKER_FAILURE_RATE,
+            slow_call_seconds=LLM_BREAKER_SLOW_CALL_MS / 1000,
+            slow_call_rate=LLM_BREAKER_SLOW_CALL_RATE,
+            open_seconds=LLM_BREAKER_OPEN_SECONDS
+        )
+
+    def start(self):
+        """Create the connection pool, a no-op if it already exists"""
+        if self._client is not None:
+            return
+
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(GEMINI_READ_TIMEOUT, connect=GEMINI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_MAX_CONNECTIONS
+            ),
+            headers={'Content-Type': 'application/json'}
+        )
+        self._semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+
+    async def generate(self, api_key: str, payload: dict) -> dict:
+        """
+        POST a generateContent payload and return the decoded JSON body.
+
+        Raises:
+            httpx.HTTPError: when the call still fails after all retries
+            CircuitOpenError: when the circuit breaker rejects an attempt
+        """
+        # started lazily for callers outside the app lifespan (CLI, scripts)
+        self.start()
+
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self.breaker.acquire()
+                    # timed once a slot is free, queueing for the semaphore is not upstream latency
+                    start = time.perf_counter()
+                    response = await self._client.post(GEMINI_URL, headers={"x-goog-api-key": api_key or ""}, json=payload)
+                response.raise_for_status()
+                elapsed = time.perf_counter() - start
+                LLM_UPSTREAM_SECONDS.observe(elapsed, "ok")
+                self.breaker.record(elapsed, failed=False)
+                return response.json()
+
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                elapsed = time.perf_counter() - start
+                LLM_UPSTREAM_SECONDS.observe(elapsed, "timeout" if isinstance(e, httpx.TimeoutException) else "error")
+                self.breaker.record(elapsed, failed=True)
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRYABLE_STATUS
+                if not retryable or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+
+                delay = random.uniform(0, GEMINI_BACKOFF_BASE * (2 ** attempt))
+                logger.warning(f"Gemini call failed, retrying [attempt: {attempt + 1}, delay: {delay:.2f}s, error: {e!r}]")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+gemini_client = GeminiClient()
+
+metrics.gauge_callback(
+    "llm_circuit_breaker_state",
+    "1 for the current state of the Gemini circuit breaker: closed, half_open or open",
+    lambda: {(state,): int(gemini_client.breaker.state == state) for state in STATES},
+    ["state"]
+)
+metrics.counter_callback(
+    "llm_circuit_breaker_transitions_total",
+    "Transitions of the Gemini circuit breaker into each state",
+    lambda: {(state,): count for state, count in gemini_client.breaker.transitions.items()},
+    ["state"]
+)
+metrics.counter_callback(
+    "llm_circuit_breaker_rejected_total",
+    "Gemini calls rejected by the open circuit breaker",
+    lambda: gemini_client.breaker.rejected
+)
@@ -1,10 +1,16 @@
+import logging
 import re
-from typing import Dict, List, Optional, Union
-import requests
+from typing import Dict, List, Optional, Tuple, Union
+import httpx
 import json
 from app.models import models 
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.llm_batcher import LLMBatcher
+from app.services.llm_client import gemini_client
 import os
 
+logger = logging.getLogger(__name__)
+
 prompt = """You are a name spelling checker and corrector. Your task is to analyze input names and provide corrected spellings with confidence scores.
 
 Instructions:
@@ -55,9 +61,69 @@ Now analyze the following:
 Name: {name}
 Country: {country}"""
 
-def get_gemini_response(api_key: str, text: str) -> dict:
+batch_prompt = """You are a name spelling checker and corrector. Your task is to analyze several input names and provide corrected spellings with confidence scores for each of them.
+
+Instructions:
+1. You will receive a numbered list of names that may contain spelling errors or variations, each with its country
+2. For every name, identify the most likely correct spelling(s), considering the cultural context of its country
+3. Calculate a similarity score (0.0 to 1.0) indicating how confident you are in each correction
+4. Return your response in the exact JSON format specified below
+
+Response Format:
+Always wrap your JSON response in <json> and </json> tags. The JSON must be an object keyed by the input number, every value following this exact structure:
+
+{{
+  "1": [
+    {{
+      "name": "corrected_name_1",
+      "similarity_score": 0.95
+    }}
+  ],
+  "2": [
+    {{
+      "name": "corrected_name_2",
+      "similarity_score": 0.87
+    }}
+  ]
+}}
+
+Guidelines:
+- Answer every input number exactly once
+- Provide 1-3 most likely corrections per name, ranked by similarity score
+- Similarity scores should range from 0.0 (no match) to 1.0 (perfect match)
+- Consider common misspellings, phonetic variations, and cultural name variants specific to the given country
+- Take into account naming conventions and common names from the specified country/culture if no country is specified then consider Scandinavian countries
+- If the input name appears correct, return it with a high similarity score
+- Maintain strict JSON formatting - no additional text outside the tags
+- Only consider names with similarity_score more than 0.85
+
+Example:
+1. Name: "Jhon Smyth" (Country: United States)
+2. Name: "Kjrstin" (Country: Denmark)
+<json>
+{{
+  "1": [
+    {{
+      "name": "John Smith",
+      "similarity_score": 0.92
+    }}
+  ],
+  "2": [
+    {{
+      "name": "Kirsten",
+      "similarity_score": 0.9
+    }}
+  ]
+}}
+</json>
+
+Now analyze the following:
+{names}"""
+
+async def get_gemini_response(api_key: str, text: str) -> dict:
     """
     Makes an API call to the Gemini 2.0 Flash model and returns the response and citations.
+    Goes through the shared pooled async client, so the event loop is never blocked.
     
     Args:
         api_key: Your Gemini API key
@@ -70,9 +136,6 @@ def get_gemini_response(api_key: str, text: str) -> dict:
             
         Returns None if the API call fails
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
-    
     payload = {
         "contents": [{
             "parts": [{"text": text}]
@@ -80,10 +143,7 @@ def get_gemini_response(api_key: str, text: str) -> dict:
     }
     
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()  # Raise exception for HTTP errors
-        
-        data = response.json()
+        data = await gemini_client.generate(api_key, payload)
         
         # Extract the response text and citations
         if "candidates" in data and len(data["candidates"]) > 0:
@@ -101,11 +161,14 @@ def get_gemini_response(api_key: str, text: str) -> dict:
         else:
             return None
             
-    except requests.exceptions.RequestException as e:
-        print(f"Error making API request: {e}")
+    except httpx.HTTPError as e:
+        logger.warning(f"Error making API request: {e!r}")
+        return None
+    except CircuitOpenError as e:
+        logger.debug(f"API request not sent: {e}")
         return None
     except (KeyError, IndexError) as e:
-        print(f"Error parsing API response: {e}")
+        logger.error(f"Error parsing API response: {e!r}")
         return None
     
 def extract_json_from_response(llm_response: str) -> Optional[List[Dict[str, Union[str, float]]]]:
@@ -151,10 +214,10 @@ def extract_json_from_response(llm_response: str) -> Optional[List[Dict[str, Uni
         return None
         
     except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
+        logger.warning(f"JSON parsing error: {e}")
         return None
     except Exception as e:
-        print(f"Unexpected error during JSON extraction: {e}")
+        logger.warning(f"Unexpected error during JSON extraction: {e!r}")
         return None
 
 def validate_name_correction_json(data: List[Dict]) -> bool:
@@ -197,18 +260,72 @@ def safe_extract_json_from_response(llm_response: str) -> Optional[List[Dict[str
     extracted_json = extract_json_from_response(llm_response)
     
     if extracted_json is None:
-        print("Failed to extract JSON from response")
+        logger.warning("Failed to extract JSON from response")
         return None
     
     if not validate_name_correction_json(extracted_json):
-        print("Extracted JSON does not match expected structure")
+        logger.warning("Extracted JSON does not match expected structure")
         return None
     
     return extracted_json
 
+def extract_keyed_json_from_response(llm_response: str) -> Optional[Dict[str, List[Dict[str, Union[str, float]]]]]:
+    """
+    Extract the keyed JSON object of a batch prompt response.
+    
+    Args:
+        llm_response (str): The raw response from the LLM
+        
+    Returns:
+        Optional[Dict]: Parsed JSON object or None if extraction fails
+    """
+    try:
+        # Method 1: Extract JSON between <json> and </json> tags
+        match = re.search(r'<json>\s*(.*?)\s*</json>', llm_response, re.DOTALL | re.IGNORECASE)
+        if match:
+            return json.loads(match.group(1).strip())
+        
+        # Method 2: Last resort - outermost braces
+        start_idx = llm_response.find('{')
+        end_idx = llm_response.rfind('}')
+        
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            return json.loads(llm_response[start_idx:end_idx+1])
+            
+        return None
+        
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSON parsing error: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"Unexpected error during JSON extraction: {e!r}")
+        return None
+
+def safe_extract_keyed_json_from_response(llm_response: str) -> Optional[Dict[str, List[Dict[str, Union[str, float]]]]]:
+    """
+    Extract a batch response and keep only the entries whose corrections
+    pass validate_name_correction_json.
+    
+    Returns:
+        Dict: input number -> validated corrections (an empty list when the
+        model found no correction), None if the response could not be parsed
+    """
+    extracted_json = extract_keyed_json_from_response(llm_response)
+    
+    if not isinstance(extracted_json, dict):
+        logger.warning("Failed to extract keyed JSON from response")
+        return None
+    
+    return {
+        str(key): value for key, value in extracted_json.items()
+        if validate_name_correction_json(value)
+    }
+
 async def LLM_call(word: str, country: str):
     """
         Function will accept a name and return a list of corrected name. 
+        An empty list means the model found no correction, None that the
+        call or its response failed.
     """
 
     try: 
@@ -217,31 +334,74 @@ async def LLM_call(word: str, country: str):
 
         gemini_api_key = os.getenv("gemini_api_key")
 
-        result = get_gemini_response(gemini_api_key, formatted_prompt)
+        result = await get_gemini_response(gemini_api_key, formatted_prompt)
         if result:
-            print("Response:", result["response"])
-            print("Citations:", result["citation"])
+            logger.debug(f"LLM response [response: {result['response']!r}, citations: {result['citation']}]")
 
             extracted_json = safe_extract_json_from_response(result["response"])
             
-            if extracted_json:
-                print("Extracted JSON:", extracted_json)
+            if extracted_json is not None:
+                logger.debug(f"Extracted JSON: {extracted_json}")
                 return extracted_json
             else:
-                print("Failed to extract valid JSON from response")
+                logger.warning("Failed to extract valid JSON from response")
                 return None
         else:
-            print("No valid response received from API")
+            logger.warning("No valid response received from API")
             return None
 
     except Exception as e:
-        print(f"Error parsing API response: {e}")
+        logger.error(f"Error parsing API response: {e!r}")
         return None
     
+async def LLM_call_batch(items: List[Tuple[str, Optional[str]]]) -> Optional[Dict[int, List[Dict[str, Union[str, float]]]]]:
+    """
+        Function will accept several (name, country) pairs and return their
+        corrected names from a single prompt, keyed by position in `items`.
+        Positions missing from the result were not answered by the model,
+        None means the call or its response failed as a whole.
+    """
+
+    try:
+        names = "\n".join(
+            f'{i}. Name: "{word}" (Country: {country})' for i, (word, country) in enumerate(items, start=1)
+        )
+        formatted_prompt = batch_prompt.format(names=names)
+
+        gemini_api_key = os.getenv("gemini_api_key")
+
+        result = await get_gemini_response(gemini_api_key, formatted_prompt)
+        if not result:
+            logger.warning("No valid response received from API")
+            return None
+
+        extracted_json = safe_extract_keyed_json_from_response(result["response"])
+        if extracted_json is None:
+            return None
+
+        return {
+            int(key) - 1: value for key, value in extracted_json.items()
+            if key.isdigit() and 1 <= int(key) <= len(items)
+        }
+
+    except Exception as e:
+        logger.error(f"Error parsing API response: {e!r}")
+        return None
+
+llm_batcher = LLMBatcher(LLM_call, LLM_call_batch)
+
+def LLM_available() -> bool:
+    """
+        False while the Gemini circuit breaker rejects calls, callers then
+        answer with local suggestions instead of waiting for LLM_process.
+    """
+    return not gemini_client.breaker.is_open()
+    
 async def LLM_process(word: str, country: str) -> str:
     try: 
-        res = await LLM_call(word, country)
-        if res:
+        res = await llm_batcher.correct(word, country)
+        # an empty list is an answer: the model has no correction for the name
+        if res is not None:
             return res
         
         return "something went wrong while processing LLM process."
@@ -0,0 +1,221 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from sub-millisecond index lookups to LLM calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+Labels = Tuple[str, ...]
+# value of a callback metric: one number, or label values -> number
+Sampled = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric():
+    """Base of the metric types: name, help text, label names and a lock"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing count, per label values"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    """
+    Observations counted into fixed cumulative buckets, per label values.
+    An observation is one bisect and three increments under the lock.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (the last one +Inf), sum, count]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+
+        lines = self._header()
+        bounds = self.buckets + (math.inf,)
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    Counter or gauge whose value is read from a callback at scrape time, for
+    state the services already keep (cache statistics, queue depth).
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, callback: Callable[[], Sampled], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        sampled = self.callback()
+        if not isinstance(sampled, dict):
+            sampled = {(): sampled}
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sampled.items()
+        ]
+
+
+class MetricsRegistry():
+    """
+    Process-wide metrics, rendered in the Prometheus text format by
+    GET /api/metrics. Every worker process keeps its own registry.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter_callback(self, name: str, documentation: str, callback: Callable[[], Sampled], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, "counter", callback, labelnames))
+
+    def gauge_callback(self, name: str, documentation: str, callback: Callable[[], Sampled], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, "gauge", callback, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Pipeline instrumentation shared by the controllers and services
+STAGE_SECONDS = metrics.histogram(
+    "spell_check_stage_seconds",
+    "Time spent in each step of the correction pipeline",
+    ["stage"]
+)
+REQUEST_SECONDS = metrics.histogram(
+    "spell_check_request_seconds",
+    "End-to-end time of a correction request",
+    ["endpoint"]
+)
+RESULTS = metrics.counter(
+    "spell_check_results_total",
+    "Corrected names by where the result came from: cache, stored, local, llm, or degraded (local, LLM unavailable)",
+    ["source"]
+)
+CANDIDATES = metrics.histogram(
+    "spell_check_candidates",
+    "Number of archive candidates retrieved per lookup (names and the tokens of multi-token names)",
+    ["source"],
+    buckets=SIZE_BUCKETS
+)
+LLM_FALLBACKS = metrics.counter(
+    "spell_check_llm_fallbacks_total",
+    "Names sent to the LLM because the local suggestions were weak, by outcome: ok, error, timeout (latency budget) or rejected (circuit breaker open)",
+    ["outcome"]
+)
+LLM_UPSTREAM_SECONDS = metrics.histogram(
+    "llm_upstream_request_seconds",
+    "Duration of each Gemini HTTP attempt, by outcome: ok, timeout or error",
+    ["outcome"]
+)
+
+
+def stage(name: str):
+    """Context manager timing a pipeline stage into spell_check_stage_seconds"""
+    return STAGE_SECONDS.time(name)
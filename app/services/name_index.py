@@ -0,0 +1,465 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services.db_interaction import COUNTRIES, DB_service
+from app.services.index_snapshot import KeyTable, StringTable, open_snapshot, read_snapshot_meta, write_snapshot
+from app.services.metrics import metrics
+from app.services.ngram_index import NgramIndex
+from app.services.overlay_index import OverlayIndex
+from app.services.phonetics import PHONETIC_ENCODINGS, phonetic_keys
+from app.services.prefix_index import AUTOCOMPLETE_MAX_RESULTS, PrefixIndex
+from app.services.symspell_index import SymSpellIndex
+
+logger = logging.getLogger(__name__)
+
+SYMSPELL_MAX_DISTANCE = int(os.getenv("SYMSPELL_MAX_DISTANCE", "2"))
+SYMSPELL_PREFIX_LENGTH = int(os.getenv("SYMSPELL_PREFIX_LENGTH", "7"))
+NGRAM_TOP_K = int(os.getenv("NGRAM_TOP_K", "20"))
+NGRAM_MIN_SCORE = float(os.getenv("NGRAM_MIN_SCORE", "0.4"))
+# Written by `python -m app.build_index_snapshot`, memory-mapped at startup when it matches the archive
+INDEX_SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT_PATH", "data/name_index.snapshot")
+
+# scope of the phonetic keys of the all-countries view
+_ALL_COUNTRIES = "*"
+
+
+def archive_digest(name: str, country: str) -> int:
+    """
+    Signed 64-bit digest of one archive row, summed into the order-independent
+    archive version. Mirrors DB_service.archive_version, which computes the
+    same sum in SQL.
+    """
+    digest = hashlib.md5(f"{country}\t{name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _archive_version(checksum: int) -> str:
+    return f"{checksum % 2 ** 64:016x}"
+
+
+def _phonetic_key(scope: str, encoding: str, key: str) -> str:
+    return f"{scope}\t{encoding}\t{key}"
+
+
+class NameIndex():
+    """
+    Process-wide in-memory view of the name archive.
+
+    Maps each phonetic encoding's key -> names per country (see
+    app.services.phonetics), plus an "all countries" view that is used when
+    the request has no country or one outside COUNTRIES. Candidate retrieval
+    is a lookup in sorted key tables instead of a NameArchieve/Metaphone join
+    per request. Autocompletion is served from the same archive rows by a
+    sorted prefix index (app.services.prefix_index).
+
+    Every structure is a flat array (app.services.index_snapshot), so the
+    whole index can be written as a snapshot and memory-mapped by each worker
+    at startup instead of being rebuilt from Postgres; mapped pages are shared
+    through the OS page cache.
+
+    Names learned from LLM corrections (app.services.name_learner) are not
+    part of the archive. They are added one by one to a learned-names
+    overlay (app.services.overlay_index) whose results are merged into every
+    lookup. They do not change the archive version.
+
+    Archive changes made while the API runs (see app.services.archive_watcher)
+    are applied without touching the base index: inserted rows are added one
+    by one to a delta overlay (app.services.overlay_index) merged into every
+    lookup, deleted rows are hidden from the base results. The version is
+    updated from the changed rows' digests, so it keeps matching the archive
+    in the database.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.size = 0
+        # identifies the archive contents, identical across workers loading the same archive
+        self.version = "0"
+        # distinct archive names, and "scope\tencoding\tkey" -> ids into them
+        self._names = StringTable.from_strings([])
+        self._phonetic = KeyTable.from_dict({})
+        self.symspell = SymSpellIndex(SYMSPELL_MAX_DISTANCE, SYMSPELL_PREFIX_LENGTH)
+        self.ngrams = NgramIndex()
+        self.prefixes = PrefixIndex()
+        self._lock = threading.Lock()
+
+        # last archive_changes id the index reflects, and the checksum behind `version`
+        self.change_id = 0
+        self._checksum = 0
+        # (size, version, change id) of the base index alone, what a snapshot holds
+        self._base = (0, "0", 0)
+
+        # archive changes since the base index: inserted rows, and deleted base rows with their names hidden per scope
+        self._delta = OverlayIndex(SYMSPELL_MAX_DISTANCE, SYMSPELL_PREFIX_LENGTH)
+        self._removed_rows: Set[Tuple[str, str]] = set()
+        self._removed: Dict[str, FrozenSet[str]] = {}
+
+        # names learned from LLM corrections, kept across base index rebuilds
+        self._learned = OverlayIndex(SYMSPELL_MAX_DISTANCE, SYMSPELL_PREFIX_LENGTH)
+
+    def build(self, rows: Iterable[Tuple[str, str, str]], change_id: int = 0):
+        """
+        Build the index from (name, country, metaphone) rows, the archive as of
+        archive change `change_id`.
+
+        The new tables are assembled off to the side and swapped in at the end,
+        so concurrent readers always see either the old or the new index.
+        """
+        name_ids: Dict[str, int] = {}
+        phonetic_rows: Dict[str, List[int]] = {}
+        entries = []
+        checksum = 0
+
+        for name, country, metaphone in rows:
+            checksum += archive_digest(name, country)
+            entries.append((name, country))
+
+            # the all-countries view lists a name once even if several countries share it
+            first_seen = name not in name_ids
+            name_id = name_ids.setdefault(name, len(name_ids))
+
+            keys = (metaphone,) + phonetic_keys(name)[1:]
+            for encoding, key in zip(PHONETIC_ENCODINGS, keys):
+                if not key:
+                    continue
+                phonetic_rows.setdefault(_phonetic_key(country, encoding, key), []).append(name_id)
+                if first_seen:
+                    phonetic_rows.setdefault(_phonetic_key(_ALL_COUNTRIES, encoding, key), []).append(name_id)
+
+        symspell = SymSpellIndex(SYMSPELL_MAX_DISTANCE, SYMSPELL_PREFIX_LENGTH)
+        symspell.build(entries)
+        ngrams = NgramIndex()
+        ngrams.build(entries)
+        prefixes = PrefixIndex()
+        prefixes.build(entries)
+
+        self._swap(
+            StringTable.from_strings(name_ids),
+            KeyTable.from_dict(phonetic_rows),
+            symspell,
+            ngrams,
+            prefixes,
+            len(entries),
+            checksum,
+            change_id
+        )
+
+        logger.info(f"Name index built [names: {self.size}, phonetic keys: {len(self._phonetic)}, version: {self.version}]")
+
+    def _swap(
+        self,
+        names: StringTable,
+        phonetic: KeyTable,
+        symspell: SymSpellIndex,
+        ngrams: NgramIndex,
+        prefixes: PrefixIndex,
+        size: int,
+        checksum: int,
+        change_id: int
+    ):
+        with self._lock:
+            self._names = names
+            self._phonetic = phonetic
+            self.symspell = symspell
+            self.ngrams = ngrams
+            self.prefixes = prefixes
+            self.size = size
+            self._checksum = checksum
+            self.version = _archive_version(checksum)
+            self.change_id = change_id
+            self._base = (size, self.version, change_id)
+            # a new base includes every change applied so far
+            self._delta = OverlayIndex(SYMSPELL_MAX_DISTANCE, SYMSPELL_PREFIX_LENGTH)
+            self._removed_rows, self._removed = set(), {}
+            self.loaded = True
+
+    @property
+    def learned_size(self) -> int:
+        """Names learned from LLM corrections"""
+        return len(self._learned)
+
+    @property
+    def delta_size(self) -> int:
+        """Archive rows inserted or deleted since the base index"""
+        return len(self._delta) + len(self._removed_rows)
+
+    def _snapshot_params(self) -> dict:
+        """Build parameters a snapshot must share with this process to be usable"""
+        return {
+            "encodings": list(PHONETIC_ENCODINGS),
+            "max_distance": SYMSPELL_MAX_DISTANCE,
+            "prefix_length": SYMSPELL_PREFIX_LENGTH,
+            "autocomplete_max_results": AUTOCOMPLETE_MAX_RESULTS,
+        }
+
+    def snapshot_matches(self, meta: Optional[dict]) -> bool:
+        """Whether a snapshot with this metadata was built with this process's parameters"""
+        return meta is not None and meta.get("params") == self._snapshot_params()
+
+    def save_snapshot(self, path: str = INDEX_SNAPSHOT_PATH):
+        """Write the base index (without archive changes applied since) to a snapshot file"""
+        with self._lock:
+            size, version, change_id = self._base
+            arrays = {
+                **self._names.arrays("names"),
+                **self._phonetic.arrays("phonetic"),
+                **self.symspell.arrays("symspell"),
+                **self.ngrams.arrays("ngrams"),
+                **self.prefixes.arrays("prefixes"),
+            }
+            meta = {
+                "version": version,
+                "size": size,
+                "change_id": change_id,
+                "params": self._snapshot_params(),
+                "symspell": self.symspell.meta(),
+                "ngrams": self.ngrams.meta(),
+                "prefixes": self.prefixes.meta(),
+            }
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        write_snapshot(path, arrays, meta)
+        logger.info(f"Name index snapshot written [path: {path}, version: {meta['version']}]")
+
+    def open_snapshot(self, path: str = INDEX_SNAPSHOT_PATH, change_id: Optional[int] = None):
+        """Swap in the index memory-mapped from a snapshot file, as of `change_id` (default: the snapshot's)"""
+        arrays, meta = open_snapshot(path)
+
+        self._swap(
+            StringTable.from_arrays(arrays, "names"),
+            KeyTable.from_arrays(arrays, "phonetic"),
+            SymSpellIndex.from_arrays(arrays, "symspell", meta["symspell"]),
+            NgramIndex.from_arrays(arrays, "ngrams", meta["ngrams"]),
+            PrefixIndex.from_arrays(arrays, "prefixes", meta["prefixes"]),
+            meta["size"],
+            int(meta["version"], 16),
+            meta.get("change_id", 0) if change_id is None else change_id
+        )
+
+        logger.info(f"Name index mapped from snapshot [path: {path}, names: {self.size}, version: {self.version}]")
+
+    def load(self, db_session: Session, snapshot_path: Optional[str] = INDEX_SNAPSHOT_PATH):
+        """
+        Load the name index: memory-map the snapshot when its version matches
+        the archive in the database, otherwise build it from the database.
+        """
+        db_service = DB_service(db_session)
+        # read first: changes committed while loading are replayed later, which is a no-op
+        change_id = db_service.archive_change_id()
+
+        if snapshot_path:
+            meta = read_snapshot_meta(snapshot_path)
+            if self.snapshot_matches(meta) and meta.get("version") == db_service.archive_version():
+                self.open_snapshot(snapshot_path, change_id)
+                return
+            logger.warning(f"Name index snapshot missing or stale, building from the database [path: {snapshot_path}]")
+
+        self.build(db_service.fetch_archive(), change_id)
+
+    def apply_changes(self, changes: Iterable[Tuple[int, str, str, str]]) -> int:
+        """
+        Apply logged archive changes, (id, op, name, country) rows in id order,
+        on top of the base index: inserted rows are added to the delta overlay
+        one by one, the names hidden for deleted rows are swapped in at the end.
+
+        A change the index already reflects (a name inserted twice, a missing
+        name deleted) is skipped, so replaying changes from before the index
+        was loaded is harmless.
+
+        Returns:
+            Number of changes that altered the index
+        """
+        with self._lock:
+            symspell, delta = self.symspell, self._delta
+            removed_rows = set(self._removed_rows)
+            removed = {scope: set(names) for scope, names in self._removed.items()}
+            checksum, size, change_id = self._checksum, self.size, self.change_id
+
+        applied = 0
+        for row_id, op, name, country in changes:
+            change_id = max(change_id, row_id)
+            key = (name, country)
+            in_base = self._in_base(symspell, name, country)
+            present = delta.has(name, country) or (in_base and key not in removed_rows)
+            if op not in ("insert", "delete") or (op == "insert") == present:
+                continue
+
+            if op == "insert":
+                if in_base:
+                    removed_rows.discard(key)
+                    self._hide(symspell, removed_rows, removed, name, country)
+                else:
+                    delta.add(name, country)
+                checksum += archive_digest(name, country)
+                size += 1
+            else:
+                if not delta.remove(name, country):
+                    removed_rows.add(key)
+                    self._hide(symspell, removed_rows, removed, name, country)
+                checksum -= archive_digest(name, country)
+                size -= 1
+            applied += 1
+
+        with self._lock:
+            if self.symspell is not symspell:
+                # a new base (with a new delta) was swapped in meanwhile, it is replayed from its own change id
+                return 0
+            self._removed_rows = removed_rows
+            self._removed = {scope: frozenset(names) for scope, names in removed.items() if names}
+            self.size = size
+            self._checksum = checksum
+            self.version = _archive_version(checksum)
+            self.change_id = change_id
+
+        if applied:
+            logger.info(f"Archive changes applied [applied: {applied}, delta rows: {self.delta_size}, version: {self.version}]")
+        return applied
+
+    def _in_base(self, symspell: SymSpellIndex, name: str, country: str) -> bool:
+        return name in symspell.lookup(name, country if country in COUNTRIES else None, 0)
+
+    def _hide(self, symspell: SymSpellIndex, removed_rows: Set[Tuple[str, str]], removed: Dict[str, Set[str]], name: str, country: str):
+        """Update the base names hidden per scope after the (name, country) row was deleted or restored"""
+        if country in COUNTRIES:
+            hidden = removed.setdefault(country, set())
+            if (name, country) in removed_rows:
+                hidden.add(name)
+            else:
+                hidden.discard(name)
+
+        # the all-countries view keeps a name while another country still has it
+        hidden = removed.setdefault(_ALL_COUNTRIES, set())
+        if any((name, c) not in removed_rows and name in symspell.lookup(name, c, 0) for c in COUNTRIES):
+            hidden.discard(name)
+        else:
+            hidden.add(name)
+
+    def _hidden(self, country: Optional[str]) -> FrozenSet[str]:
+        """Base index names deleted from the archive, for a lookup in `country`"""
+        return self._removed.get(self._scope(country), frozenset())
+
+    def _overlays(self) -> List[OverlayIndex]:
+        """Indexes merged into every lookup: inserted archive rows, then learned names"""
+        return [index for index in (self._delta, self._learned) if len(index)]
+
+    def knows(self, name: str, country: str) -> bool:
+        """Whether the archive or the learned names already have `name` (case-insensitively) for `country`"""
+        if self._learned.knows(name, country):
+            return True
+        hidden, delta = self._hidden(country), self._delta
+        if any(n.lower() == name.lower() and n not in hidden for n in self.symspell.lookup(name, country, 0)):
+            return True
+        return delta.knows(name, country)
+
+    def add_learned(self, rows: Iterable[Tuple[str, str]]) -> int:
+        """
+        Add (name, country) rows learned from LLM corrections to the
+        learned-names overlay, skipping names the index already has.
+
+        Returns:
+            Number of names added
+        """
+        added = 0
+        for name, country in rows:
+            if not self.knows(name, country) and self._learned.add(name, country):
+                added += 1
+
+        if added:
+            logger.info(f"Learned names added to the name index [added: {added}, learned: {self.learned_size}]")
+        return added
+
+    def _scope(self, country: Optional[str]) -> str:
+        return country if country in COUNTRIES else _ALL_COUNTRIES
+
+    def get_candidates(self, metaphone: str, country: Optional[str] = None, encoding: str = "metaphone") -> Tuple[str, ...]:
+        """
+        Return the archive names sharing the given phonetic key.
+
+        Args:
+            metaphone: key of the input name in `encoding` (plain metaphone by default)
+            country: restricts the lookup when it is one of COUNTRIES
+            encoding: one of PHONETIC_ENCODINGS
+
+        Returns:
+            Tuple of names, empty when nothing matches
+        """
+        if not metaphone:
+            return ()
+
+        names, phonetic, hidden = self._names, self._phonetic, self._hidden(country)
+        candidates = tuple(n for n in names.take(phonetic.get(_phonetic_key(self._scope(country), encoding, metaphone))) if n not in hidden)
+        for overlay in self._overlays():
+            candidates += tuple(n for n in overlay.get_candidates(metaphone, country, encoding) if n not in candidates)
+        return candidates
+
+    def get_phonetic_candidates(self, keys: Tuple[str, ...], country: Optional[str] = None) -> List[str]:
+        """
+        Union of the names sharing any of the input's phonetic keys.
+
+        Args:
+            keys: phonetic_keys() of the input, aligned with PHONETIC_ENCODINGS
+            country: restricts the lookup when it is one of COUNTRIES
+
+        Returns:
+            List of names without duplicates, in encoding order
+        """
+        scope = self._scope(country)
+        lookup_keys = [_phonetic_key(scope, encoding, key) for encoding, key in zip(PHONETIC_ENCODINGS, keys) if key]
+        if not lookup_keys:
+            return []
+
+        names, phonetic, hidden = self._names, self._phonetic, self._hidden(country)
+        name_ids = dict.fromkeys(phonetic.get_many(lookup_keys).tolist())
+        candidates = names.take(name_ids)
+        if hidden:
+            candidates = [n for n in candidates if n not in hidden]
+        for overlay in self._overlays():
+            candidates = list(dict.fromkeys(candidates + overlay.get_phonetic_candidates(keys, country)))
+        return candidates
+
+    def get_edit_candidates(self, name: str, country: Optional[str] = None, max_distance: Optional[int] = None) -> List[str]:
+        """Return archive names within `max_distance` edits of `name`, closest first, then inserted and learned ones"""
+        candidates, hidden = self.symspell.lookup(name, country, max_distance), self._hidden(country)
+        if hidden:
+            candidates = [n for n in candidates if n not in hidden]
+        for overlay in self._overlays():
+            candidates = list(dict.fromkeys(candidates + overlay.get_edit_candidates(name, country, max_distance)))
+        return candidates
+
+    def get_ngram_candidates(self, name: str, country: Optional[str] = None, k: int = NGRAM_TOP_K, min_score: float = NGRAM_MIN_SCORE) -> List[str]:
+        """Return the top-k archive, inserted and learned names by trigram overlap with `name`"""
+        hidden = self._hidden(country)
+        matches = self.ngrams.top_k(name, country, k + len(hidden), min_score)
+        if hidden:
+            matches = [m for m in matches if m[0] not in hidden][:k]
+        overlays = self._overlays()
+        if overlays:
+            # stable: on equal scores base archive names stay ahead of the others
+            matches += [m for overlay in overlays for m in overlay.ngram_top_k(name, country, k, min_score)]
+            matches = sorted(matches, key=lambda m: m[1], reverse=True)[:k]
+        return list(dict.fromkeys(n for n, _ in matches))
+
+    def complete(self, prefix: str, country: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> List[Tuple[str, int]]:
+        """Complete a typed prefix into archive, inserted and learned names, see PrefixIndex.complete"""
+        hidden = self._hidden(country)
+        completions = self.prefixes.complete(prefix, country, limit + len(hidden), fuzzy)
+        if hidden:
+            completions = [c for c in completions if c[0] not in hidden][:limit]
+        for overlay in self._overlays():
+            # stable: at equal edits base archive names stay ahead of the others
+            seen = {name for name, _ in completions}
+            completions += [c for c in overlay.complete(prefix, country, limit, fuzzy) if c[0] not in seen]
+            completions = sorted(completions, key=lambda c: c[1])[:limit]
+        return completions
+
+
+name_index = NameIndex()
+
+metrics.gauge_callback("name_index_names", "Archive rows in the in-memory name index", lambda: name_index.size)
+metrics.gauge_callback("name_index_learned_names", "Names learned from LLM corrections in the name index", lambda: name_index.learned_size)
+metrics.gauge_callback("name_index_delta_rows", "Archive rows inserted or deleted since the base name index was built", lambda: name_index.delta_size)
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db_config import AsyncSessionLocal
+from app.models.scheme import Suggestion
+from app.services.db_interaction import COUNTRIES, DB_service
+from app.services.metrics import metrics
+from app.services.name_index import name_index
+from app.utils.utils import normalize_name, split_name
+
+logger = logging.getLogger(__name__)
+
+LEARN_ENABLED = os.getenv("LEARN_ENABLED", "true").lower() in ("1", "true", "yes")
+# An LLM suggestion counts towards promotion from this confidence on
+LEARN_MIN_SCORE = float(os.getenv("LEARN_MIN_SCORE", "0.9"))
+# Confident suggestions a name needs, across all workers, before it is promoted
+LEARN_MIN_COUNT = int(os.getenv("LEARN_MIN_COUNT", "3"))
+LEARN_FLUSH_INTERVAL = float(os.getenv("LEARN_FLUSH_INTERVAL", "30"))
+
+# letters only, with inner apostrophes (O'Neil); hyphens and spaces split tokens
+_NAME_TOKEN = re.compile(r"^[^\W\d_]+(?:['’][^\W\d_]+)*$")
+_MAX_TOKEN_LENGTH = 40
+
+# promoted_at is the promoting transaction's start time, so a slow transaction can
+# commit a timestamp older than one already synced: every sync looks back this far
+_SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class NameLearner():
+    """
+    Feedback loop from LLM corrections into the local name index.
+
+    Every name token of a confident (>= LEARN_MIN_SCORE) LLM suggestion that
+    the index does not know yet is counted in memory, per country. The
+    counts are flushed to learned_names every LEARN_FLUSH_INTERVAL seconds,
+    and names reaching LEARN_MIN_COUNT suggestions (summed over all workers)
+    are promoted. Each flush also picks up the names promoted since the last
+    one, by any worker, and adds them to the in-memory index incrementally,
+    so the next misspelling of a learned name is corrected locally instead
+    of calling the LLM again.
+    """
+
+    def __init__(
+        self,
+        min_score: float = LEARN_MIN_SCORE,
+        min_count: int = LEARN_MIN_COUNT,
+        flush_interval: float = LEARN_FLUSH_INTERVAL,
+        enabled: bool = LEARN_ENABLED
+    ):
+        self.min_score = min_score
+        self.min_count = min_count
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+
+        # (lookup key, country) -> [name, hits, max score], waiting for the next flush
+        self._pending: Dict[Tuple[str, str], list] = {}
+        self._synced_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.promoted = 0
+        self.indexed = 0
+        self.failed = 0
+
+    def record(self, country: Optional[str], suggestions: List[Suggestion]):
+        """Count the unknown name tokens of an LLM result's confident suggestions"""
+        if not self.enabled or country not in COUNTRIES:
+            return
+
+        for suggestion in suggestions:
+            if suggestion.similarity_score < self.min_score:
+                continue
+
+            for token in split_name(suggestion.name)[0]:
+                if len(token) > _MAX_TOKEN_LENGTH or not _NAME_TOKEN.match(token) or name_index.knows(token, country):
+                    continue
+
+                entry = self._pending.setdefault((normalize_name(token), country), [token, 0, 0.0])
+                entry[1] += 1
+                entry[2] = max(entry[2], suggestion.similarity_score)
+                self.recorded += 1
+
+    def load(self, db_session: Session):
+        """Index every name promoted so far, at startup after the name index is loaded"""
+        if not self.enabled:
+            return
+
+        try:
+            self._index(DB_service(db_session).fetch_promoted_names())
+        except Exception as e:
+            logger.error(f"Loading learned names failed [error: {e!r}]")
+
+    def start(self):
+        """Start the periodic flush task on the running event loop"""
+        if not self.enabled or self._task is not None:
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task, flushing the counts recorded since the last run"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # counts recorded without a running flush task are written too
+        if self._pending:
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Write the pending counts, promote names over the thresholds and index newly promoted names"""
+        pending, self._pending = self._pending, {}
+        # sorted, so concurrent flushes from several workers lock rows in the same order
+        entries = [(name, country, hits, max_score) for (_, country), (name, hits, max_score) in sorted(pending.items())]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                db_service = DB_service(None, db)
+                if entries:
+                    self.promoted += await db_service.record_learned_names_async(entries, self.min_count)
+
+                since = self._synced_until - _SYNC_OVERLAP if self._synced_until is not None else None
+                rows = await db_service.fetch_promoted_names_async(since)
+        except Exception as e:
+            self.failed += len(entries)
+            logger.error(f"Learned names flush failed [entries: {len(entries)}, error: {e!r}]")
+            return
+
+        # indexing the promoted names is CPU work, keep it off the event loop
+        await asyncio.to_thread(self._index, rows)
+
+    def _index(self, rows: List[Tuple[str, str, datetime]]):
+        if not rows:
+            return
+
+        added = name_index.add_learned((name, country) for name, country, _ in rows)
+        self.indexed += added
+        self._synced_until = max(promoted_at for _, _, promoted_at in rows)
+
+        if added:
+            logger.info(f"Learned names indexed [added: {added}, learned: {name_index.learned_size}]")
+
+
+name_learner = NameLearner()
+
+metrics.counter_callback(
+    "name_learner_names_total",
+    "Name tokens of confident LLM suggestions: recorded, promoted to learned names, added to this worker's index, or lost to failed flushes",
+    lambda: {
+        ("recorded",): name_learner.recorded,
+        ("promoted",): name_learner.promoted,
+        ("indexed",): name_learner.indexed,
+        ("failed",): name_learner.failed,
+    },
+    ["outcome"]
+)
@@ -0,0 +1,150 @@
+import logging
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from app.services.db_interaction import COUNTRIES
+from app.services.index_snapshot import KeyTable, Postings
+from app.utils.utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+def trigrams(term: str) -> List[str]:
+    """Padded character trigrams, so leading/trailing letters carry their own grams"""
+    padded = f"$${term}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class NgramIndex():
+    """
+    Character trigram inverted index over the name archive.
+
+    Postings are stored as CSR arrays (one row of term ids per trigram, see
+    app.services.index_snapshot.KeyTable), so scoring a query is a single `np.bincount` over the postings of
+    its trigrams followed by an `argpartition` for the top-k. There is no Python
+    loop over archive names, which keeps lookups fast for 1M+ names.
+
+    Scores are the Dice coefficient of the two trigram sets, which tolerates
+    transposed or missing leading letters that break the metaphone key.
+    """
+
+    def __init__(self):
+        self._postings = Postings.from_lists(list(COUNTRIES), [])
+        # trigram -> ids of the terms containing it
+        self._grams = KeyTable.from_dict({})
+        self._gram_counts = np.zeros(0, dtype=np.int32)
+        # (country, term) membership, rows in the order of self._postings.countries
+        self._country_masks = np.zeros((len(COUNTRIES), 0), dtype=bool)
+
+    def __len__(self):
+        return len(self._gram_counts)
+
+    def build(self, entries: Iterable[Tuple[str, str]]):
+        """Build the index from (name, country) pairs"""
+        term_ids: Dict[str, int] = {}
+        postings: List[Dict[str, List[str]]] = []
+        gram_rows: Dict[str, List[int]] = {}
+        countries = list(COUNTRIES)
+
+        for name, country in entries:
+            term = normalize_name(name)
+            if not term:
+                continue
+
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = len(postings)
+                term_ids[term] = term_id
+                postings.append({})
+
+                for gram in set(trigrams(term)):
+                    gram_rows.setdefault(gram, []).append(term_id)
+
+            if country not in countries:
+                countries.append(country)
+            names = postings[term_id].setdefault(country, [])
+            if name not in names:
+                names.append(name)
+
+        self._postings = Postings.from_lists(countries, postings)
+        self._grams = KeyTable.from_dict(gram_rows)
+        self._gram_counts = np.bincount(self._grams.values, minlength=len(postings)).astype(np.int32)
+
+        self._country_masks = np.zeros((len(countries), len(postings)), dtype=bool)
+        term_of_entry = np.repeat(np.arange(len(postings)), np.diff(self._postings.indptr))
+        self._country_masks[self._postings.entry_countries, term_of_entry] = True
+
+        logger.info(f"Ngram index built [terms: {len(postings)}, trigrams: {len(gram_rows)}]")
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """The index as named arrays, for an index snapshot"""
+        return {
+            **self._postings.arrays(f"{prefix}.postings"),
+            **self._grams.arrays(f"{prefix}.grams"),
+            f"{prefix}.gram_counts": self._gram_counts,
+            f"{prefix}.country_masks": self._country_masks,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, meta: dict) -> "NgramIndex":
+        """Index over arrays written by `arrays`, typically memory-mapped from a snapshot"""
+        index = cls()
+        index._postings = Postings.from_arrays(arrays, f"{prefix}.postings", meta["countries"])
+        index._grams = KeyTable.from_arrays(arrays, f"{prefix}.grams")
+        index._gram_counts = arrays[f"{prefix}.gram_counts"]
+        index._country_masks = arrays[f"{prefix}.country_masks"]
+        return index
+
+    def meta(self) -> dict:
+        return {"countries": self._postings.countries}
+
+    def top_k(self, name: str, country: Optional[str] = None, k: int = 20, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Return the k archive names sharing the most trigrams with `name`.
+
+        Args:
+            name: input name
+            country: restricts results to that country when it is one of COUNTRIES
+            k: maximum number of names returned
+            min_score: minimum Dice score for a name to be returned
+
+        Returns:
+            List of (name, score) tuples, best first
+        """
+        query = normalize_name(name)
+        if not query or not len(self) or k <= 0:
+            return []
+
+        query_grams = set(trigrams(query))
+        hits = self._grams.get_many(list(query_grams))
+        if not len(hits):
+            return []
+
+        overlap = np.bincount(hits, minlength=len(self))
+        scores = 2.0 * overlap / (len(query_grams) + self._gram_counts)
+
+        scoped_country = country if country in COUNTRIES else None
+        if scoped_country is not None:
+            if scoped_country not in self._postings.countries:
+                return []
+            mask = self._country_masks[self._postings.countries.index(scoped_country)]
+            scores = np.where(mask, scores, 0.0)
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        top_scores = scores[top]
+        top = top[(top_scores > 0.0) & (top_scores >= min_score)]
+
+        names, owners = self._postings.names_of(top, scoped_country)
+
+        results = []
+        seen = set()
+        for n, score in zip(names, scores[top][owners].tolist()):
+            if n not in seen:
+                seen.add(n)
+                results.append((n, score))
+
+        return results
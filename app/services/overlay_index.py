@@ -0,0 +1,261 @@
+import bisect
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import jellyfish
+
+from app.services.db_interaction import COUNTRIES
+from app.services.ngram_index import trigrams
+from app.services.phonetics import PHONETIC_ENCODINGS, phonetic_keys
+from app.services.prefix_index import AUTOCOMPLETE_FUZZY_MIN_LENGTH, one_edit_variants
+from app.services.symspell_index import generate_deletes
+from app.utils.utils import normalize_name
+
+# scope of the all-countries view, as in the base index
+_ALL_COUNTRIES = "*"
+# sorts after every character of a term, closes the range of a prefix
+_MAX_CHAR = "\U0010ffff"
+
+
+class OverlayIndex():
+    """
+    Small mutable name index merged into the lookups of the base NameIndex:
+    archive rows inserted since the base was built, and names learned from
+    LLM corrections.
+
+    The base indexes are packed into flat arrays and can only be rebuilt as
+    a whole. The overlay keeps the same lookups (phonetic keys, symmetric
+    deletes, trigrams, sorted terms for completion) in plain dictionaries,
+    so adding or removing a row only touches that row's keys, whatever the
+    size of the overlay. Lookups follow the semantics of the base indexes.
+
+    Rows are added and removed while lookups run in other threads, so every
+    method holds the overlay's lock.
+    """
+
+    def __init__(self, max_distance: int, prefix_length: int):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._lock = threading.Lock()
+
+        # name -> its countries, in insertion order
+        self._countries: Dict[str, Dict[str, None]] = {}
+        # (scope, encoding, key) -> names
+        self._phonetic: Dict[Tuple[str, str, str], Dict[str, None]] = {}
+        # normalized term -> {country: [original names]}, and the order terms were added in
+        self._postings: Dict[str, Dict[str, List[str]]] = {}
+        self._term_ids: Dict[str, int] = {}
+        self._next_term_id = 0
+        # delete string and trigram -> terms, and the distinct trigrams of every term
+        self._deletes: Dict[str, Dict[str, None]] = {}
+        self._grams: Dict[str, Dict[str, None]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        # sorted terms for completion, and the letters they use
+        self._terms: List[str] = []
+        self._letters: Counter = Counter()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def has(self, name: str, country: str) -> bool:
+        """Whether the overlay has the (name, country) row"""
+        with self._lock:
+            return country in self._countries.get(name, ())
+
+    def add(self, name: str, country: str) -> bool:
+        """Add a (name, country) row, False when the overlay already has it"""
+        with self._lock:
+            countries = self._countries.setdefault(name, {})
+            if country in countries:
+                return False
+            # the all-countries view lists a name once even if several countries share it
+            first_seen = not countries
+            countries[country] = None
+            self._size += 1
+
+            for encoding, key in zip(PHONETIC_ENCODINGS, phonetic_keys(name)):
+                if not key:
+                    continue
+                self._phonetic.setdefault((country, encoding, key), {})[name] = None
+                if first_seen:
+                    self._phonetic.setdefault((_ALL_COUNTRIES, encoding, key), {})[name] = None
+
+            term = normalize_name(name)
+            if term:
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    self._add_term(term)
+                self._postings[term].setdefault(country, []).append(name)
+            return True
+
+    def remove(self, name: str, country: str) -> bool:
+        """Remove a (name, country) row, False when the overlay does not have it"""
+        with self._lock:
+            countries = self._countries.get(name)
+            if countries is None or country not in countries:
+                return False
+            del countries[country]
+            if not countries:
+                del self._countries[name]
+            self._size -= 1
+
+            for encoding, key in zip(PHONETIC_ENCODINGS, phonetic_keys(name)):
+                if not key:
+                    continue
+                _discard(self._phonetic, (country, encoding, key), name)
+                if not countries:
+                    _discard(self._phonetic, (_ALL_COUNTRIES, encoding, key), name)
+
+            term = normalize_name(name)
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings[country].remove(name)
+                if not postings[country]:
+                    del postings[country]
+                if not postings:
+                    del self._postings[term]
+                    self._remove_term(term)
+            return True
+
+    def _add_term(self, term: str):
+        self._term_ids[term] = self._next_term_id
+        self._next_term_id += 1
+        for delete in generate_deletes(term[:self.prefix_length], self.max_distance):
+            self._deletes.setdefault(delete, {})[term] = None
+        grams = set(trigrams(term))
+        self._gram_counts[term] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, {})[term] = None
+        bisect.insort(self._terms, term)
+        self._letters.update(c for c in term if c.isalpha())
+
+    def _remove_term(self, term: str):
+        del self._term_ids[term]
+        for delete in generate_deletes(term[:self.prefix_length], self.max_distance):
+            _discard(self._deletes, delete, term)
+        del self._gram_counts[term]
+        for gram in set(trigrams(term)):
+            _discard(self._grams, gram, term)
+        del self._terms[bisect.bisect_left(self._terms, term)]
+        self._letters.subtract(c for c in term if c.isalpha())
+        for c in set(term):
+            if self._letters[c] <= 0:
+                del self._letters[c]
+
+    def _scope(self, country: Optional[str]) -> str:
+        return country if country in COUNTRIES else _ALL_COUNTRIES
+
+    def _in_scope(self, term: str, country: Optional[str]) -> bool:
+        return country not in COUNTRIES or country in self._postings[term]
+
+    def _names_of(self, term: str, country: Optional[str]) -> List[str]:
+        """Original names of a term, in `country` when it is one of COUNTRIES"""
+        postings = self._postings.get(term, {})
+        if country in COUNTRIES:
+            return postings.get(country, [])
+        return [name for names in postings.values() for name in names]
+
+    def get_candidates(self, key: str, country: Optional[str] = None, encoding: str = "metaphone") -> Tuple[str, ...]:
+        """Names sharing one phonetic key, see NameIndex.get_candidates"""
+        with self._lock:
+            return tuple(self._phonetic.get((self._scope(country), encoding, key), ()))
+
+    def get_phonetic_candidates(self, keys: Tuple[str, ...], country: Optional[str] = None) -> List[str]:
+        """Names sharing any of the phonetic keys, see NameIndex.get_phonetic_candidates"""
+        scope = self._scope(country)
+        with self._lock:
+            return list(dict.fromkeys(
+                name
+                for encoding, key in zip(PHONETIC_ENCODINGS, keys) if key
+                for name in self._phonetic.get((scope, encoding, key), ())
+            ))
+
+    def get_edit_candidates(self, name: str, country: Optional[str] = None, max_distance: Optional[int] = None) -> List[str]:
+        """Names within `max_distance` edits of `name`, closest first, see SymSpellIndex.lookup"""
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        query = normalize_name(name)
+        if not query:
+            return []
+
+        with self._lock:
+            terms = {
+                term
+                for delete in generate_deletes(query[:self.prefix_length], max_distance)
+                for term in self._deletes.get(delete, ())
+            }
+            matches: List[Tuple[int, int, str]] = []
+            for term in terms:
+                if abs(len(term) - len(query)) > max_distance:
+                    continue
+                distance = jellyfish.damerau_levenshtein_distance(query, term)
+                if distance <= max_distance:
+                    matches.append((distance, self._term_ids[term], term))
+
+            # closest first, then in the order the terms were added
+            matches.sort()
+            return list(dict.fromkeys(n for _, _, term in matches for n in self._names_of(term, country)))
+
+    def ngram_top_k(self, name: str, country: Optional[str] = None, k: int = 20, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """The k names sharing the most trigrams with `name`, best first, see NgramIndex.top_k"""
+        query = normalize_name(name)
+        if not query or k <= 0:
+            return []
+
+        query_grams = set(trigrams(query))
+        with self._lock:
+            overlap = Counter(term for gram in query_grams for term in self._grams.get(gram, ()))
+            scored = [
+                (2.0 * count / (len(query_grams) + self._gram_counts[term]), term)
+                for term, count in overlap.items()
+            ]
+
+            matches: Dict[str, float] = {}
+            for score, term in heapq.nlargest(k, (s for s in scored if s[0] >= min_score and self._in_scope(s[1], country))):
+                for n in self._names_of(term, country):
+                    matches.setdefault(n, score)
+            return list(matches.items())
+
+    def complete(self, prefix: str, country: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> List[Tuple[str, int]]:
+        """Names completing a typed prefix, ranked like PrefixIndex.complete"""
+        query = normalize_name(prefix)
+        if not query or limit < 1:
+            return []
+
+        with self._lock:
+            variants = {query: 0}
+            if fuzzy and len(query) >= AUTOCOMPLETE_FUZZY_MIN_LENGTH:
+                variants.update((variant, 1) for variant in one_edit_variants(query, "".join(self._letters)))
+
+            # the exact prefix comes first, so a term keeps its smallest number of edits
+            terms, best = self._terms, {}
+            for variant, edits in variants.items():
+                start, end = bisect.bisect_left(terms, variant), bisect.bisect_left(terms, variant + _MAX_CHAR)
+                for term in terms[start:end]:
+                    best.setdefault(term, edits)
+
+            # exact completions first, then names listed by more countries, shorter, alphabetical
+            postings = self._postings
+            ranked = heapq.nsmallest(limit, (
+                (edits, -len(postings[term]), len(term), term)
+                for term, edits in best.items() if self._in_scope(term, country)
+            ))
+            return [(self._names_of(term, country)[0], edits) for edits, _, _, term in ranked]
+
+    def knows(self, name: str, country: Optional[str]) -> bool:
+        """Whether the overlay has `name` (case-insensitively) for `country`"""
+        with self._lock:
+            return any(n.lower() == name.lower() for n in self._names_of(normalize_name(name), country))
+
+
+def _discard(table: Dict, key, member: str):
+    """Remove `member` from the row of `key`, dropping rows left empty"""
+    row = table.get(key)
+    if row is not None:
+        row.pop(member, None)
+        if not row:
+            del table[key]
@@ -0,0 +1,58 @@
+import re
+import unicodedata
+from typing import Tuple
+
+import jellyfish
+
+# Phonetic encodings indexed per archive name, in lookup order
+PHONETIC_ENCODINGS = ("metaphone", "fold_metaphone", "nysiis", "soundex")
+
+# Encodings whose match counts as a full phonetic match when scoring.
+# Soundex buckets are too coarse for that, it only widens candidate retrieval.
+STRONG_ENCODINGS = ("metaphone", "fold_metaphone", "nysiis")
+
+_VOWEL_TABLE = str.maketrans({"å": "a", "æ": "e", "ä": "e", "ø": "o", "ö": "o"})
+
+# Spelling variants of the same sound in Danish, Norwegian and Swedish names.
+# The initial clusters only sound alike at the start of a word (Katja is not Kasha),
+# \b anchors them there in every token of a full name.
+_FOLD_RULES = [
+    (re.compile(r"\b(hj|gj|dj|lj)"), "j"),     # Hjalmar / Jalmar
+    (re.compile(r"\bhv"), "v"),                # Hvitfeldt / Vitfeldt
+    (re.compile(r"\b(skj|stj|sch|sj|kj|tj)"), "sh"),  # Kjell / Tjell, Sjur / Schur
+    (re.compile(r"aa"), "a"),                   # Aase / Åse
+    (re.compile(r"th"), "t"),                   # Thor / Tor
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"ck"), "k"),
+    (re.compile(r"w"), "v"),                    # Wilhelm / Vilhelm
+]
+
+
+def fold_scandinavian(name: str) -> str:
+    """
+    Lowercase ASCII form of a name with Scandinavian spelling variants folded
+    together: å/ä/æ/ø/ö to plain vowels, other accents stripped, and the
+    consonant clusters that are written differently but sound alike unified
+    """
+    folded = name.lower().strip().translate(_VOWEL_TABLE)
+    folded = unicodedata.normalize("NFKD", folded).encode("ascii", "ignore").decode("ascii")
+
+    for pattern, replacement in _FOLD_RULES:
+        folded = pattern.sub(replacement, folded)
+
+    return folded
+
+
+def phonetic_keys(name: str) -> Tuple[str, ...]:
+    """
+    Phonetic keys of a name, aligned with PHONETIC_ENCODINGS. A key is ""
+    when the encoding has nothing to work with (e.g. no ASCII letters).
+    """
+    folded = fold_scandinavian(name)
+
+    return (
+        jellyfish.metaphone(name),
+        jellyfish.metaphone(folded) if folded else "",
+        jellyfish.nysiis(folded) if folded else "",
+        jellyfish.soundex(folded) if folded else "",
+    )
@@ -0,0 +1,269 @@
+import logging
+import os
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.db_interaction import COUNTRIES
+from app.services.index_snapshot import KeyTable, Postings
+from app.utils.utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Completions a lookup can return at most, the length of the precomputed lists of large prefixes
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv("AUTOCOMPLETE_MAX_RESULTS", "20"))
+# Prefixes shorter than this only complete exactly, a one-edit variant of them matches too much to be useful
+AUTOCOMPLETE_FUZZY_MIN_LENGTH = int(os.getenv("AUTOCOMPLETE_FUZZY_MIN_LENGTH", "3"))
+# Prefixes matching more terms than this get their completions precomputed
+_LARGE_RANGE = 2048
+
+# scope of the precomputed completions of the all-countries view
+_ALL_COUNTRIES = "*"
+
+
+def _top_key(scope: str, prefix: str) -> str:
+    return f"{scope}\t{prefix}"
+
+
+def one_edit_variants(query: str, alphabet: str) -> Set[str]:
+    """Every string one deletion, transposition, substitution or insertion (over `alphabet`) away from `query`"""
+    splits = [(query[:i], query[i:]) for i in range(len(query) + 1)]
+    edits = {left + right[1:] for left, right in splits if right}
+    edits.update(left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1)
+    edits.update(left + c + right[1:] for left, right in splits if right for c in alphabet)
+    edits.update(left + c + right for left, right in splits for c in alphabet)
+    edits.discard(query)
+    edits.discard("")
+    return edits
+
+
+class PrefixIndex():
+    """
+    Sorted prefix index over the name archive, for autocompletion.
+
+    The normalized archive terms are kept sorted in one fixed-width byte
+    array, so all the terms starting with a prefix form a contiguous range
+    found with two np.searchsorted probes: the array is a flattened trie
+    whose nodes are ranges. A lookup also probes every one-edit variant of
+    the prefix (deletion, transposition, substitution and insertion over the
+    archive's alphabet) in the same vectorized call.
+
+    Completions are ranked by commonness, approximated by the number of
+    countries listing the name, then by length and alphabetically; every term
+    has its position in that order precomputed. Ranking a range is then an
+    argpartition over it, except for the few prefixes matching more than
+    _LARGE_RANGE terms (short ones like "a" or "ma"), whose best completions
+    are precomputed per country, so no lookup touches more than a few
+    thousand terms.
+
+    Postings are partitioned per country like in the other indexes, and all
+    arrays can be written to and memory-mapped from an index snapshot.
+    """
+
+    def __init__(self, max_results: int = AUTOCOMPLETE_MAX_RESULTS):
+        self.max_results = max_results
+
+        # sorted normalized terms, one byte wider than the longest so b"\xff" can close a range
+        self._keys = np.zeros(0, dtype="S1")
+        # position of every term in completion order
+        self._ranks = np.zeros(0, dtype=np.int32)
+        self._postings = Postings.from_lists(list(COUNTRIES), [])
+        # (country, term) membership, rows in the order of self._postings.countries
+        self._country_masks = np.zeros((len(COUNTRIES), 0), dtype=bool)
+        # "scope\tprefix" -> best term ids, for the prefixes matching more than _LARGE_RANGE terms
+        self._top = KeyTable.from_dict({})
+        # letters of the archive terms, used for substitutions and insertions
+        self._alphabet = ""
+
+    def __len__(self):
+        return len(self._keys)
+
+    def build(self, entries: Iterable[Tuple[str, str]]):
+        """Build the index from (name, country) pairs"""
+        rows: Dict[str, Dict[str, List[str]]] = {}
+        countries = list(COUNTRIES)
+
+        for name, country in entries:
+            term = normalize_name(name)
+            if not term:
+                continue
+
+            if country not in countries:
+                countries.append(country)
+            names = rows.setdefault(term, {}).setdefault(country, [])
+            if name not in names:
+                names.append(name)
+
+        # code point order of str is the byte order of UTF-8, the order np.searchsorted sees
+        terms = sorted(rows)
+        encoded = [term.encode("utf-8") for term in terms]
+        width = max((len(e) for e in encoded), default=0) + 1
+
+        self._keys = np.array(encoded, dtype=f"S{width}")
+        self._postings = Postings.from_lists(countries, [rows[term] for term in terms])
+
+        self._country_masks = np.zeros((len(countries), len(terms)), dtype=bool)
+        term_of_entry = np.repeat(np.arange(len(terms)), np.diff(self._postings.indptr))
+        self._country_masks[self._postings.entry_countries, term_of_entry] = True
+
+        lengths = np.fromiter((len(term) for term in terms), dtype=np.int32, count=len(terms))
+        order = np.lexsort((np.arange(len(terms)), lengths, -self._country_masks.sum(axis=0)))
+        self._ranks = np.empty(len(terms), dtype=np.int32)
+        self._ranks[order] = np.arange(len(terms), dtype=np.int32)
+
+        self._top = KeyTable.from_dict(self._large_prefixes())
+        self._alphabet = "".join(sorted(c for c in set("".join(terms)) if c.isalpha()))
+
+        logger.info(f"Prefix index built [terms: {len(terms)}, precomputed prefixes: {len(self._top)}]")
+
+    def _large_prefixes(self) -> Dict[str, List[int]]:
+        """Best term ids of every prefix matching more than _LARGE_RANGE terms, per scope"""
+        count, width = len(self._keys), self._keys.dtype.itemsize
+        if count <= _LARGE_RANGE:
+            return {}
+
+        key_bytes = self._keys.view(np.uint8).reshape(count, width)
+        scopes = [(_ALL_COUNTRIES, None)] + [(country, row) for row, country in enumerate(self._postings.countries)]
+        top: Dict[str, List[int]] = {}
+
+        # depth-first over the byte trie, only descending into large nodes
+        stack = [(0, count, 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            column = key_bytes[lo:hi, depth]
+            # the children of a node are runs of the same next byte, 0 is the padding of the node's own term
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+            ends = np.append(starts[1:], hi - lo)
+
+            for start, end, byte in zip(starts.tolist(), ends.tolist(), column[starts].tolist()):
+                if byte == 0 or end - start <= _LARGE_RANGE:
+                    continue
+                child_lo, child_hi = lo + start, lo + end
+                stack.append((child_lo, child_hi, depth + 1))
+
+                try:
+                    prefix = bytes(key_bytes[child_lo, :depth + 1]).decode("utf-8")
+                except UnicodeDecodeError:
+                    # ends inside a multi-byte character, never a query prefix
+                    continue
+
+                ids = np.arange(child_lo, child_hi)
+                for scope, row in scopes:
+                    scoped = ids if row is None else ids[self._country_masks[row, child_lo:child_hi]]
+                    top[_top_key(scope, prefix)] = self._best(scoped, self.max_results).tolist()
+
+        return top
+
+    def _best(self, ids: np.ndarray, k: int) -> np.ndarray:
+        """The k best of some term ids, in completion order"""
+        ranks = self._ranks[ids]
+        if len(ids) > k:
+            keep = np.argpartition(ranks, k - 1)[:k]
+            ids, ranks = ids[keep], ranks[keep]
+        return ids[np.argsort(ranks)]
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """The index as named arrays, for an index snapshot"""
+        return {
+            f"{prefix}.keys": self._keys,
+            f"{prefix}.ranks": self._ranks,
+            **self._postings.arrays(f"{prefix}.postings"),
+            f"{prefix}.country_masks": self._country_masks,
+            **self._top.arrays(f"{prefix}.top"),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, meta: dict) -> "PrefixIndex":
+        """Index over arrays written by `arrays`, typically memory-mapped from a snapshot"""
+        index = cls(meta["max_results"])
+        index._keys = arrays[f"{prefix}.keys"]
+        index._ranks = arrays[f"{prefix}.ranks"]
+        index._postings = Postings.from_arrays(arrays, f"{prefix}.postings", meta["countries"])
+        index._country_masks = arrays[f"{prefix}.country_masks"]
+        index._top = KeyTable.from_arrays(arrays, f"{prefix}.top")
+        index._alphabet = meta["alphabet"]
+        return index
+
+    def meta(self) -> dict:
+        return {"max_results": self.max_results, "countries": self._postings.countries, "alphabet": self._alphabet}
+
+    def complete(self, prefix: str, country: Optional[str] = None, limit: int = 10, fuzzy: bool = True) -> List[Tuple[str, int]]:
+        """
+        Complete a typed prefix into archive names.
+
+        Args:
+            prefix: what was typed so far, normalized like the archive terms
+            country: restricts completions to that country when it is one of COUNTRIES
+            limit: completions returned, at most `max_results`
+            fuzzy: also complete the one-edit variants of prefixes of at least AUTOCOMPLETE_FUZZY_MIN_LENGTH characters
+
+        Returns:
+            List of (archive name, edits), names starting with the prefix (0 edits) first
+        """
+        query = normalize_name(prefix)
+        limit = min(limit, self.max_results)
+        if not query or not len(self._keys) or limit < 1:
+            return []
+
+        variants = [query]
+        if fuzzy and len(query) >= AUTOCOMPLETE_FUZZY_MIN_LENGTH:
+            # sorted probes let np.searchsorted start each search from the previous one
+            variants += sorted(one_edit_variants(query, self._alphabet))
+        encoded = [v.encode("utf-8") for v in variants]
+
+        # a probe as wide as the keys has no completions, and would be truncated by the dtype
+        width = self._keys.dtype.itemsize
+        if max(map(len, encoded)) >= width:
+            fits = [i for i, e in enumerate(encoded) if len(e) < width]
+            variants, encoded = [variants[i] for i in fits], [encoded[i] for i in fits]
+            if not variants:
+                return []
+
+        los = np.searchsorted(self._keys, np.array(encoded, dtype=self._keys.dtype))
+        his = np.searchsorted(self._keys, np.array([e + b"\xff" for e in encoded], dtype=self._keys.dtype))
+        probe_edits = np.ones(len(variants), dtype=np.int64)
+        probe_edits[0] = variants[0] != query
+
+        scope = country if country in COUNTRIES else None
+        row = self._postings.countries.index(scope) if scope is not None else None
+
+        # the terms of small ranges are gathered into one array and ranked directly
+        matched = np.flatnonzero(his > los)
+        small = matched[his[matched] - los[matched] <= _LARGE_RANGE]
+        sizes = his[small] - los[small]
+        ids = np.arange(int(sizes.sum()), dtype=np.int64) + np.repeat(los[small] - (np.cumsum(sizes) - sizes), sizes)
+        owners = np.repeat(small, sizes)
+        if row is not None:
+            keep = self._country_masks[row, ids]
+            ids, owners = ids[keep], owners[keep]
+
+        # large ranges use their precomputed, already scoped, best terms
+        large = matched[his[matched] - los[matched] > _LARGE_RANGE].tolist()
+        if large:
+            tops = [self._top.get(_top_key(scope or _ALL_COUNTRIES, variants[i])).astype(np.int64) for i in large]
+            ids = np.concatenate([ids] + tops)
+            owners = np.concatenate([owners] + [np.full(len(top), i) for i, top in zip(large, tops)])
+        if not len(ids):
+            return []
+
+        # exact completions first; a term matches at most 3 probes (one per length), so 3 * limit keep enough distinct ones
+        edits = probe_edits[owners]
+        scores = edits * len(self._keys) + self._ranks[ids]
+        if len(ids) > 3 * limit:
+            keep = np.argpartition(scores, 3 * limit - 1)[:3 * limit]
+            ids, scores, edits = ids[keep], scores[keep], edits[keep]
+        order = np.argsort(scores, kind="stable")
+
+        best: Dict[int, int] = {}
+        for term_id, distance in zip(ids[order].tolist(), edits[order].tolist()):
+            best.setdefault(term_id, distance)
+            if len(best) == limit:
+                break
+
+        names, owners = self._postings.names_of(list(best), scope)
+        # one name per term, the first the archive lists
+        completions: Dict[int, str] = {}
+        for name, owner in zip(names, owners.tolist()):
+            completions.setdefault(owner, name)
+        distances = list(best.values())
+        return [(completions[owner], distances[owner]) for owner in sorted(completions)]
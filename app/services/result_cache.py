@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.models.scheme import Suggestion
+from app.services.metrics import metrics
+from app.services.name_index import name_index
+from app.utils.utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "100000"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_NEGATIVE_TTL = int(os.getenv("RESULT_CACHE_NEGATIVE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+Key = Tuple[str, Optional[str]]
+
+
+class LRUCache():
+    """Bounded in-process LRU with a per-entry TTL"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ResultCache():
+    """
+    Two-tier cache of correction results in front of the pipeline.
+
+    Tier 1 is a per-process LRU, tier 2 an optional shared Redis (REDIS_URL)
+    so every worker and pod benefits from the others' work. Keys carry the
+    name archive version, so reloading the archive invalidates every entry.
+    Empty results, names the LLM found no correction for, are cached too
+    (negative caching) with a shorter TTL, so they are retried later.
+    Redis failures are logged and treated as misses.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: int = RESULT_CACHE_TTL, negative_ttl: int = RESULT_CACHE_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = LRUCache(max_size)
+        self.redis = None
+        self._version = None
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    def start(self, redis_url: Optional[str] = REDIS_URL):
+        """Connect the shared tier, the cache runs local-only without a REDIS_URL"""
+        if not redis_url or self.redis is not None:
+            return
+
+        import redis.asyncio as aioredis
+        self.redis = aioredis.from_url(redis_url, socket_timeout=0.05, socket_connect_timeout=0.5)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+        self.redis = None
+
+    def _key(self, name: str, country: Optional[str]) -> str:
+        version = name_index.version
+        if version != self._version:
+            # archive reloaded: local entries belong to the old version
+            self.local.clear()
+            self._version = version
+
+        # same normalized key the stored results are looked up by
+        return f"spell:v{version}:{country or '*'}:{normalize_name(name)}"
+
+    def _hit(self, value: list) -> List[Suggestion]:
+        if not value:
+            self.negative_hits += 1
+        return [Suggestion(**s) for s in value]
+
+    async def get(self, name: str, country: Optional[str]) -> Optional[List[Suggestion]]:
+        """Cached suggestions for (name, country), or None on a miss"""
+        return (await self.get_many([(name, country)])).get((name, country))
+
+    async def get_many(self, keys: List[Key]) -> Dict[Key, List[Suggestion]]:
+        """Look several keys up, the Redis tier is queried with a single MGET"""
+        found: Dict[Key, List[Suggestion]] = {}
+        remote: List[Tuple[Key, str]] = []
+
+        for name, country in keys:
+            cache_key = self._key(name, country)
+            value = self.local.get(cache_key)
+            if value is not None:
+                self.local_hits += 1
+                found[(name, country)] = self._hit(value)
+            else:
+                remote.append(((name, country), cache_key))
+
+        if remote and self.redis is not None:
+            try:
+                values = await self.redis.mget([cache_key for _, cache_key in remote])
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Redis cache read failed [error: {e!r}]")
+                values = [None] * len(remote)
+
+            for (key, cache_key), raw in zip(remote, values):
+                if raw is None:
+                    continue
+                value = json.loads(raw)
+                self.redis_hits += 1
+                self.local.set(cache_key, value, self.ttl if value else self.negative_ttl)
+                found[key] = self._hit(value)
+
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set(self, name: str, country: Optional[str], suggestions: List[Suggestion]):
+        await self.set_many({(name, country): suggestions})
+
+    async def set_many(self, results: Dict[Key, List[Suggestion]]):
+        """Store results in both tiers, the Redis writes go out as one pipeline"""
+        pipeline = self.redis.pipeline(transaction=False) if self.redis is not None else None
+
+        for (name, country), suggestions in results.items():
+            cache_key = self._key(name, country)
+            value = [s.model_dump() for s in suggestions]
+            ttl = self.ttl if value else self.negative_ttl
+
+            self.local.set(cache_key, value, ttl)
+            if pipeline is not None:
+                pipeline.set(cache_key, json.dumps(value), ex=ttl)
+
+        if pipeline is not None and results:
+            try:
+                await pipeline.execute()
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Redis cache write failed [error: {e!r}]")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "redis_errors": self.redis_errors,
+            "size": len(self.local)
+        }
+
+
+result_cache = ResultCache()
+
+metrics.counter_callback(
+    "result_cache_lookups_total",
+    "Result cache lookups, by outcome",
+    lambda: {
+        ("local_hit",): result_cache.local_hits,
+        ("redis_hit",): result_cache.redis_hits,
+        ("miss",): result_cache.misses,
+    },
+    ["result"]
+)
+metrics.counter_callback("result_cache_negative_hits_total", "Cache hits on an empty (negative) result", lambda: result_cache.negative_hits)
+metrics.counter_callback(
+    "result_cache_removals_total",
+    "Entries removed from the local tier, by reason",
+    lambda: {("eviction",): result_cache.local.evictions, ("expiration",): result_cache.local.expirations},
+    ["reason"]
+)
+metrics.counter_callback("result_cache_redis_errors_total", "Failed Redis reads and writes", lambda: result_cache.redis_errors)
+metrics.gauge_callback("result_cache_entries", "Entries in the local tier", lambda: len(result_cache.local))
@@ -0,0 +1,173 @@
+from collections import Counter
+from typing import Sequence, Tuple
+
+import jellyfish
+import numpy as np
+
+from app.services.phonetics import PHONETIC_ENCODINGS, STRONG_ENCODINGS, phonetic_keys
+from app.utils.utils import normalize_name
+
+_STRONG_POSITIONS = [PHONETIC_ENCODINGS.index(encoding) for encoding in STRONG_ENCODINGS]
+
+
+def encode_names(names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack names into a zero-padded (n, max_len) array of code points.
+
+    Returns:
+        tuple: (codes, lengths)
+    """
+    lengths = np.fromiter((len(n) for n in names), dtype=np.int64, count=len(names))
+    width = int(lengths.max()) if len(names) else 0
+    if width == 0:
+        return np.zeros((len(names), 0), dtype=np.uint32), lengths
+
+    buffer = "".join(n.ljust(width, "\0") for n in names).encode("utf-32-le")
+    codes = np.frombuffer(buffer, dtype=np.uint32).reshape(len(names), width)
+    return codes, lengths
+
+
+def levenshtein_distances(query: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    Levenshtein distance from `query` to every candidate in one vectorized pass.
+
+    Runs the classic DP row by row over the query characters, updating all
+    candidates at once. The insertion step (which depends on the cell to the
+    left) is resolved with a running minimum over `row - j`. Arrays are laid
+    out (position, candidate) so every step is a contiguous op over candidates.
+    """
+    codes, lengths = encode_names(candidates)
+    n, width = codes.shape
+
+    if not query:
+        return lengths
+
+    codes = np.ascontiguousarray(codes.T)
+    offsets = np.arange(width + 1, dtype=np.int32)[:, None]
+    previous = np.repeat(offsets, n, axis=1)
+    current = np.empty_like(previous)
+    mismatch = np.empty((width, n), dtype=bool)
+
+    for i, char in enumerate(query, start=1):
+        np.not_equal(codes, ord(char), out=mismatch)
+        current[0] = i
+        np.add(previous[:-1], mismatch, out=current[1:])
+        np.minimum(current[1:], previous[1:] + 1, out=current[1:])
+        current -= offsets
+        np.minimum.accumulate(current, axis=0, out=current)
+        current += offsets
+        previous, current = current, previous
+
+    return previous[lengths, np.arange(n)].astype(np.int64)
+
+
+def phonetic_scores(query_keys: Tuple[str, ...], candidate_keys: Sequence[Tuple[str, ...]]) -> np.ndarray:
+    """
+    1.0 when a strong encoding (STRONG_ENCODINGS) gives both the same key,
+    0.5 when the first two letters of the plain metaphones agree, else 0.
+    Keys are phonetic_keys() tuples.
+    """
+    query_meta = query_keys[0]
+    strong = [(position, query_keys[position]) for position in _STRONG_POSITIONS if query_keys[position]]
+
+    return np.fromiter(
+        (1.0 if any(keys[position] == key for position, key in strong)
+         else 0.5 if query_meta.startswith(keys[0][:2]) else 0.0
+         for keys in candidate_keys),
+        dtype=np.float64,
+        count=len(candidate_keys)
+    )
+
+
+def score_upper_bounds(
+    name: str,
+    candidates: Sequence[str],
+    phonetic_weight: float,
+    edit_distance_weight: float,
+    jaro_winkler_weight: float
+) -> np.ndarray:
+    """
+    Upper bound of score_batch for every candidate, much cheaper than the score.
+
+    Both string metrics are bounded by the characters the two names have in
+    common (as multisets), counted with one vectorized comparison per
+    distinct query character:
+    - the edit distance is at least max(len) - common (bag distance), which
+      also covers the length difference;
+    - Jaro matches at most `common` characters, and the Winkler prefix bonus
+      (4 letters at 0.1) adds at most 0.4 * (1 - jaro).
+    The phonetic score is bounded by 1.
+
+    Returns:
+        Array of bounds aligned with `candidates`
+    """
+    norm_name = normalize_name(name)
+    codes, lengths = encode_names([normalize_name(c) for c in candidates])
+    query_length = len(norm_name)
+
+    common = np.zeros(len(candidates), dtype=np.int64)
+    for char, count in Counter(norm_name).items():
+        common += np.minimum((codes == ord(char)).sum(axis=1), count)
+
+    longer = np.maximum(lengths, query_length)
+    edit_bounds = np.where(longer > 0, common / np.maximum(longer, 1), 0.0)
+    jaro_bounds = np.where(
+        common > 0,
+        (common / max(query_length, 1) + common / np.maximum(lengths, 1) + 1) / 3,
+        0.0
+    )
+
+    return (
+        phonetic_weight +
+        edit_bounds * edit_distance_weight +
+        (0.6 * jaro_bounds + 0.4 * (common > 0)) * jaro_winkler_weight
+    )
+
+
+def score_batch(
+    name: str,
+    candidates: Sequence[str],
+    phonetic_weight: float,
+    edit_distance_weight: float,
+    jaro_winkler_weight: float
+) -> np.ndarray:
+    """
+    Composite similarity of `name` against every candidate.
+
+    Query-side features (normalized form, phonetic keys) are computed once.
+    Edit distance is vectorized with NumPy; Jaro-Winkler and the phonetic
+    encodings run through jellyfish's native implementation in a single
+    comprehension each.
+
+    Returns:
+        Array of composite scores aligned with `candidates`
+    """
+    if not candidates:
+        return np.zeros(0, dtype=np.float64)
+
+    norm_name = normalize_name(name)
+    norm_candidates = [normalize_name(c) for c in candidates]
+
+    # Edit distance score (inverted and normalized)
+    distances = levenshtein_distances(norm_name, norm_candidates)
+    max_lens = np.maximum(
+        len(norm_name),
+        np.fromiter((len(c) for c in norm_candidates), dtype=np.int64, count=len(norm_candidates))
+    )
+    edit_scores = np.where(max_lens > 0, 1 - distances / np.maximum(max_lens, 1), 0.0)
+
+    # Jaro-Winkler similarity (good for typos)
+    jaro_scores = np.fromiter(
+        (jellyfish.jaro_winkler_similarity(norm_name, c) for c in norm_candidates),
+        dtype=np.float64,
+        count=len(norm_candidates)
+    )
+
+    # Phonetic similarity
+    phonetic = phonetic_scores(phonetic_keys(norm_name), [phonetic_keys(c) for c in norm_candidates])
+
+    return (
+        phonetic * phonetic_weight +
+        edit_scores * edit_distance_weight +
+        jaro_scores * jaro_winkler_weight
+    )
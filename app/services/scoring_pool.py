@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker processes per app process, 0 scores everything inline; by default the
+# spare cores (none on a single-core host, where a pool would only add overhead)
+SCORING_POOL_WORKERS = int(os.getenv("SCORING_POOL_WORKERS", str(min(max((os.cpu_count() or 1) - 1, 0), 4))))
+# A lookup (or a whole batch) with at least this many candidates is scored in the pool
+SCORING_POOL_MIN_CANDIDATES = int(os.getenv("SCORING_POOL_MIN_CANDIDATES", "2000"))
+# Candidates per task sent to a worker; small jobs are grouped up to it, big ones go alone
+SCORING_POOL_CHUNK_CANDIDATES = int(os.getenv("SCORING_POOL_CHUNK_CANDIDATES", "4000"))
+
+# (name, candidates) to rank
+Job = Tuple[str, List[str]]
+# (suggested name, score), plain tuples pickle far cheaper than Suggestion models
+Ranked = List[Tuple[str, float]]
+
+SCORING_JOBS = metrics.counter(
+    "scoring_jobs_total",
+    "Names ranked inline on the event loop or in the scoring process pool",
+    ["path"]
+)
+
+
+def _init_worker():
+    # import the scoring stack and run it once, so the first real task pays no import or cache warm-up
+    from app.services.spell_checker_service import SpellCheck
+    SpellCheck(db_session=None).rank_candidates("warmup", ["warmup", "warmer", "warden"])
+
+
+def _rank_chunk(jobs: List[Job], top_k: int, min_score: float) -> List[Ranked]:
+    """Worker side: rank every job's candidates with the same code as the inline path"""
+    from app.services.spell_checker_service import SpellCheck
+    spell_check = SpellCheck(db_session=None)
+    return [
+        [(s.name, s.similarity_score) for s in spell_check.rank_candidates(name, candidates, top_k, min_score)]
+        for name, candidates in jobs
+    ]
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class ScoringPool():
+    """
+    Process pool for the CPU-bound candidate scoring of large lookups.
+
+    Scoring is pure Python and NumPy work that would block the event loop
+    and use one core per app process. Lookups (or whole batches) with at
+    least `min_candidates` candidates are split into tasks of about
+    `chunk_candidates` candidates and ranked by `workers` processes instead;
+    smaller ones stay inline, where the round trip would cost more than the
+    scoring.
+
+    Workers receive the candidate names with each task and keep no index of
+    their own, so learned names and archive reloads in the app process are
+    never out of sync with them. They are started (spawned, not forked from
+    the threaded server) and warmed up at app startup.
+    """
+
+    def __init__(
+        self,
+        workers: int = SCORING_POOL_WORKERS,
+        min_candidates: int = SCORING_POOL_MIN_CANDIDATES,
+        chunk_candidates: int = SCORING_POOL_CHUNK_CANDIDATES
+    ):
+        self.workers = workers
+        self.min_candidates = min_candidates
+        self.chunk_candidates = chunk_candidates
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warmup: List[Future] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self):
+        """Spawn and warm up the worker processes, a no-op when the pool is disabled or running"""
+        if not self.enabled or self._executor is not None:
+            return
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        # every submit made while no worker is idle spawns one, so this starts them all now
+        self._warmup = [self._executor.submit(_ping) for _ in range(self.workers)]
+
+    async def wait_ready(self):
+        """Wait until the workers started by start() are warmed up, so no request pays for it"""
+        try:
+            pids = await asyncio.gather(*(asyncio.wrap_future(future) for future in self._warmup))
+            logger.info(f"Scoring pool ready [workers: {len(set(pids))}, min candidates: {self.min_candidates}]")
+        except Exception as e:
+            logger.error(f"Scoring pool warm-up failed, it is restarted on first use [error: {e!r}]")
+        self._warmup = []
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    def should_offload(self, candidates: int) -> bool:
+        """Whether ranking this many candidates is worth the round trip to the pool"""
+        return self.enabled and candidates >= self.min_candidates
+
+    def _chunks(self, jobs: List[Job]) -> List[List[Job]]:
+        chunks, chunk, size = [], [], 0
+        for job in jobs:
+            chunk.append(job)
+            size += len(job[1])
+            if size >= self.chunk_candidates:
+                chunks.append(chunk)
+                chunk, size = [], 0
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    async def rank_many(self, jobs: List[Job], top_k: int, min_score: float) -> List[Ranked]:
+        """
+        Rank several (name, candidates) jobs in the pool, chunks in parallel.
+
+        Returns:
+            One ranked list of (name, score) per job, in job order
+
+        Raises:
+            Exception: when the pool failed (e.g. a worker died), callers rank inline instead
+        """
+        # started lazily for callers outside the app lifespan (CLI, scripts)
+        self.start()
+
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(executor, _rank_chunk, chunk, top_k, min_score) for chunk in self._chunks(jobs)
+            ))
+        except Exception:
+            # a broken pool refuses all later work, the next call starts a fresh one
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+
+        SCORING_JOBS.inc("pool", amount=len(jobs))
+        return [ranked for chunk in results for ranked in chunk]
+
+
+scoring_pool = ScoringPool()
+
+metrics.gauge_callback(
+    "scoring_pool_min_candidates",
+    "Candidates from which a lookup or batch is scored in the process pool",
+    lambda: scoring_pool.min_candidates
+)
+metrics.gauge_callback("scoring_pool_workers", "Scoring process pool size, 0 when scoring runs inline", lambda: scoring_pool.workers)
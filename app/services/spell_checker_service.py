@@ -1,19 +1,33 @@
+import heapq
+import logging
+import os
 import time
 import random
 
 from fastapi import Path
-from app.models.models import CorrectedNames, InputNames, NameArchieve, Metaphone 
-from functools import lru_cache
-import jellyfish
-from typing import List, Optional, Tuple, Union
+from app.models.models import CorrectedNames, InputNames, NameArchieve, PhoneticKey
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Tuple, Dict
-import jellyfish
-from functools import lru_cache
-import string
+import numpy as np
 
 from app.models.scheme import EvaluationResponse, Suggestion
 from app.services.db_interaction import COUNTRIES
+from app.services.metrics import CANDIDATES, stage
+from app.services.name_index import name_index, SYMSPELL_MAX_DISTANCE
+from app.services.phonetics import PHONETIC_ENCODINGS, phonetic_keys
+from app.services.scoring import score_batch, score_upper_bounds
+from app.services.scoring_pool import SCORING_JOBS, scoring_pool
+from app.utils.utils import normalize_name, split_name
+
+logger = logging.getLogger(__name__)
+
+# Suggestions kept per name by the pipeline (and cached / stored), requests can ask for fewer
+SUGGESTIONS_TOP_K = int(os.getenv("SUGGESTIONS_TOP_K", "20"))
+SUGGESTIONS_MIN_SCORE = float(os.getenv("SUGGESTIONS_MIN_SCORE", "0"))
+# Candidates scored per vectorized batch while selecting the top-k
+SCORE_CHUNK_SIZE = int(os.getenv("SCORE_CHUNK_SIZE", "64"))
 
 # --- Background Task Function ---
 
@@ -50,102 +64,377 @@ from app.services.db_interaction import COUNTRIES
 # --- SpellCheck Class ---
 
 class SpellCheck:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, async_session: Optional[AsyncSession] = None):
         self.THRESHOLD = 2
-        self.MAX_DISTANCE = 3
+        self.MAX_DISTANCE = SYMSPELL_MAX_DISTANCE
         self.PHONETIC_WEIGHT = 0.4
         self.EDIT_DISTANCE_WEIGHT = 0.3
         self.JARO_WINKLER_WEIGHT = 0.3
+        # multi-token names: archive matches kept per token, full names kept by the beam
+        self.TOKEN_OPTIONS = 5
+        self.BEAM_WIDTH = 10
+        self.TOP_K = SUGGESTIONS_TOP_K
+        self.MIN_SCORE = SUGGESTIONS_MIN_SCORE
 
         from app.services.db_interaction import DB_service
-        self.db_obj = DB_service(db_session)
+        self.db_obj = DB_service(db_session, async_session)
+
+    def _phonetic_statement(self, keys: Tuple[str, ...], country: Optional[str] = None):
+        """Archive names sharing any of the phonetic keys, see app.services.phonetics"""
+        pairs = [(encoding, key) for encoding, key in zip(PHONETIC_ENCODINGS, keys) if key]
+        statement = select(NameArchieve.name).join(PhoneticKey).where(
+            tuple_(PhoneticKey.encoding, PhoneticKey.key).in_(pairs)
+        ).distinct()
+
+        if country in COUNTRIES:
+            statement = statement.where(NameArchieve.country == country)
+
+        return statement
 
-    @lru_cache(maxsize=1000)
     def get_phonetic_candidates(self, name: str, country: Optional[str] = None) -> List[str]:
         """
-        Get phonetic candidates from database with optional country filter
+        Get phonetic candidates with optional country filter: names sharing
+        any of the input's phonetic encodings (metaphone, Scandinavian-folded
+        metaphone, NYSIIS, Soundex).
+        Served from the in-memory name index, the database is only queried
+        when the index has not been loaded yet.
         """
-        target_metaphone = jellyfish.metaphone(name)
+        keys = phonetic_keys(name)
 
-        try:
-            query = self.db_obj.db.query(NameArchieve.name).join(Metaphone).filter(
-                Metaphone.metaphone == target_metaphone
-            )
-
-            if country in COUNTRIES:
-                query = query.filter(NameArchieve.country == country)
+        if name_index.loaded:
+            return name_index.get_phonetic_candidates(keys, country)
 
-            return [row[0] for row in query.all()]
+        try:
+            return list(self.db_obj.db.execute(self._phonetic_statement(keys, country)).scalars())
         except Exception as e:
             # Log the error here
             return []
         finally:
             self.db_obj.db.close()
 
-    def _normalize_name(self, name: str) -> str:
-        """Normalize names by removing punctuation and standardizing case"""
-        return name.translate(str.maketrans('', '', string.punctuation)).lower().strip()
+    async def get_phonetic_candidates_async(self, name: str, country: Optional[str] = None) -> List[str]:
+        """get_phonetic_candidates with the database fallback on the async session"""
+        if name_index.loaded or self.db_obj.async_db is None:
+            return self.get_phonetic_candidates(name, country)
+
+        try:
+            return list((await self.db_obj.async_db.execute(self._phonetic_statement(phonetic_keys(name), country))).scalars())
+        except Exception:
+            return []
 
-    def calculate_similarity_scores(self, original: str, candidate: str) -> Dict[str, float]:
+    def get_edit_distance_candidates(self, name: str, country: Optional[str] = None) -> List[str]:
         """
-        Calculate multiple similarity metrics between two names
-        Returns dictionary of scores
+        Get archive names within MAX_DISTANCE edits of the input from the
+        symmetric-delete index. Catches typos that change the metaphone key.
         """
-        norm_original = self._normalize_name(original)
-        norm_candidate = self._normalize_name(candidate)
+        if not name_index.loaded:
+            return []
 
-        # Edit distance score (inverted and normalized)
-        edit_distance = jellyfish.levenshtein_distance(norm_original, norm_candidate)
-        max_len = max(len(norm_original), len(norm_candidate))
-        edit_score = 1 - (edit_distance / max_len) if max_len > 0 else 0
+        return name_index.get_edit_candidates(name, country, self.MAX_DISTANCE)
 
-        # Jaro-Winkler similarity (good for typos)
-        jaro_score = jellyfish.jaro_winkler_similarity(norm_original, norm_candidate)
+    def get_ngram_candidates(self, name: str, country: Optional[str] = None) -> List[str]:
+        """
+        Get the top-k archive names by character trigram overlap. Covers inputs
+        whose metaphone is badly garbled (transposed or missing leading letters).
+        """
+        if not name_index.loaded:
+            return []
 
-        # Phonetic similarity
-        original_meta = jellyfish.metaphone(norm_original)
-        candidate_meta = jellyfish.metaphone(norm_candidate)
-        phonetic_score = 1.0 if original_meta == candidate_meta else 0.5 if original_meta.startswith(candidate_meta[:2]) else 0
+        return name_index.get_ngram_candidates(name, country)
 
-        return {
-            'edit_distance': edit_score,
-            'jaro_winkler': jaro_score,
-            'phonetic': phonetic_score
-        }
+    def get_candidates(self, name: str, country: Optional[str] = None, phonetic_candidates: Optional[List[str]] = None) -> List[str]:
+        """
+        Union of phonetic, edit-distance and trigram candidates, without duplicates.
+        `phonetic_candidates` lets batch callers reuse a lookup shared by several names.
+        """
+        if phonetic_candidates is None:
+            candidates = self.get_phonetic_candidates(name, country)
+        else:
+            candidates = list(phonetic_candidates)
+        seen = set(candidates)
+        CANDIDATES.observe(len(candidates), "phonetic")
+
+        for candidate in self.get_edit_distance_candidates(name, country) + self.get_ngram_candidates(name, country):
+            if candidate not in seen:
+                seen.add(candidate)
+                candidates.append(candidate)
+
+        CANDIDATES.observe(len(candidates), "total")
+        return candidates
+
+    def score_candidates(self, name: str, candidates: List[str]) -> np.ndarray:
+        """
+        Composite similarity score of `name` against every candidate, computed
+        in one batch (see app.services.scoring.score_batch)
+        """
+        return score_batch(
+            name,
+            candidates,
+            self.PHONETIC_WEIGHT,
+            self.EDIT_DISTANCE_WEIGHT,
+            self.JARO_WINKLER_WEIGHT
+        )
 
-    def get_suggestions(self, name: str, country: Optional[str] = None) -> List[Suggestion]:
+    def get_suggestions(
+        self,
+        name: str,
+        country: Optional[str] = None,
+        phonetic_candidates: Optional[List[str]] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None
+    ) -> List[Suggestion]:
         """
         Get ranked name suggestions with similarity scores
-        Returns list of dictionaries with name and composite similarity score
+        Returns the `top_k` (TOP_K by default) best suggestions scoring at
+        least `min_score` (MIN_SCORE by default), best first.
+        Names with several tokens are also corrected token by token, see
+        get_full_name_suggestions
         """
-        candidates = self.get_phonetic_candidates(name, country)
-        suggestions = []
+        top_k = self.TOP_K if top_k is None else top_k
+        min_score = self.MIN_SCORE if min_score is None else min_score
 
-        for candidate in candidates:
-            scores = self.calculate_similarity_scores(name, candidate)
+        with stage("candidates"):
+            candidates = self.get_candidates(name, country, phonetic_candidates)
+        with stage("scoring"):
+            suggestions = self.rank_candidates(name, candidates, top_k, min_score)
+        SCORING_JOBS.inc("inline")
 
-            # Composite score calculation
-            composite_score = (
-                (scores['phonetic'] * self.PHONETIC_WEIGHT) +
-                (scores['edit_distance'] * self.EDIT_DISTANCE_WEIGHT) +
-                (scores['jaro_winkler'] * self.JARO_WINKLER_WEIGHT)
+        return self._add_full_names(name, country, suggestions, top_k, min_score)
+
+    async def get_suggestions_async(
+        self,
+        name: str,
+        country: Optional[str] = None,
+        phonetic_candidates: Optional[List[str]] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None
+    ) -> List[Suggestion]:
+        """
+        get_suggestions for the async endpoints: a large candidate set
+        (SCORING_POOL_MIN_CANDIDATES) is ranked in the scoring process pool,
+        so the event loop keeps serving other requests meanwhile. The tokens
+        of a multi-token name are ranked the same way.
+        """
+        top_k = self.TOP_K if top_k is None else top_k
+        min_score = self.MIN_SCORE if min_score is None else min_score
+
+        with stage("candidates"):
+            candidates = self.get_candidates(name, country, phonetic_candidates)
+        with stage("scoring"):
+            suggestions = (await self._rank_many([(name, candidates)], top_k, min_score))[0]
+
+        return (await self._add_full_names_async({name: suggestions}, country, top_k, min_score))[name]
+
+    async def _rank_many(self, jobs: List[Tuple[str, List[str]]], top_k: int, min_score: float) -> List[List[Suggestion]]:
+        """rank_candidates for several (name, candidates) jobs, in the scoring pool when they are large enough together"""
+        if scoring_pool.should_offload(sum(len(candidates) for _, candidates in jobs)):
+            try:
+                ranked = await scoring_pool.rank_many(jobs, top_k, min_score)
+                return [[Suggestion(name=n, similarity_score=score) for n, score in r] for r in ranked]
+            except Exception as e:
+                logger.warning(f"Scoring pool failed, ranking inline [jobs: {len(jobs)}, error: {e!r}]")
+
+        SCORING_JOBS.inc("inline", amount=len(jobs))
+        return [self.rank_candidates(name, candidates, top_k, min_score) for name, candidates in jobs]
+
+    def _add_full_names(self, name: str, country: Optional[str], suggestions: List[Suggestion], top_k: int, min_score: float) -> List[Suggestion]:
+        """Merge the token-by-token corrections of a multi-token name into its ranked suggestions"""
+        if len(split_name(name)[0]) > 1:
+            with stage("full_name"):
+                suggestions = self._merge_full_names(suggestions, self.get_full_name_suggestions(name, country), top_k, min_score)
+
+        return suggestions
+
+    async def _add_full_names_async(
+        self,
+        suggestions: Dict[str, List[Suggestion]],
+        country: Optional[str],
+        top_k: int,
+        min_score: float
+    ) -> Dict[str, List[Suggestion]]:
+        """_add_full_names for several names, the tokens of all of them are ranked together with _rank_many"""
+        token_jobs = {name: self._token_jobs(name, country) for name in suggestions if len(split_name(name)[0]) > 1}
+        if not token_jobs:
+            return suggestions
+
+        with stage("full_name"):
+            ranked = await self._rank_many([job for jobs in token_jobs.values() for job in jobs], self.TOKEN_OPTIONS, 0.0)
+
+            results = dict(suggestions)
+            start = 0
+            for name, jobs in token_jobs.items():
+                full_names = self._combine_tokens(name, ranked[start:start + len(jobs)])
+                start += len(jobs)
+                results[name] = self._merge_full_names(results[name], full_names, top_k, min_score)
+
+        return results
+
+    def _merge_full_names(self, suggestions: List[Suggestion], full_names: List[Suggestion], top_k: int, min_score: float) -> List[Suggestion]:
+        full_names = [s for s in full_names if s.similarity_score >= min_score]
+        return self._merge_suggestions(full_names, suggestions)[:top_k]
+
+    def get_full_name_suggestions(self, name: str, country: Optional[str] = None) -> List[Suggestion]:
+        """
+        Correct a multi-token name (first, middle and last names, hyphenated
+        names) token by token.
+
+        Every token is matched against the archive on its own, then a beam
+        search combines the best TOKEN_OPTIONS matches of each token into the
+        BEAM_WIDTH best full names. A full name scores the mean of its token
+        scores, so a token without a close archive match keeps the whole name
+        below the evaluation thresholds. Tokens keep their archive spelling,
+        joined by the typed separators, so the result does not depend on how
+        the name was cased and can be cached and stored as is; the typed
+        casing is applied when it is served (see app.utils.utils.restyle_name).
+
+        Returns:
+            Ranked list of full-name Suggestion models
+        """
+        ranked = [self.rank_candidates(token, candidates, self.TOKEN_OPTIONS) for token, candidates in self._token_jobs(name, country)]
+        return self._combine_tokens(name, ranked)
+
+    def _token_jobs(self, name: str, country: Optional[str]) -> List[Tuple[str, List[str]]]:
+        """The (token, candidates) ranking job of every token of a multi-token name"""
+        jobs: List[Tuple[str, List[str]]] = []
+        for token in split_name(name)[0]:
+            # spellings differing only in case score the same, the first one stands for them
+            candidates: Dict[str, str] = {}
+            for candidate in self.get_candidates(token, country):
+                candidates.setdefault(candidate.lower(), candidate)
+            jobs.append((token, list(candidates.values())))
+
+        return jobs
+
+    def _combine_tokens(self, name: str, ranked: List[List[Suggestion]]) -> List[Suggestion]:
+        """Beam search over the ranked matches of every token, see get_full_name_suggestions"""
+        tokens, separators = split_name(name)
+        token_options = [
+            [(s.name, s.similarity_score) for s in suggestions] or [(token, 0.0)]
+            for token, suggestions in zip(tokens, ranked)
+        ]
+
+        beam: List[Tuple[Tuple[str, ...], float]] = [((), 0.0)]
+        for options in token_options:
+            beam = heapq.nlargest(
+                self.BEAM_WIDTH,
+                ((names + (option,), total + score) for names, total in beam for option, score in options),
+                key=lambda item: item[1]
             )
 
-            suggestions.append({
-                "name": candidate,
-                "similarity_score": round(composite_score, 4),
-                "score_breakdown": { 
-                    "phonetic": scores['phonetic'],
-                    "edit_distance": scores['edit_distance'],
-                    "jaro_winkler": scores['jaro_winkler']
-                }
-            })
+        return [
+            Suggestion(
+                name="".join(token + separator for token, separator in zip(names, separators + [""])),
+                similarity_score=round(total / len(tokens), 4)
+            )
+            for names, total in beam
+        ]
 
-        # Sort by composite score (descending)
-        suggestions.sort(key=lambda x: x['similarity_score'], reverse=True)
+    def _merge_suggestions(self, *ranked_lists: List[Suggestion]) -> List[Suggestion]:
+        """Merge ranked suggestion lists by score, ties and duplicate names keep the earlier list's entry"""
+        merged: Dict[str, Suggestion] = {}
+        for suggestions in ranked_lists:
+            for suggestion in suggestions:
+                merged.setdefault(suggestion.name.lower(), suggestion)
 
-        # Return as list of Pydantic Suggestion models
-        return [Suggestion(name=s["name"], similarity_score=s["similarity_score"]) for s in suggestions]
+        return sorted(merged.values(), key=lambda s: s.similarity_score, reverse=True)
+
+    def rank_candidates(self, name: str, candidates: List[str], top_k: Optional[int] = None, min_score: float = 0.0) -> List[Suggestion]:
+        """
+        Score candidates against `name` and return the `top_k` best (all by
+        default) scoring at least `min_score` as ranked suggestions.
+
+        Candidates are scored in chunks, in descending order of their score
+        upper bound (app.services.scoring.score_upper_bounds), and kept in a
+        heap of the k best. Once the heap is full, candidates whose bound
+        cannot reach its k-th score are never scored.
+        """
+        if not candidates:
+            return []
+
+        k = len(candidates) if top_k is None else top_k
+        if k <= 0:
+            return []
+
+        if len(candidates) > SCORE_CHUNK_SIZE or min_score > 0:
+            bounds = score_upper_bounds(name, candidates, self.PHONETIC_WEIGHT, self.EDIT_DISTANCE_WEIGHT, self.JARO_WINKLER_WEIGHT)
+        else:
+            # a single chunk is scored whole anyway, bounds would not save anything
+            bounds = np.full(len(candidates), np.inf)
+        order = np.argsort(-bounds, kind="stable")
+
+        # min-heap of (score, -position): the root is the k-th best, ties favour earlier candidates
+        heap: List[Tuple[float, int]] = []
+        for start in range(0, len(order), SCORE_CHUNK_SIZE):
+            chunk = order[start:start + SCORE_CHUNK_SIZE]
+
+            # scores are rounded to 4 places, the margin keeps the cut-off exact
+            threshold = max(min_score, heap[0][0]) if len(heap) == k else min_score
+            chunk = chunk[bounds[chunk] >= threshold - 1e-4]
+            if not len(chunk):
+                break  # bounds are descending, no later candidate can qualify either
+
+            scores = self.score_candidates(name, [candidates[i] for i in chunk.tolist()]).tolist()
+            for position, score in zip(chunk.tolist(), scores):
+                score = round(score, 4)
+                if score < min_score:
+                    continue
+                item = (score, -position)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        # Best score first, ties keep candidate order
+        return [Suggestion(name=candidates[-position], similarity_score=score) for score, position in sorted(heap, reverse=True)]
+
+    def get_suggestions_batch(self, names: List[str], country: Optional[str] = None) -> Dict[str, List[Suggestion]]:
+        """
+        Get ranked suggestions for several names of the same country.
+        Names with the same phonetic keys share one phonetic lookup.
+
+        Returns:
+            Dictionary of name -> ranked suggestions
+        """
+        phonetic_lookups: Dict[Tuple[str, ...], List[str]] = {}
+        results: Dict[str, List[Suggestion]] = {}
+
+        for name in names:
+            if name in results:
+                continue
+
+            keys = phonetic_keys(name)
+            if keys not in phonetic_lookups:
+                with stage("phonetic_candidates"):
+                    phonetic_lookups[keys] = self.get_phonetic_candidates(name, country)
+
+            results[name] = self.get_suggestions(name, country, phonetic_lookups[keys])
+
+        return results
+
+    async def get_suggestions_batch_async(self, names: List[str], country: Optional[str] = None) -> Dict[str, List[Suggestion]]:
+        """
+        get_suggestions_batch for the async endpoints: the candidates of every
+        name are gathered first and ranked together, in the scoring process
+        pool when there are at least SCORING_POOL_MIN_CANDIDATES of them.
+        The tokens of all multi-token names are then ranked together too.
+        """
+        phonetic_lookups: Dict[Tuple[str, ...], List[str]] = {}
+        jobs: Dict[str, List[str]] = {}
+
+        with stage("candidates"):
+            for name in names:
+                if name in jobs:
+                    continue
+
+                keys = phonetic_keys(name)
+                if keys not in phonetic_lookups:
+                    phonetic_lookups[keys] = self.get_phonetic_candidates(name, country)
+                jobs[name] = self.get_candidates(name, country, phonetic_lookups[keys])
+
+        with stage("scoring"):
+            ranked = await self._rank_many(list(jobs.items()), self.TOP_K, self.MIN_SCORE)
+
+        return await self._add_full_names_async(dict(zip(jobs, ranked)), country, self.TOP_K, self.MIN_SCORE)
 
     def evaluate_suggestions(
         self,
@@ -188,46 +477,105 @@ class SpellCheck:
             filtered_suggestions=filtered
         )
 
+    def _lookup_key(self, name: str, country: Optional[str] = None) -> Tuple[str, str]:
+        """(lookup key, stored country) a result is saved under, see DB_service.save_name_metadata"""
+        return normalize_name(name), country or ""
+
+    def _exist_statement(self, lookup_keys: List[Tuple[str, str]]):
+        """
+        Canonical input rows for the keys joined to their corrected names, best
+        first, in one query served by the (lookup_key, country) and covering
+        (input_name_id, similarity_score) indexes
+        """
+        return select(
+            InputNames.lookup_key,
+            InputNames.country,
+            CorrectedNames.suggested_name,
+            CorrectedNames.similarity_score
+        ).outerjoin(
+            CorrectedNames, CorrectedNames.input_name_id == InputNames.id
+        ).where(
+            tuple_(InputNames.lookup_key, InputNames.country).in_(lookup_keys)
+        ).order_by(
+            InputNames.id, CorrectedNames.similarity_score.desc()
+        )
+
+    def _collect_batch(self, rows, keys: List[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, Optional[str]], List[Suggestion]]:
+        """Group joined rows into suggestions per requested (name, country) key"""
+        by_lookup_key: Dict[Tuple[str, str], List[Suggestion]] = {}
+
+        for lookup_key, country, suggested_name, score in rows:
+            suggestions = by_lookup_key.setdefault((lookup_key, country), [])
+            if suggested_name is not None and score is not None:
+                suggestions.append(Suggestion(name=suggested_name, similarity_score=float(score)))
+
+        found: Dict[Tuple[str, Optional[str]], List[Suggestion]] = {}
+        for key in keys:
+            suggestions = by_lookup_key.get(self._lookup_key(*key))
+            if suggestions is not None:
+                found[key] = list(suggestions)
+
+        return found
+
     def name_exist_check(self, name: str, country: Optional[str] = None) -> Tuple[bool, List[Suggestion]]:
         """
         Check if name exists in database and return suggestions if found
 
         Args:
-            name: Name to check
-            country: Country to filter by (optional)
+            name: Name to check, matched on its normalized form
+            country: Country to filter by (optional), a missing country matches
+                results that were stored without one
 
         Returns:
             tuple: (exists: bool, suggestions: list[Suggestion])
         """
         try:
-            # Build the base query for input names
-            query = self.db_obj.db.query(InputNames).filter(
-                InputNames.name == name
-            )
+            rows = self.db_obj.db.execute(self._exist_statement([self._lookup_key(name, country)])).all()
+        except Exception as e:
+            return False, []
 
-            # Add country filter only if country is provided
-            if country is not None:
-                query = query.filter(InputNames.country == country)
+        suggestions = self._collect_batch(rows, [(name, country)]).get((name, country))
+        return suggestions is not None, suggestions or []
 
-            input_name = query.first()
+    async def name_exist_check_async(self, name: str, country: Optional[str] = None) -> Tuple[bool, List[Suggestion]]:
+        """name_exist_check on the async session, so the event loop is free while Postgres answers"""
+        try:
+            rows = (await self.db_obj.async_db.execute(self._exist_statement([self._lookup_key(name, country)]))).all()
+        except Exception:
+            return False, []
 
-            if not input_name:
-                return False, []
+        suggestions = self._collect_batch(rows, [(name, country)]).get((name, country))
+        return suggestions is not None, suggestions or []
 
-            # Get all corrected names for this input name
-            corrected_names = self.db_obj.db.query(CorrectedNames).filter(
-                CorrectedNames.input_name_id == input_name.id
-            ).order_by(CorrectedNames.similarity_score.desc()).all()
+    def name_exist_check_batch(self, keys: List[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, Optional[str]], List[Suggestion]]:
+        """
+        Batch version of name_exist_check: looks up every (name, country) key
+        in a single query.
 
-            # Format the response into Pydantic Suggestion models
-            suggestions = [
-                Suggestion(name=cn.suggested_name, similarity_score=float(cn.similarity_score))
-                for cn in corrected_names if cn.similarity_score is not None
-            ]
+        Args:
+            keys: distinct (name, country) pairs, country may be None
 
-            return True, suggestions
+        Returns:
+            Dictionary holding only the keys found, mapped to their suggestions
+        """
+        if not keys:
+            return {}
 
-        except Exception as e:
-            return False, []
-   
+        try:
+            rows = self.db_obj.db.execute(self._exist_statement(list({self._lookup_key(*key) for key in keys}))).all()
+        except Exception:
+            return {}
+
+        return self._collect_batch(rows, keys)
+
+    async def name_exist_check_batch_async(self, keys: List[Tuple[str, Optional[str]]]) -> Dict[Tuple[str, Optional[str]], List[Suggestion]]:
+        """name_exist_check_batch on the async session"""
+        if not keys:
+            return {}
+
+        try:
+            rows = (await self.db_obj.async_db.execute(self._exist_statement(list({self._lookup_key(*key) for key in keys})))).all()
+        except Exception:
+            return {}
 
+        return self._collect_batch(rows, keys)
@@ -0,0 +1,157 @@
+import logging
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import jellyfish
+import numpy as np
+
+from app.services.db_interaction import COUNTRIES
+from app.services.index_snapshot import KeyTable, Postings, StringTable
+from app.utils.utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+def generate_deletes(word: str, max_distance: int) -> Set[str]:
+    """All strings reachable from `word` by deleting up to `max_distance` characters"""
+    deletes = {word}
+    frontier = {word}
+
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                next_frontier.add(item[:i] + item[i + 1:])
+        next_frontier -= deletes
+        deletes |= next_frontier
+        frontier = next_frontier
+
+    return deletes
+
+
+class SymSpellIndex():
+    """
+    Symmetric-delete edit-distance index over the name archive.
+
+    Every archive name is stored under all the strings obtained by deleting up
+    to `max_distance` characters from its first `prefix_length` characters. A
+    query generates the same deletes for the input, so every archive name within
+    `max_distance` edits shares at least one key with it. Shared keys are then
+    verified with a real Damerau-Levenshtein distance.
+
+    Postings are partitioned per country, so a country-scoped lookup only
+    returns names from that country's files. Once built, everything is held
+    in flat arrays (see app.services.index_snapshot) that can be written to
+    and memory-mapped from an index snapshot.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+        # normalized terms, their lengths and their {country: [original names]}
+        self._terms = StringTable.from_strings([])
+        self._term_lengths = np.zeros(0, dtype=np.int32)
+        self._postings = Postings.from_lists(list(COUNTRIES), [])
+
+        # delete string -> ids of the terms producing it
+        self._deletes = KeyTable.from_dict({})
+
+    def __len__(self):
+        return len(self._terms)
+
+    def build(self, entries: Iterable[Tuple[str, str]]):
+        """
+        Build the index from (name, country) pairs. The terms, postings and
+        deletes are collected in dictionaries, then packed into arrays.
+        """
+        terms: List[str] = []
+        postings: List[Dict[str, List[str]]] = []
+        term_ids: Dict[str, int] = {}
+        deletes: Dict[str, List[int]] = {}
+        countries = list(COUNTRIES)
+
+        for name, country in entries:
+            term = normalize_name(name)
+            if not term:
+                continue
+
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = len(terms)
+                term_ids[term] = term_id
+                terms.append(term)
+                postings.append({})
+
+                for delete in generate_deletes(term[:self.prefix_length], self.max_distance):
+                    deletes.setdefault(delete, []).append(term_id)
+
+            if country not in countries:
+                countries.append(country)
+            names = postings[term_id].setdefault(country, [])
+            if name not in names:
+                names.append(name)
+
+        self._terms = StringTable.from_strings(terms)
+        self._term_lengths = np.fromiter((len(t) for t in terms), dtype=np.int32, count=len(terms))
+        self._postings = Postings.from_lists(countries, postings)
+        self._deletes = KeyTable.from_dict(deletes)
+
+        logger.info(f"SymSpell index built [terms: {len(terms)}, deletes: {len(deletes)}]")
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """The index as named arrays, for an index snapshot"""
+        return {
+            **self._terms.arrays(f"{prefix}.terms"),
+            f"{prefix}.term_lengths": self._term_lengths,
+            **self._postings.arrays(f"{prefix}.postings"),
+            **self._deletes.arrays(f"{prefix}.deletes"),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], prefix: str, meta: dict) -> "SymSpellIndex":
+        """Index over arrays written by `arrays`, typically memory-mapped from a snapshot"""
+        index = cls(meta["max_distance"], meta["prefix_length"])
+        index._terms = StringTable.from_arrays(arrays, f"{prefix}.terms")
+        index._term_lengths = arrays[f"{prefix}.term_lengths"]
+        index._postings = Postings.from_arrays(arrays, f"{prefix}.postings", meta["countries"])
+        index._deletes = KeyTable.from_arrays(arrays, f"{prefix}.deletes")
+        return index
+
+    def meta(self) -> dict:
+        return {"max_distance": self.max_distance, "prefix_length": self.prefix_length, "countries": self._postings.countries}
+
+    def lookup(self, name: str, country: Optional[str] = None, max_distance: Optional[int] = None) -> List[str]:
+        """
+        Return archive names within `max_distance` edits of `name`, closest first.
+
+        Args:
+            name: input name
+            country: restricts results to that country when it is one of COUNTRIES
+            max_distance: defaults to (and is capped at) the distance the index was built with
+
+        Returns:
+            List of original archive names
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        query = normalize_name(name)
+        if not query or not len(self._terms):
+            return []
+
+        # every term sharing a delete, the length filter runs vectorized before the real distance
+        term_ids = np.unique(self._deletes.get_many(list(generate_deletes(query[:self.prefix_length], max_distance))))
+        term_ids = term_ids[np.abs(self._term_lengths[term_ids] - len(query)) <= max_distance]
+
+        matches: List[Tuple[int, int]] = []
+        for term_id, term in zip(term_ids.tolist(), self._terms.take(term_ids)):
+            distance = jellyfish.damerau_levenshtein_distance(query, term)
+            if distance <= max_distance:
+                matches.append((distance, term_id))
+
+        matches.sort()
+
+        names, _ = self._postings.names_of([term_id for _, term_id in matches], country if country in COUNTRIES else None)
+        return list(dict.fromkeys(names))
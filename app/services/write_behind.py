@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+from app.db_config import AsyncSessionLocal
+from app.services.db_interaction import DB_service
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "200"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT", "5"))
+
+# (name, country, suggestions as dicts)
+Entry = Tuple[str, Optional[str], List[dict]]
+
+FLUSH_LAG_SECONDS = metrics.histogram(
+    "write_behind_lag_seconds",
+    "Time the oldest entry of each flushed batch waited in the queue"
+)
+FLUSH_SECONDS = metrics.histogram(
+    "write_behind_flush_seconds",
+    "Duration of each bulk write of queued results"
+)
+
+
+class WriteBehindQueue():
+    """
+    Write-behind persistence of correction metadata.
+
+    Requests enqueue their (name, country, suggestions) result and return; a
+    single flusher task owned by the app lifecycle writes them in bulk with its
+    own session whenever `batch_size` entries are waiting or the oldest one
+    has waited `flush_interval`. The queue is bounded: producers wait when it
+    is full and give up (dropping the entry) after `enqueue_timeout`.
+    Remaining entries are drained on shutdown.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_ms: float = WRITE_BEHIND_FLUSH_INTERVAL_MS,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        enqueue_timeout: float = WRITE_BEHIND_ENQUEUE_TIMEOUT
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_flush_lag = 0.0
+
+    def start(self):
+        """Start the flusher task on the running event loop"""
+        if self._task is not None:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher once everything queued before the call has been written"""
+        if self._task is None:
+            return
+
+        # the sentinel is queued behind the pending entries, so they are flushed first
+        await self._queue.put(None)
+        await self._task
+
+        self._task = None
+        self._queue = None
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def enqueue(self, name: str, country: Optional[str], suggestions: List[dict]):
+        await self.enqueue_many([(name, country, suggestions)])
+
+    async def enqueue_many(self, entries: List[Entry]):
+        """Queue results for persistence, waiting (up to enqueue_timeout) while the queue is full"""
+        self.start()
+
+        for entry in entries:
+            try:
+                await asyncio.wait_for(self._queue.put((time.monotonic(), entry)), self.enqueue_timeout)
+                self.enqueued += 1
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                logger.warning(f"Write-behind queue full, dropping result [name: {entry[0]}, pending: {self.pending()}]")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+
+        self.last_flush_lag = time.monotonic() - batch[0][0]
+        FLUSH_LAG_SECONDS.observe(self.last_flush_lag)
+        entries = [entry for _, entry in batch]
+
+        try:
+            with FLUSH_SECONDS.time():
+                async with AsyncSessionLocal() as db:
+                    await DB_service(None, db).save_name_metadata_bulk_async(entries)
+            self.written += len(entries)
+        except Exception as e:
+            self.failed += len(entries)
+            logger.error(f"Write-behind flush failed [entries: {len(entries)}, error: {e!r}]")
+
+
+write_behind = WriteBehindQueue()
+
+metrics.counter_callback(
+    "write_behind_entries_total",
+    "Results handed to the write-behind queue, by outcome",
+    lambda: {
+        ("enqueued",): write_behind.enqueued,
+        ("written",): write_behind.written,
+        ("dropped",): write_behind.dropped,
+        ("failed",): write_behind.failed,
+    },
+    ["outcome"]
+)
+metrics.gauge_callback("write_behind_pending", "Results waiting in the write-behind queue", write_behind.pending)
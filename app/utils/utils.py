@@ -1,9 +1,48 @@
-from typing import List, Dict
+import re
+import string
+from typing import List, Dict, Tuple
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app.services.db_interaction import DB_service
-    
-def save_name_metadata_background(name: str, country: str, db_sesion: Session, suggestions: list[str]):
-    """Background task function for saving to DB"""
-    db_obj = DB_service(db_sesion)
-    db_obj.save_name_metadata(name=name, country=country, suggestions=suggestions)
\ No newline at end of file
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+def normalize_name(name: str) -> str:
+    """Normalize names by removing punctuation and standardizing case"""
+    return name.translate(_PUNCTUATION_TABLE).lower().strip()
+
+_NAME_SEPARATORS = re.compile(r"([\s\-]+)")
+
+def split_name(name: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a full name into its tokens and the separators between them
+    (whitespace and hyphens), both exactly as typed
+    """
+    parts = _NAME_SEPARATORS.split(name.strip())
+    if len(parts) > 1 and not parts[0]:
+        parts = parts[2:]
+    if len(parts) > 1 and not parts[-1]:
+        parts = parts[:-2]
+    return parts[0::2], parts[1::2]
+
+def match_case(template: str, word: str) -> str:
+    """`word` written in the casing style of `template`: upper, lower or capitalized"""
+    if word.lower() == template.lower():
+        return template
+    if template.isupper() and len(template) > 1:
+        return word.upper()
+    if template.islower():
+        return word.lower()
+    if template[:1].isupper():
+        return "-".join(part[:1].upper() + part[1:] for part in word.lower().split("-"))
+    return word
+
+def restyle_name(template: str, name: str) -> str:
+    """
+    A full-name suggestion written like the typed `template`: the casing of
+    every typed token and the typed separators. Names with another number of
+    tokens than the template are returned unchanged.
+    """
+    tokens, separators = split_name(template)
+    name_tokens, _ = split_name(name)
+    if len(tokens) < 2 or len(name_tokens) != len(tokens):
+        return name
+    return "".join(match_case(token, word) + separator for token, word, separator in zip(tokens, name_tokens, separators + [""]))
@@ -0,0 +1,272 @@
+"""
+Offline accuracy and latency benchmark of the local correction pipeline.
+
+Usage:
+    python -m benchmarks.run_benchmark
+    python -m benchmarks.run_benchmark --size 5000 --seed 7 -o results/after.json
+    python -m benchmarks.run_benchmark --baseline results/before.json
+
+Builds the name index from {archive-dir}/{country}.txt (no database
+needed), generates a seeded typo corpus from the same names (see
+benchmarks.typo_corpus) and runs every query through the steps of the
+spell check endpoint: SpellCheck.get_phonetic_candidates, get_suggestions
+and evaluate_suggestions. Weak matches go to a stubbed LLM that only counts
+the calls.
+
+Writes a JSON report with per-stage latency percentiles, throughput, peak
+memory, recall@1/@5 (overall and per typo kind) and the LLM fallback rate.
+With --baseline the run is compared against an earlier report and the
+command exits with status 1 when recall, fallback rate or latency regressed
+beyond the tolerances.
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import jellyfish
+import numpy as np
+
+from app.services.db_interaction import ARCHIVE_DIR
+from app.services.name_index import name_index
+from app.services.spell_checker_service import SpellCheck
+from benchmarks.typo_corpus import TYPO_KINDS, TypoQuery, build_corpus, corpus_digest, read_archive, write_corpus
+
+STAGES = ("phonetic_candidates", "suggestions", "evaluate")
+RECALL_AT = (1, 5)
+
+# Metrics compared against the baseline: (path in the report, higher is better)
+QUALITY_METRICS = [
+    (("quality", "recall@1"), True),
+    (("quality", "recall@5"), True),
+    (("quality", "llm_fallback_rate"), False),
+]
+LATENCY_METRICS = [
+    ("latency_ms", "total", "p50"),
+    ("latency_ms", "total", "p95"),
+]
+
+
+class StubLLM():
+    """Stands in for LLM_process: records the call and returns no suggestions"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, name: str, country: Optional[str]) -> list:
+        self.calls += 1
+        return []
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    values = np.asarray(samples) * 1000
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p90": round(float(p90), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+
+def _quality(results: List[dict]) -> dict:
+    count = len(results)
+    quality = {f"recall@{k}": round(sum(r["rank"] is not None and r["rank"] < k for r in results) / count, 4) for k in RECALL_AT}
+    quality["phonetic_recall"] = round(sum(r["phonetic_hit"] for r in results) / count, 4)
+    quality["llm_fallback_rate"] = round(sum(r["fallback"] for r in results) / count, 4)
+    quality["queries"] = count
+    return quality
+
+
+def run_queries(spell_check: SpellCheck, corpus: List[TypoQuery], llm: StubLLM) -> List[dict]:
+    """
+    Run every query through the local pipeline, timing each stage.
+
+    Returns:
+        One dict per query: stage timings in seconds, rank of the expected
+        name in the suggestions (None when missing), whether the phonetic
+        lookup found it and whether the query fell back to the LLM
+    """
+    results = []
+    clock = time.perf_counter
+
+    for q in corpus:
+        start = clock()
+        phonetic_candidates = spell_check.get_phonetic_candidates(q.query, q.country)
+        after_candidates = clock()
+        suggestions = spell_check.get_suggestions(q.query, q.country, phonetic_candidates)
+        after_suggestions = clock()
+        match_check = spell_check.evaluate_suggestions(suggestions)
+        end = clock()
+
+        if not match_check.is_good_match:
+            llm(q.query, q.country)
+
+        names = [s.name for s in suggestions]
+        results.append({
+            "phonetic_candidates": after_candidates - start,
+            "suggestions": after_suggestions - after_candidates,
+            "evaluate": end - after_suggestions,
+            "total": end - start,
+            "rank": names.index(q.expected) if q.expected in names else None,
+            "phonetic_hit": q.expected in phonetic_candidates,
+            "fallback": not match_check.is_good_match,
+            "kind": q.kind,
+        })
+
+    return results
+
+
+def run_benchmark(archive_dir: str, size: int, seed: int, warmup: int, corpus_path: Optional[str] = None) -> dict:
+    """Build the index, run the corpus and assemble the report"""
+    rows = read_archive(archive_dir)
+    if not rows:
+        raise ValueError(f"no archive files found in {archive_dir}")
+
+    start = time.perf_counter()
+    name_index.build((name, country, jellyfish.metaphone(name)) for name, country in rows)
+    index_build_s = time.perf_counter() - start
+    rss_after_build = _peak_rss_mb()
+
+    corpus = build_corpus(rows, size, seed)
+    if corpus_path:
+        write_corpus(corpus, corpus_path)
+
+    # the database is never touched, the index serves every lookup
+    spell_check = SpellCheck(db_session=None)
+    # warm the scoring caches and allocator on a corpus disjoint from the measured one
+    if warmup:
+        run_queries(spell_check, build_corpus(rows, warmup, seed + 1), StubLLM())
+
+    llm = StubLLM()
+    start = time.perf_counter()
+    results = run_queries(spell_check, corpus, llm)
+    wall_s = time.perf_counter() - start
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "archive_dir": archive_dir,
+            "archive_names": len(rows),
+            "index_version": name_index.version,
+            "seed": seed,
+            "size": size,
+            "warmup": warmup,
+            "corpus_digest": corpus_digest(corpus),
+        },
+        "latency_ms": {stage: _percentiles([r[stage] for r in results]) for stage in STAGES + ("total",)},
+        "throughput_qps": round(len(results) / wall_s, 1),
+        "memory_mb": {
+            "peak_rss_after_build": rss_after_build,
+            "peak_rss": _peak_rss_mb(),
+        },
+        "index_build_s": round(index_build_s, 3),
+        "quality": {**_quality(results), "llm_calls": llm.calls},
+        "by_kind": {
+            kind: _quality([r for r in results if r["kind"] == kind])
+            for kind in TYPO_KINDS if any(r["kind"] == kind for r in results)
+        },
+    }
+
+
+def _metric(report: dict, path) -> float:
+    for key in path:
+        report = report[key]
+    return report
+
+
+def compare(report: dict, baseline: dict, max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """
+    Print the key metrics next to the baseline's, on stderr.
+
+    Returns:
+        Descriptions of the metrics that regressed beyond the tolerances
+    """
+    regressions = []
+    if report["meta"]["corpus_digest"] != baseline["meta"]["corpus_digest"]:
+        print("warning: the runs used different corpora (size, seed or archive), quality is not comparable", file=sys.stderr)
+
+    print(f"{'metric':<28}{'baseline':>12}{'current':>12}{'delta':>12}", file=sys.stderr)
+    for path, higher_is_better in QUALITY_METRICS:
+        old, new = _metric(baseline, path), _metric(report, path)
+        delta = new - old
+        print(f"{'.'.join(path):<28}{old:>12.4f}{new:>12.4f}{delta:>+12.4f}", file=sys.stderr)
+        if (-delta if higher_is_better else delta) > max_quality_drop:
+            regressions.append(f"{'.'.join(path)}: {old:.4f} -> {new:.4f}")
+
+    for path in LATENCY_METRICS:
+        old, new = _metric(baseline, path), _metric(report, path)
+        change = (new - old) / old if old else 0.0
+        print(f"{'.'.join(path):<28}{old:>12.4f}{new:>12.4f}{change:>+11.1%} ", file=sys.stderr)
+        if change > max_latency_increase:
+            regressions.append(f"{'.'.join(path)}: {old:.4f}ms -> {new:.4f}ms")
+
+    old, new = baseline["throughput_qps"], report["throughput_qps"]
+    print(f"{'throughput_qps':<28}{old:>12.1f}{new:>12.1f}{(new - old) / old if old else 0.0:>+11.1%} ", file=sys.stderr)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark correction accuracy and latency on a synthetic typo corpus")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help=f"directory of <country>.txt files (default: {ARCHIVE_DIR})")
+    parser.add_argument("--size", type=int, default=2000, help="number of typo queries (default: 2000)")
+    parser.add_argument("--seed", type=int, default=13, help="corpus random seed (default: 13)")
+    parser.add_argument("--warmup", type=int, default=100, help="untimed queries run first (default: 100)")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--corpus-out", help="also write the generated corpus as JSON lines")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.01, help="allowed recall drop / fallback rise, absolute (default: 0.01)")
+    parser.add_argument("--max-latency-increase", type=float, default=0.25, help="allowed p50/p95 latency increase, relative (default: 0.25)")
+    args = parser.parse_args()
+
+    # keep the index build logging out of the report
+    logging.basicConfig(level=logging.WARNING)
+
+    try:
+        report = run_benchmark(args.archive_dir, args.size, args.seed, args.warmup, args.corpus_out)
+    except Exception as e:
+        print(f"Error running benchmark: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    quality, total = report["quality"], report["latency_ms"]["total"]
+    print(
+        f"{quality['queries']} queries, recall@1 {quality['recall@1']:.3f}, recall@5 {quality['recall@5']:.3f}, "
+        f"LLM fallback {quality['llm_fallback_rate']:.1%}, p50 {total['p50']:.2f}ms, p95 {total['p95']:.2f}ms, "
+        f"{report['throughput_qps']} queries/s",
+        file=sys.stderr
+    )
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_quality_drop, args.max_latency_increase)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
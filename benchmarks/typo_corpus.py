@@ -0,0 +1,162 @@
+import hashlib
+import json
+import random
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.services.db_interaction import COUNTRIES
+
+# Typo kinds, generated in equal shares
+TYPO_KINDS = ("insertion", "deletion", "transposition", "diacritic_loss", "phonetic_swap")
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+# What a keyboard without the Nordic letters turns them into
+_DIACRITIC_TABLE = str.maketrans({
+    "å": "a", "Å": "A", "ä": "a", "Ä": "A", "ö": "o", "Ö": "O", "ø": "o", "Ø": "O",
+    "æ": "ae", "Æ": "Ae", "ð": "d", "Ð": "D", "þ": "th", "Þ": "Th",
+})
+
+# Spellings that sound alike, swapped one occurrence at a time in either direction
+_PHONETIC_SWAPS = [
+    ("ph", "f"), ("th", "t"), ("ck", "k"), ("c", "k"), ("w", "v"), ("y", "i"),
+    ("z", "s"), ("x", "ks"), ("kj", "tj"), ("sj", "sch"), ("aa", "å"), ("ie", "i"),
+]
+
+
+class TypoQuery(BaseModel):
+    """One misspelled name and the archive name it was derived from"""
+    query: str
+    expected: str
+    country: str
+    kind: str
+
+
+def read_archive(archive_dir: str) -> List[Tuple[str, str]]:
+    """
+    (name, country) rows of {archive_dir}/{country}.txt in file order, each
+    name once per country, the same rows `python -m app.load_archive` loads
+    """
+    rows = []
+    for country in COUNTRIES:
+        path = Path(archive_dir) / f"{country}.txt"
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            names = dict.fromkeys(name for name in (line.strip() for line in f) if name)
+        rows.extend((name, country) for name in names)
+    return rows
+
+
+def _insertion(name: str, rng: random.Random) -> Optional[str]:
+    position = rng.randint(1, len(name))
+    return name[:position] + rng.choice(_LETTERS) + name[position:]
+
+
+def _deletion(name: str, rng: random.Random) -> Optional[str]:
+    if len(name) < 4:
+        return None
+    position = rng.randrange(1, len(name))
+    return name[:position] + name[position + 1:]
+
+
+def _transposition(name: str, rng: random.Random) -> Optional[str]:
+    positions = [i for i in range(len(name) - 1) if name[i].lower() != name[i + 1].lower()]
+    if not positions:
+        return None
+    i = rng.choice(positions)
+    swapped = name[i + 1] + name[i]
+    # keep the capital on the first letter
+    if i == 0:
+        swapped = swapped[0].upper() + swapped[1].lower()
+    return name[:i] + swapped + name[i + 2:]
+
+
+def _diacritic_loss(name: str, rng: random.Random) -> Optional[str]:
+    if name.isascii():
+        return None
+    stripped = unicodedata.normalize("NFKD", name.translate(_DIACRITIC_TABLE))
+    return "".join(c for c in stripped if not unicodedata.combining(c))
+
+
+def _phonetic_swap(name: str, rng: random.Random) -> Optional[str]:
+    lowered = name.lower()
+    options = []
+    for a, b in _PHONETIC_SWAPS:
+        for source, target in ((a, b), (b, a)):
+            start = lowered.find(source)
+            while start != -1:
+                options.append((start, source, target))
+                start = lowered.find(source, start + 1)
+    if not options:
+        return None
+
+    start, source, target = rng.choice(options)
+    if name[start].isupper():
+        target = target[0].upper() + target[1:]
+    return name[:start] + target + name[start + len(source):]
+
+
+_GENERATORS = {
+    "insertion": _insertion,
+    "deletion": _deletion,
+    "transposition": _transposition,
+    "diacritic_loss": _diacritic_loss,
+    "phonetic_swap": _phonetic_swap,
+}
+
+
+def build_corpus(rows: List[Tuple[str, str]], size: int, seed: int, kinds: Iterable[str] = TYPO_KINDS) -> List[TypoQuery]:
+    """
+    Reproducible typo corpus: the same rows, size and seed always give the
+    same queries.
+
+    Query i gets kind kinds[i % len(kinds)], applied to a randomly drawn
+    archive name that the kind can alter. Typos that turn one archive name
+    into another name of the same country are redrawn, their "correct"
+    answer would be ambiguous.
+
+    Args:
+        rows: (name, country) archive rows, see read_archive
+        size: number of queries
+        seed: random seed
+        kinds: typo kinds to generate, from TYPO_KINDS
+
+    Returns:
+        List of TypoQuery
+    """
+    kinds = list(kinds)
+    rng = random.Random(seed)
+    archived: Dict[str, Set[str]] = {}
+    for name, country in rows:
+        archived.setdefault(country, set()).add(name.lower())
+
+    corpus = []
+    while len(corpus) < size:
+        kind = kinds[len(corpus) % len(kinds)]
+        for _ in range(1000):
+            name, country = rows[rng.randrange(len(rows))]
+            query = _GENERATORS[kind](name, rng)
+            if query and query.lower() not in archived[country]:
+                corpus.append(TypoQuery(query=query, expected=name, country=country, kind=kind))
+                break
+        else:
+            raise ValueError(f"archive has no names a {kind} typo applies to")
+
+    return corpus
+
+
+def corpus_digest(corpus: List[TypoQuery]) -> str:
+    """Short digest identifying a corpus, runs are only comparable on the same one"""
+    payload = json.dumps([q.model_dump() for q in corpus], ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def write_corpus(corpus: List[TypoQuery], path: str):
+    """Write the corpus as JSON lines"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for query in corpus:
+            f.write(json.dumps(query.model_dump(), ensure_ascii=False) + "\n")